@@ -1,11 +1,27 @@
+import io
 import os
 import time
-import shutil
-import whisper
+import json
+import asyncio
+import threading
 from . import brain
-from fastapi import FastAPI, UploadFile, File
+from . import database
+from . import inference
+from . import batching
+from . import streaming
+from . import audio_decode
+from . import tts_cache
+from . import storage
+from . import metrics
+try:
+    from whisper_app import model_registry, vad
+except ImportError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from whisper_app import model_registry, vad
+from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from gtts import gTTS
 import contextlib
@@ -16,31 +32,70 @@ load_dotenv()
 
 # Configuration
 RECORDINGS_DIR = "recordings"
+TTS_ENGINE = os.getenv("TTS_ENGINE", "edge")  # "edge" (gTTS fallback), "gtts", or "stub" (offline, for benchmarks)
+EDGE_TTS_VOICE = os.getenv("EDGE_TTS_VOICE", "en-US-ChristopherNeural")
+GTTS_LANG = "en"
+TTS_STUB_LATENCY_MS = float(os.getenv("TTS_STUB_LATENCY_MS", 0))
+# (engine, voice) pairs whose cached audio may serve a reply, preferred first
+TTS_VARIANTS = {
+    "stub": [("stub", "silence")],
+    "gtts": [("gtts", GTTS_LANG)],
+}.get(TTS_ENGINE, [("edge", EDGE_TTS_VOICE), ("gtts", GTTS_LANG)])
+# One silent MPEG-1 Layer III frame (32 kbps, 44.1 kHz, mono): ~26ms of audio
+STUB_MP3_FRAME = bytes([0xFF, 0xFB, 0x10, 0xC4]) + bytes(100)
+NO_SPEECH_REPLY = "I didn't hear anything."
 
-# Global Model Variable
+# Global Model Variable (owned by the inference executor)
 model = None
+executor = None
+batcher = None
+tts = None
+tts_slots = None
+recordings = None
+reply_memory = None
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
-    global model
-    print("Loading Whisper model...")
-    # Default changed to 'turbo' (Large V3 Turbo)
-    model_name = os.getenv("WHISPER_MODEL", "turbo")
-    try:
-        model = whisper.load_model(model_name)
-    except Exception as e:
-        print(f"Failed to load specific model '{model_name}', falling back to 'base'. Error: {e}")
-        model = whisper.load_model("base")
-        
-    print("✓ Model ready")
+    global model, executor, batcher, tts, tts_slots, recordings, reply_memory
+    # Shared registry (default 'turbo', Large V3 Turbo); warm it up so the first request isn't slow
+    model = await asyncio.to_thread(model_registry.get_model)
+    await asyncio.to_thread(model_registry.warmup, model)
+    executor = inference.InferenceExecutor(model)
+    print(f"✓ Inference executor: {executor.max_workers} worker(s), queue {executor.max_queue}")
+    if batching.BATCHING_ENABLED:
+        batcher = batching.BatchScheduler(executor)
+        batcher.start()
+        print(f"✓ Micro-batching: up to {batcher.max_batch} clips / {batching.BATCH_MAX_WAIT_MS}ms")
     
-    # Cleanup recordings on startup
-    if os.path.exists(RECORDINGS_DIR):
-        shutil.rmtree(RECORDINGS_DIR)
+    # Recordings stay within a byte/file budget, old and unplayed files are evicted in the background
+    # (the TTS cache directory manages its own LRU). Pre-forked workers (assistant/serve.py) share
+    # both directories: budgets are counted from disk and only worker 0 runs the sweep.
+    worker = os.getenv("SERVE_WORKER_ID")
+    shared = worker is not None
     os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    recordings = storage.RecordingStore(RECORDINGS_DIR, exclude=[tts_cache.TTS_CACHE_DIR], shared=shared)
+    if worker in (None, "0"):
+        await asyncio.to_thread(recordings.sweep)
+        recordings.start_background_sweep()
+    tts_slots = asyncio.Semaphore(tts_cache.TTS_CONCURRENCY)
+    if storage.reply_audio_in_memory(worker):
+        reply_memory = storage.MemoryStore()
+        print(f"✓ Reply audio served from memory (up to {storage.REPLY_MEMORY_MAX_MB:.0f}MB)")
+    elif tts_cache.TTS_CACHE_ENABLED:
+        tts = tts_cache.TTSCache(shared=shared)
+
+    # Open the pooled MongoDB client now so the first chat turn doesn't pay for it
+    await asyncio.to_thread(database.get_client)
+    database.schema_catalog.start_background_refresh()
     
     yield
     print("Shutting down...")
+    if batcher:
+        await batcher.stop()
+    executor.shutdown()
+    recordings.stop_background_sweep()
+    database.schema_catalog.stop_background_refresh()
+    database.close_connections()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -53,66 +108,372 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# API Endpoints
-@app.post("/chat")
-async def chat_endpoint(audio: UploadFile = File(...)):
-    try:
-        # 1. Save uploaded audio
-        files_dir = os.path.join(RECORDINGS_DIR, "inputs")
-        os.makedirs(files_dir, exist_ok=True)
-        timestamp = int(time.time())
-        input_audio_path = os.path.join(files_dir, f"input_{timestamp}.webm")
-        
-        with open(input_audio_path, "wb") as buffer:
-            shutil.copyfileobj(audio.file, buffer)
-            
-        # 2. Transcribe
-        print(f"Transcribing: {input_audio_path}")
-        # Turbo is multilingual by default no need for explicit English if we want support 99+ langs
-        transcription_res = model.transcribe(input_audio_path, fp16=False)
-        user_text = transcription_res["text"].strip()
-        print(f"User said: {user_text}")
-        
-        if not user_text:
-            return JSONResponse({"user_text": "", "ai_text": "I didn't hear anything.", "audio_url": None})
-
-        # 3. Think (Brain)
-        ai_text = brain.get_response(user_text)
-        print(f"AI response: {ai_text}")
-        
-        # 4. Speak (TTS)
-        output_dir = os.path.join(RECORDINGS_DIR, "outputs")
-        os.makedirs(output_dir, exist_ok=True)
-        output_filename = f"reply_{timestamp}.mp3"
-        output_audio_path = os.path.join(output_dir, output_filename)
-        
+# Shared reply pipeline (used by /chat and /ws/chat)
+async def synthesize(text, output):
+    """
+    Writes an mp3 for `text` to `output` (a path, or a binary file object for in-memory
+    replies) and returns the (engine, voice) that produced it.
+    """
+    # Audio is buffered so a failed Edge stream never leaves half a file behind
+    audio, used = io.BytesIO(), None
+    if TTS_ENGINE == "stub":
+        # Offline stand-in: silence roughly as long as the sentence would take to say
+        await asyncio.sleep(TTS_STUB_LATENCY_MS / 1000)
+        audio.write(STUB_MP3_FRAME * max(1, len(text) * 5 // 2))
+        used = ("stub", "silence")
+    elif TTS_ENGINE == "edge":
         # Try Edge TTS First
         try:
             print("Generating audio with Edge TTS...")
             # Using a high-quality multilingual or English voice
-            voice = os.getenv("EDGE_TTS_VOICE", "en-US-ChristopherNeural") 
-            communicate = edge_tts.Communicate(ai_text, voice)
-            await communicate.save(output_audio_path)
-            
+            communicate = edge_tts.Communicate(text, EDGE_TTS_VOICE)
+            async for message in communicate.stream():
+                if message["type"] == "audio":
+                    audio.write(message["data"])
+            used = ("edge", EDGE_TTS_VOICE)
+
         except Exception as e:
             print(f"Edge TTS failed: {e}. Falling back to gTTS.")
-            print("Generating audio with Google TTS...")
-            tts = gTTS(text=ai_text, lang='en')
-            tts.save(output_audio_path)
+            metrics.inc("tts_fallbacks_total")
+            audio = io.BytesIO()
+
+    if used is None:
+        print("Generating audio with Google TTS...")
+        tts_engine = gTTS(text=text, lang=GTTS_LANG)
+        await asyncio.to_thread(tts_engine.write_to_fp, audio)
+        used = ("gtts", GTTS_LANG)
+
+    if isinstance(output, str):
+        await asyncio.to_thread(_write_bytes, output, audio.getvalue())
+    else:
+        output.write(audio.getvalue())
+    return used
+
+async def _synthesize_bounded(text, output_audio_path):
+    # Sentences of every reply share TTS_CONCURRENCY slots, so long replies run in parallel
+    # without opening an unbounded number of Edge TTS connections
+    async with tts_slots:
+        with metrics.span("tts"):
+            return await synthesize(text, output_audio_path)
+
+async def speak(text, output_filename):
+    """
+    URL of the audio for `text`: from memory when REPLY_AUDIO_IN_MEMORY is set, straight
+    from the TTS cache when the phrase was spoken before, otherwise a new file in recordings/outputs.
+    """
+    if reply_memory is not None:
+        buffer = io.BytesIO()
+        await _synthesize_bounded(text, buffer)
+        reply_memory.put(output_filename, buffer.getvalue())
+        return f"/audio/{output_filename}"
+    if tts is not None:
+        return await tts.fetch(text, TTS_VARIANTS, _synthesize_bounded)
+    output_path = recordings.path("outputs", output_filename)
+    await _synthesize_bounded(text, output_path)
+    recordings.register(output_path)
+    # Return URL relative to static mount
+    return f"/recordings/outputs/{output_filename}"
+
+async def think_and_speak(user_text, request_id):
+    # 3. Think (Brain) - LLM and Mongo calls are blocking, keep them off the loop
+    ai_text = await asyncio.to_thread(brain.get_response, user_text)
+    print(f"AI response: {ai_text}")
+    
+    # 4. Speak (TTS)
+    audio_url = await speak(ai_text, f"reply_{request_id}.mp3")
+    return {"ai_text": ai_text, "audio_url": audio_url}
+
+async def _stream_sentences(user_text):
+    # brain.stream_response is a blocking generator (sync OpenAI client), drive it from a worker thread
+    # The thread stops at the next sentence once `stop` is set (client gone, reply cancelled)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        sentences = brain.iter_sentences(brain.stream_response(user_text))
+        try:
+            for sentence in sentences:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, sentence)
+        finally:
+            sentences.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while (sentence := await queue.get()) is not done:
+            yield sentence
+        await producer
+    finally:
+        stop.set()
+
+async def stream_reply(user_text, request_id):
+    """
+    Sentence-pipelined reply: each sentence goes to TTS as soon as the LLM finishes it,
+    and "segment" events are yielded in order as their audio becomes ready.
+    Ends with a "reply_end" event carrying the full text.
+    """
+    segments = asyncio.Queue()
+    speaking = []
+
+    async def produce():
+        index = 0
+        try:
+            async with contextlib.aclosing(_stream_sentences(user_text)) as sentences:
+                async for sentence in sentences:
+                    task = asyncio.create_task(speak(sentence, f"reply_{request_id}_{index}.mp3"))
+                    speaking.append(task)
+                    await segments.put((index, sentence, task))
+                    index += 1
+        finally:
+            await segments.put(None)
+
+    producer = asyncio.create_task(produce())
+    sentences = []
+    try:
+        while (item := await segments.get()) is not None:
+            index, sentence, task = item
+            sentences.append(sentence)
+            yield {"type": "segment", "index": index, "text": sentence, "audio_url": await task}
+        await producer
+    finally:
+        # Client gone (or the reply failed): stop the LLM thread and drop TTS nobody will play
+        producer.cancel()
+        for task in speaking:
+            task.cancel()
+
+    ai_text = " ".join(sentences)
+    print(f"AI response (streamed): {ai_text}")
+    yield {"type": "reply_end", "user_text": user_text, "ai_text": ai_text}
+
+async def transcribe_upload(audio):
+    # 1. Decode the upload in memory (16 kHz float32, no temp file)
+    request_id = storage.new_request_id()
+    with metrics.span("upload"):
+        data = await audio.read()
+    if audio_decode.PERSIST_INPUTS:
+        input_audio_path = recordings.path("inputs", f"input_{request_id}.webm")
+        await asyncio.to_thread(_write_bytes, input_audio_path, data)
+        recordings.register(input_audio_path)
+    with metrics.span("decode"):
+        audio_array = await asyncio.to_thread(audio_decode.decode, data)
+    # Trim silence before inference; a clip with no speech never reaches the model
+    with metrics.span("vad"):
+        audio_array, _ = await asyncio.to_thread(vad.trim, audio_array, audio_decode.SAMPLE_RATE)
+    if len(audio_array) == 0:
+        return "", request_id
         
-        # Return URL relative to static mount
-        audio_url = f"/recordings/outputs/{output_filename}"
+    # 2. Transcribe (off the event loop, shed load when the queue is full)
+    print(f"Transcribing: {len(audio_array) / audio_decode.SAMPLE_RATE:.1f}s upload")
+    # Turbo is multilingual by default no need for explicit English if we want support 99+ langs
+    with metrics.span("whisper"):
+        if batcher:
+            transcription_res = await batcher.transcribe(audio_array)
+        else:
+            transcription_res = await executor.transcribe(audio_array)
+    user_text = transcription_res["text"].strip()
+    print(f"User said: {user_text}")
+    return user_text, request_id
+
+def _write_bytes(path, data):
+    with open(path, "wb") as buffer:
+        buffer.write(data)
+
+def busy_response(e):
+    print(f"⚠️  Shedding load: {e}")
+    return JSONResponse(
+        {"error": "Server busy, please retry shortly."},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+# API Endpoints
+@app.post("/chat")
+async def chat_endpoint(audio: UploadFile = File(...)):
+    try:
+        user_text, request_id = await transcribe_upload(audio)
         
-        return JSONResponse({
-            "user_text": user_text,
-            "ai_text": ai_text,
-            "audio_url": audio_url
-        })
+        if not user_text:
+            return JSONResponse({"user_text": "", "ai_text": NO_SPEECH_REPLY, "audio_url": None})
+
+        reply = await think_and_speak(user_text, request_id)
+        return JSONResponse({"user_text": user_text, **reply})
         
+    except inference.InferenceQueueFull as e:
+        return busy_response(e)
+    except audio_decode.AudioDecodeError as e:
+        print(f"Undecodable upload: {e}")
+        return JSONResponse({"error": "Could not decode the audio upload."}, status_code=400)
     except Exception as e:
         print(f"Error: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(audio: UploadFile = File(...)):
+    """
+    Chunked variant of /chat: newline-delimited JSON events (transcript, segment..., reply_end)
+    so the client can start playing the first sentence while the rest is generated.
+    """
+    try:
+        user_text, request_id = await transcribe_upload(audio)
+    except inference.InferenceQueueFull as e:
+        return busy_response(e)
+    except audio_decode.AudioDecodeError as e:
+        print(f"Undecodable upload: {e}")
+        return JSONResponse({"error": "Could not decode the audio upload."}, status_code=400)
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    async def events():
+        yield json.dumps({"type": "transcript", "user_text": user_text}) + "\n"
+        if not user_text:
+            yield json.dumps({"type": "reply_end", "user_text": "", "ai_text": NO_SPEECH_REPLY}) + "\n"
+            return
+        async with contextlib.aclosing(stream_reply(user_text, request_id)) as reply:
+            async for event in reply:
+                yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/chat")
+async def ws_chat_endpoint(websocket: WebSocket):
+    """
+    Streaming variant of /chat: binary frames carry MediaRecorder chunks while the
+    user talks, a {"type": "stop"} text frame ends the utterance.
+    Server sends "partial" transcripts, then "final", then reply "segment"s and "reply_end".
+    """
+    await websocket.accept()
+    metrics.inc("requests_total", endpoint="/ws/chat", status="101")
+    decoder = streaming.StreamingDecoder()
+    transcriber = streaming.SlidingWindowTranscriber(executor, batcher)
+    stopped = asyncio.Event()
+    partials = asyncio.create_task(
+        streaming.run_partials(decoder, transcriber, websocket.send_json, stopped)
+    )
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                await asyncio.to_thread(decoder.feed, message["bytes"])
+            elif message.get("text") and json.loads(message["text"]).get("type") == "stop":
+                break
+
+        stopped.set()
+        await partials
+        await asyncio.to_thread(decoder.close)
+
+        user_text = (await transcriber.final(decoder)).strip()
+        print(f"User said (stream): {user_text}")
+        await websocket.send_json({"type": "final", "text": user_text})
+
+        request_id = storage.new_request_id()
+        if not user_text:
+            await websocket.send_json({"type": "reply_end", "user_text": "", "ai_text": NO_SPEECH_REPLY})
+            return
+
+        async with contextlib.aclosing(stream_reply(user_text, request_id)) as reply:
+            async for event in reply:
+                await websocket.send_json(event)
+
+    except WebSocketDisconnect:
+        pass
+    except inference.InferenceQueueFull as e:
+        print(f"⚠️  Shedding load (stream): {e}")
+        await websocket.send_json({"type": "error", "status": 503, "retry_after": e.retry_after,
+                                   "error": "Server busy, please retry shortly."})
+    except Exception as e:
+        print(f"Stream Error: {e}")
+        await websocket.send_json({"type": "error", "status": 500, "error": str(e)})
+    finally:
+        stopped.set()
+        partials.cancel()
+        await asyncio.to_thread(decoder.close)
+        with contextlib.suppress(Exception):
+            await websocket.close()
+
+@app.post("/cache/invalidate")
+async def cache_invalidate_endpoint(collection: str | None = None):
+    database.invalidate_query_cache(collection)
+    database.schema_catalog.invalidate(collection)
+    return JSONResponse({"invalidated": collection or "*"})
+
+@app.get("/stats")
+async def stats_endpoint():
+    # Per process: under the pre-fork server this is whichever worker took the request
+    return JSONResponse({
+        "worker": os.getenv("SERVE_WORKER_ID"),
+        "inference": executor.stats() if executor else None,
+        "batching": batcher.stats() if batcher else None,
+        "models": model_registry.loaded(),
+        "vad": vad.stats(),
+        "tts_cache": tts.stats() if tts else None,
+        "recordings": recordings.stats() if recordings else None,
+        "reply_memory": reply_memory.stats() if reply_memory else None,
+        "database": {"healthy": database.is_healthy()},
+        "schema_catalog": database.schema_catalog.stats(),
+        "query_cache": database.result_cache.stats() if database.result_cache else None,
+        "metrics": metrics.snapshot(),
+    })
+
+def _cache_counters():
+    # Cache hit/miss counts already live in each cache's stats(); copied at scrape time
+    out = []
+    caches = {
+        "query": database.result_cache.stats() if database.result_cache else None,
+        "schema": database.schema_catalog.stats(),
+        "tts": tts.stats() if tts else None,
+    }
+    for name, stats in caches.items():
+        if stats:
+            out.append(("cache_hits_total", {"cache": name}, stats["hits"]))
+            out.append(("cache_misses_total", {"cache": name}, stats["misses"]))
+    if executor:
+        out.append(("inference_rejected_total", {}, executor.stats()["rejected"]))
+    return out
+
+metrics.register_collector(_cache_counters)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/audio/{name}")
+async def memory_audio_endpoint(name: str):
+    # Replies synthesized with REPLY_AUDIO_IN_MEMORY=1 never touch the disk
+    data = reply_memory.get(name) if reply_memory else None
+    if data is None:
+        return JSONResponse({"error": "Audio expired or not found."}, status_code=404)
+    return Response(data, media_type="audio/mpeg")
+
+@app.middleware("http")
+async def track_recordings(request: Request, call_next):
+    # A reply being (re)played moves to the back of the eviction queue
+    if recordings is not None and request.url.path.startswith("/recordings/outputs/"):
+        recordings.touch(os.path.join(RECORDINGS_DIR, request.url.path[len("/recordings/"):]))
+    return await call_next(request)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    # Request counters and latency (to the first byte, for /chat/stream) of the chat endpoints; the per-stage spans
+    # of the request (worker threads included) go in a Server-Timing header when METRICS_TIMING_HEADER=1.
+    # Streamed replies get no header: it is sent before the body, so it would only cover the transcription.
+    if not metrics.METRICS_ENABLED or not request.url.path.startswith("/chat"):
+        return await call_next(request)
+    timings = metrics.start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    metrics.observe("request_seconds", time.perf_counter() - started, endpoint=request.url.path)
+    metrics.inc("requests_total", endpoint=request.url.path, status=str(response.status_code))
+    if metrics.METRICS_TIMING_HEADER and response.headers.get("content-type") != "application/x-ndjson":
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
+
 # Mount Static Files
 # Mount recordings to serve audio back
 app.mount("/recordings", StaticFiles(directory=RECORDINGS_DIR), name="recordings")
@@ -0,0 +1,114 @@
+import io
+import os
+import time
+import subprocess
+import threading
+
+from math import gcd
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+SAMPLE_RATE = 16000
+PERSIST_INPUTS = os.getenv("PERSIST_INPUTS", "0") == "1"          # keep a copy of every upload on disk
+AUDIO_DECODER = os.getenv("AUDIO_DECODER", "auto")                # "auto", "pyav" or "ffmpeg"
+FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", 4))  # concurrent ffmpeg fallbacks
+
+try:
+    import av  # optional: in-process decoding of webm/opus/mp3/...
+except ImportError:
+    av = None
+
+_ffmpeg_slots = threading.BoundedSemaphore(FFMPEG_MAX_PROCESSES)
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def _to_mono_float(samples):
+    if samples.dtype == np.uint8:
+        samples = (samples.astype(np.float32) - 128) / 128
+    elif np.issubdtype(samples.dtype, np.integer):
+        samples = samples.astype(np.float32) / np.iinfo(samples.dtype).max
+    else:
+        samples = samples.astype(np.float32)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return samples
+
+
+def _resample(samples, rate):
+    if rate == SAMPLE_RATE:
+        return samples
+    g = gcd(rate, SAMPLE_RATE)
+    return resample_poly(samples, SAMPLE_RATE // g, rate // g).astype(np.float32)
+
+
+def _decode_wav(data):
+    rate, samples = wavfile.read(io.BytesIO(data))
+    return _resample(_to_mono_float(samples), rate)
+
+
+def _decode_pyav(data):
+    chunks = []
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+        for frame in container.decode(stream):
+            chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+        chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+    return np.concatenate(chunks).astype(np.float32) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def _decode_ffmpeg(data):
+    # Bytes in on stdin, PCM out on stdout: no temp file, no re-read
+    with _ffmpeg_slots:
+        proc = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            input=data, capture_output=True,
+        )
+    if proc.returncode != 0:
+        raise AudioDecodeError(proc.stderr.decode(errors="replace").strip() or "ffmpeg failed")
+    return np.frombuffer(proc.stdout, dtype=np.float32).copy()
+
+
+def _pick_decoder(data):
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "wav", _decode_wav
+    if AUDIO_DECODER != "ffmpeg" and av is not None:
+        return "pyav", _decode_pyav
+    if AUDIO_DECODER == "pyav":
+        raise AudioDecodeError("AUDIO_DECODER=pyav but the 'av' package is not installed")
+    return "ffmpeg", _decode_ffmpeg
+
+
+def decode(data):
+    """
+    Uploaded audio bytes -> 16 kHz mono float32 array, ready for the model.
+    WAV is parsed natively, everything else goes through PyAV in-process when
+    installed, otherwise through an ffmpeg pipe.
+    """
+    if not data:
+        return np.zeros(0, dtype=np.float32)
+    started = time.perf_counter()
+    name, decoder = _pick_decoder(data)
+    try:
+        audio = decoder(data)
+    except AudioDecodeError:
+        raise
+    except Exception as e:
+        if name == "ffmpeg":
+            raise AudioDecodeError(str(e)) from e
+        # Native parse failed (unusual codec, truncated header): let ffmpeg have a go
+        print(f"⚠️  {name} decode failed ({e}), retrying with ffmpeg")
+        name, audio = "ffmpeg", _decode_ffmpeg(data)
+    elapsed_ms = 1000 * (time.perf_counter() - started)
+    print(f"🎧 Decoded {len(audio) / SAMPLE_RATE:.1f}s of audio ({name}, {len(data) / 1024:.0f}KB) in {elapsed_ms:.0f}ms")
+    return audio
@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import threading
+
+import torch
+import whisper
+from dotenv import load_dotenv
+
+from . import inference
+from .inference import model_registry
+
+load_dotenv()
+
+# Configuration
+BATCHING_ENABLED = os.getenv("BATCHING_ENABLED", "1") == "1"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 8))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 10))
+
+# Same quality gates whisper.transcribe uses to decide a greedy decode needs a retry
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+
+
+def _decode_batch(model, audios):
+    """
+    Pads every clip to one 30s window, stacks their log-mels and runs a single
+    batched encoder + greedy decoder pass. Runs on the inference executor.
+    Returns (outputs, retry): `retry` indexes the clips whose greedy pass looks degenerate.
+    """
+    mels = [
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=model.dims.n_mels)
+        for audio in audios
+    ]
+    mel_batch = torch.stack(mels).to(model.device)
+
+    fp16 = model_registry.is_fp16(model)
+    options = whisper.DecodingOptions(temperature=0.0, without_timestamps=True, fp16=fp16)
+    results = whisper.decode(model, mel_batch, options)
+
+    outputs, retry = [], []
+    for i, res in enumerate(results):
+        outputs.append({"text": res.text, "language": res.language, "segments": []})
+        if res.compression_ratio > COMPRESSION_RATIO_THRESHOLD or res.avg_logprob < LOGPROB_THRESHOLD:
+            retry.append(i)
+    return outputs, retry
+
+
+class BatchScheduler:
+    """
+    Collects transcription requests that arrive within `max_wait_ms` of each other
+    and runs them through the model as one batch, then fans results back out.
+    """
+    def __init__(self, executor, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                 max_queue=inference.INFERENCE_QUEUE_SIZE):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._running = set()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._size_histogram = {}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._last_latency = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        tasks = list(self._running) + ([self._task] if self._task else [])
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def transcribe(self, audio):
+        """
+        Transcribes a 16 kHz float32 array. Clips longer than one Whisper window
+        skip the batcher and go straight to the executor.
+        """
+        if len(audio) > whisper.audio.N_SAMPLES:
+            return await self.executor.transcribe(audio)
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((audio, future))
+        except asyncio.QueueFull:
+            self.executor.reject()  # counted with the executor's own sheds
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            # asyncio.wait, not wait_for: wait_for can swallow stop()'s cancel when an item
+            # arrives at the same moment, leaving the loop blocked on an empty queue
+            getter = asyncio.ensure_future(self._queue.get())
+            try:
+                done, _ = await asyncio.wait({getter}, timeout=timeout)
+            except asyncio.CancelledError:
+                # Stopped mid-collection: callers already holding a place in this batch get cancelled
+                if getter.done() and not getter.cancelled():
+                    batch.append(getter.result())
+                for _, future in batch:
+                    future.cancel()
+                raise
+            finally:
+                if not getter.done():
+                    getter.cancel()  # Queue.get leaves the item queued when cancelled
+            if not done:
+                break
+            batch.append(getter.result())
+        return batch
+
+    async def _loop(self):
+        # One batch in flight per inference worker, each on that worker's own model copy (a model can't
+        # decode on two threads at once); while they are all busy, arrivals pile up into the next batch
+        slots = asyncio.Semaphore(self.executor.max_workers)
+        while True:
+            await slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                slots.release()
+                raise
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _task: slots.release())
+
+    async def _run_batch(self, batch):
+        audios = [audio for audio, _ in batch]
+        started = time.perf_counter()
+        try:
+            results, retry = await self.executor.run(_decode_batch, audios)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._record(len(batch), time.perf_counter() - started)
+        for i, ((_, future), res) in enumerate(zip(batch, results)):
+            if i not in retry and not future.done():
+                future.set_result(res)
+        if retry:
+            await asyncio.gather(*(self._retry(batch[i][1], audios[i], results[i]) for i in retry))
+
+    async def _retry(self, future, audio, greedy):
+        """
+        Degenerate greedy pass: the full transcribe() fallback ladder runs as its own executor job
+        (so on a model copy no other job is using), the rest of the batch is already answered and
+        the retries run side by side, at most one per inference worker.
+        """
+        try:
+            res = await self.executor.transcribe(audio)
+        except inference.InferenceQueueFull:
+            res = greedy  # no room for a retry, the greedy text beats a 503
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(res)
+
+    def _record(self, size, latency):
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._size_histogram[size] = self._size_histogram.get(size, 0) + 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            self._last_latency = latency
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queued": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._size_histogram.items())),
+                "avg_latency_ms": round(1000 * self._latency_total / self._batches, 1) if self._batches else 0.0,
+                "max_latency_ms": round(1000 * self._latency_max, 1),
+                "last_latency_ms": round(1000 * self._last_latency, 1),
+            }
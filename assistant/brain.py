@@ -1,4 +1,5 @@
 import os
+import re
 import json
 from openai import OpenAI
 
@@ -18,85 +19,81 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import datetime
+import itertools
 import pytz
 
 import numpy as np
-import json
-import pickle
-from sklearn.metrics.pairwise import cosine_similarity
-
-# RAG DEPENDENCIES (TF-IDF Implementation)
-try:
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    KNOWLEDGE_DIR = os.path.join(BASE_DIR, "knowledge_store")
-    VECTORIZER_PATH = os.path.join(KNOWLEDGE_DIR, "tfidf_vectorizer.pkl")
-    MATRIX_PATH = os.path.join(KNOWLEDGE_DIR, "tfidf_matrix.pkl")
-    DOCS_PATH = os.path.join(KNOWLEDGE_DIR, "documents.json")
-    
-    # Load Model Globally
-    if os.path.exists(VECTORIZER_PATH) and os.path.exists(DOCS_PATH):
-        print("🧠 Loading Knowledge Base (TF-IDF)...")
-        with open(VECTORIZER_PATH, "rb") as f:
-            rag_vectorizer = pickle.load(f)
-        with open(MATRIX_PATH, "rb") as f:
-            rag_matrix = pickle.load(f)
-        with open(DOCS_PATH, "r") as f:
-            rag_documents = json.load(f)
-        RAG_ENABLED = True
-        print(f"✅ RAG Loaded: {len(rag_documents)} docs")
-    else:
-        print("⚠️ RAG Not initialized. Run 'python assistant/ingest.py' first.")
-        RAG_ENABLED = False
-
-except Exception as e:
-    print(f"⚠️ RAG Init Error: {e}")
-    RAG_ENABLED = False
-
-def search_knowledge_base(query, n_results=3):
+from . import rag_index, retrieval, dense, metrics
+
+# RAG (TF-IDF, memory-mapped generations; new ingests are picked up without a restart)
+rag_manager = rag_index.IndexManager()
+print("🧠 Loading Knowledge Base (TF-IDF)...")
+if rag_manager.get() is None:
+    print("⚠️ RAG Not initialized. Run 'python assistant/ingest.py' first.")
+elif rag_manager.get().dense and retrieval.RAG_HYBRID_ALPHA > 0:
+    dense.get_encoder(rag_manager.get().dense["encoder"])  # load the query encoder once, up front
+
+@metrics.timed("rag")
+def search_knowledge_base_batch(queries, n_results=3):
     """
-    Searches the local TF-IDF store for relevant context.
+    Searches the local TF-IDF store (hybrid with embeddings, if ingested) for several queries at once.
+    Returns one list per query of {"id", "score", "source", "text"} hits, best first.
     """
-    if not RAG_ENABLED:
-        return ""
+    index = rag_manager.get()
+    if index is None or not queries:
+        return [[] for _ in queries]
         
     try:
-        # Transform Query
-        query_vec = rag_vectorizer.transform([query])
-        
-        # Compute Cosine Similarity
-        cosine_similarities = cosine_similarity(query_vec, rag_matrix).flatten()
+        # Transform all queries in one call
+        query_matrix = index.vectorizer.transform(list(queries))
+        query_embeddings = None
+        if index.dense and retrieval.RAG_HYBRID_ALPHA > 0:
+            query_embeddings = dense.get_encoder(index.dense["encoder"]).encode(list(queries))
         
-        # Get Top K Indices
-        top_indices = cosine_similarities.argsort()[-n_results:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            if cosine_similarities[idx] > 0.1: # Threshold to avoid pure noise
-                results.append(rag_documents[idx]['text'])
-            
-        if not results:
-            return ""
-            
-        context_str = "\\n---\\n".join(results)
-        return context_str
+        # Score only the postings of the query terms (fused with dense scores when available)
+        batches = retrieval.search_batch(index, query_matrix, k=n_results, query_embeddings=query_embeddings)
+        return [
+            [{"id": index.ids[row], "score": round(score, 4), "source": index.sources[row], "text": index.texts[row]}
+             for row, score in hits]
+            for hits in batches
+        ]
     except Exception as e:
         print(f"RAG Search Error: {e}")
-        return ""
+        return [[] for _ in queries]
 
-def get_response(user_text):
+def search_knowledge_base(query, n_results=3):
     """
-    Sends text to OpenRouter (using Llama 3 by default) and returns the response.
+    Searches the local TF-IDF store for relevant context.
     """
+    results = search_knowledge_base_batch([query], n_results)[0]
+    if not results:
+        return ""
+    return "\\n---\\n".join(hit["text"] for hit in results)
+
+NO_API_KEY_MESSAGE = "I need an API key (LLM_API_KEY or OPENROUTER_API_KEY) to think. Please set it in your .env file."
+
+# Sentence splitting for streamed replies: cut after terminal punctuation once a chunk is long enough
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+MIN_SENTENCE_CHARS = int(os.getenv("MIN_SENTENCE_CHARS", 20))
+
+def _get_client():
     api_key = os.getenv("LLM_API_KEY") or os.getenv("OPENROUTER_API_KEY")
     if not api_key:
-        return "I need an API key (LLM_API_KEY or OPENROUTER_API_KEY) to think. Please set it in your .env file."
-
+        return None
     client = OpenAI(
         base_url=os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1"),
         api_key=api_key,
     )
     print(f"DEBUG: Connecting to {client.base_url}, Model: {os.getenv('LLM_MODEL')}")
-    
+    return client
+
+def _model_name():
+    return os.getenv("LLM_MODEL", "qwen/qwen-2.5-7b-instruct")
+
+def build_messages(user_text):
+    """
+    Builds the system prompt (time, RAG context, DB schema, tool instructions) and the user turn.
+    """
     # Get dynamic date and time (Local & UTC)
     now = datetime.datetime.now()
     local_time_str = now.strftime("%Y-%m-%d %H:%M:%S")
@@ -105,7 +102,8 @@ def get_response(user_text):
 
     # Dynamic Database Injection (Schema Summary Only)
     try:
-        schema = database.get_database_schema(mode="summary")
+        with metrics.span("schema"):
+            schema = database.get_database_schema(mode="summary")
         schema_json = json.dumps(schema, indent=2)
     except Exception:
         schema_json = "{}"
@@ -154,71 +152,99 @@ IMPORTANT:
 - Use "limit" correctly as a separate field.
 """
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_text},
     ]
 
+def _detect_tool_call(response_content):
+    """
+    Returns the regex match (or True for fenced JSON) if the response looks like a tool call, else None.
+    """
+    json_match = re.search(r'\{.*"tool":.*\}', response_content.replace('\n', ' '), re.DOTALL)
+    
+    if not json_match:
+         clean_content = response_content.replace("```json", "").replace("```", "").strip()
+         if clean_content.startswith("{") and '"tool":' in clean_content:
+             json_match = True 
+
+    if json_match or (response_content.strip().startswith("{") and '"tool":' in response_content):
+        return json_match or True
+    return None
+
+def _parse_tool_call(response_content, json_match):
+    try:
+        if hasattr(json_match, 'group'):
+            return json.loads(json_match.group(0))
+        clean_content = response_content.replace("```json", "").replace("```", "").strip()
+        return json.loads(clean_content)
+    except:
+        start = response_content.find("{")
+        end = response_content.rfind("}") + 1
+        return json.loads(response_content[start:end])
+
+@metrics.timed("tool")
+def _execute_tool(tool_data):
+    tool_type = tool_data.get("tool")
+    result_data = {}
+    metrics.inc("tool_calls_total", tool=str(tool_type))
+    
+    if tool_type == "get_schema":
+        col = tool_data.get("collection")
+        result_data = database.get_database_schema(mode="detail", collection_name=col)
+        print(f" Fetched schema for: {col}")
+        
+    elif tool_type == "search":
+        col = tool_data.get("collection")
+        query = tool_data.get("query", {})
+        limit = tool_data.get("limit", 10) 
+        results = database.find_documents(col, query, limit=limit)
+        result_data = results
+        print(f"✅ Found {len(results)} results (Limit: {limit})")
+        if len(results) > 0:
+            print(f"📄 Sample: {str(results[0])[:150]}...")
+    return result_data
+
+def _append_tool_results(messages, response_content, result_data):
+    messages.append({"role": "assistant", "content": response_content})
+    results_str = json.dumps(result_data, default=str) 
+    messages.append({"role": "system", "content": f"TOOL RESULTS: {results_str}"})
+
+def get_response(user_text):
+    """
+    Sends text to OpenRouter (using Llama 3 by default) and returns the response.
+    """
+    client = _get_client()
+    if client is None:
+        return NO_API_KEY_MESSAGE
+
+    messages = build_messages(user_text)
+    metrics.inc("replies_total", mode="full")
+
     try:
         # 1. First Pass: Ask the LLM
-        completion = client.chat.completions.create(
-            model=os.getenv("LLM_MODEL", "qwen/qwen-2.5-7b-instruct"),
-            messages=messages
-        )
+        with metrics.span("llm_first"):
+            completion = client.chat.completions.create(
+                model=_model_name(),
+                messages=messages
+            )
         response_content = completion.choices[0].message.content.strip()
 
         # 2. Check for Tool Call (Robust JSON Extraction)
-        import re
-        json_match = re.search(r'\{.*"tool":.*\}', response_content.replace('\n', ' '), re.DOTALL)
-        
-        if not json_match:
-             clean_content = response_content.replace("```json", "").replace("```", "").strip()
-             if clean_content.startswith("{") and '"tool":' in clean_content:
-                 json_match = True 
-
-        if json_match or (response_content.strip().startswith("{") and '"tool":' in response_content):
+        json_match = _detect_tool_call(response_content)
+        if json_match:
             try:
                 print(f"🕵️‍♀️ Tool Call Detected: {response_content}")
-                
-                 # Parse JSON
-                try:
-                    if hasattr(json_match, 'group'):
-                        tool_data = json.loads(json_match.group(0))
-                    else:
-                        clean_content = response_content.replace("```json", "").replace("```", "").strip()
-                        tool_data = json.loads(clean_content)
-                except:
-                    start = response_content.find("{")
-                    end = response_content.rfind("}") + 1
-                    tool_data = json.loads(response_content[start:end])
-
-                tool_type = tool_data.get("tool")
-                result_data = {}
-                
-                if tool_type == "get_schema":
-                    col = tool_data.get("collection")
-                    result_data = database.get_database_schema(mode="detail", collection_name=col)
-                    print(f" Fetched schema for: {col}")
-                    
-                elif tool_type == "search":
-                    col = tool_data.get("collection")
-                    query = tool_data.get("query", {})
-                    limit = tool_data.get("limit", 10) 
-                    results = database.find_documents(col, query, limit=limit)
-                    result_data = results
-                    print(f"✅ Found {len(results)} results (Limit: {limit})")
-                    if len(results) > 0:
-                        print(f"📄 Sample: {str(results[0])[:150]}...")
+                tool_data = _parse_tool_call(response_content, json_match)
+                result_data = _execute_tool(tool_data)
 
                 # 3. Second Pass: Feed results back
-                messages.append({"role": "assistant", "content": response_content})
-                results_str = json.dumps(result_data, default=str) 
-                messages.append({"role": "system", "content": f"TOOL RESULTS: {results_str}"})
-                
-                final_completion = client.chat.completions.create(
-                    model=os.getenv("LLM_MODEL", "qwen/qwen-2.5-7b-instruct"),
-                    messages=messages
-                )
+                _append_tool_results(messages, response_content, result_data)
+                with metrics.span("llm_second"):
+                    final_completion = client.chat.completions.create(
+                        model=_model_name(),
+                        messages=messages
+                    )
                 return final_completion.choices[0].message.content
             except Exception as e:
                 print(f"Tool Error: {e}")
@@ -232,6 +258,163 @@ IMPORTANT:
         traceback.print_exc()
         return f"Brain freeze! Error: {str(e)}"
 
+def _stream_deltas(client, messages):
+    stream = client.chat.completions.create(
+        model=_model_name(),
+        messages=messages,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+# A "{" or code fence at the start of the reply or of a line: where _detect_tool_call finds tool JSON
+TOOL_CALL_OPENER = re.compile(r'(?:^|\n)[ \t]*([{`])')
+
+def _tool_call_start(text, start=0):
+    """
+    Index of the first "{" or code fence at or after start that opens the reply or a line, or -1.
+    """
+    match = TOOL_CALL_OPENER.search(text, start)
+    return match.start(1) if match else -1
+
+def _could_be_tool_call(held):
+    """
+    Whether text starting at a "{" or code fence may still turn out to be a tool call.
+    False as soon as it cannot: a fence that is not JSON, a "{" not followed by a key,
+    or an object that closed without a "tool" key.
+    """
+    body = held
+    if body.startswith("`"):
+        if not body.startswith("```"):
+            return "```".startswith(body)
+        body = body[3:]
+        if "json".startswith(body):
+            return True
+        if body.startswith("json"):
+            body = body[4:]
+        body = body.lstrip()
+        if not body:
+            return True
+        if body[0] != "{":
+            return False
+
+    inner = body[1:].lstrip()
+    if inner and inner[0] not in '"}':
+        return False
+
+    depth, in_string, escaped = 0, False, False
+    for i, char in enumerate(body):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return '"tool":' in body[:i + 1]
+    return True
+
+def stream_response(user_text):
+    """
+    Streaming variant of get_response: yields the reply as text deltas.
+    Text passes straight through; only a "{" or code fence at the start of the reply or of
+    a line is held back, and only while it can still be a tool call. Once it can't (prose
+    in braces, a non-JSON code block, an object without a "tool" key) it is released and
+    streaming resumes. A reply that ends in a held candidate is checked with
+    _detect_tool_call, the same rule get_response uses, so tool JSON is never spoken.
+    On a tool call the second pass (after the tool ran) is what gets streamed; unlike
+    get_response, any text before the JSON has already gone out.
+    """
+    client = _get_client()
+    if client is None:
+        yield NO_API_KEY_MESSAGE
+        return
+
+    messages = build_messages(user_text)
+    metrics.inc("replies_total", mode="stream")
+
+    try:
+        deltas = _stream_deltas(client, messages)
+        head = ""
+        with metrics.span("llm_first_token"):
+            for delta in deltas:
+                head += delta
+                if head.strip():
+                    break
+
+        reply, sent, scan, opener = "", 0, 0, None
+        for delta in itertools.chain([head], deltas):
+            reply += delta
+            while opener is None or not _could_be_tool_call(reply[opener:]):
+                if opener is not None:
+                    scan = opener + 1  # not a tool call after all: release it, look further on
+                opener = _tool_call_start(reply, scan)
+                if opener < 0:
+                    opener = None
+                    scan = max(scan, reply.rfind("\n"))
+                    break
+            end = len(reply) if opener is None else opener
+            if end > sent:
+                yield reply[sent:end]
+                sent = end
+
+        # Plain answer: everything has been passed through already
+        if opener is None:
+            return
+
+        held = reply[opener:]
+        response_content = reply.strip()
+        json_match = _detect_tool_call(response_content)
+        if not json_match:
+            yield held
+            return
+
+        try:
+            print(f"🕵️‍♀️ Tool Call Detected: {response_content}")
+            tool_data = _parse_tool_call(response_content, json_match)
+            result_data = _execute_tool(tool_data)
+            _append_tool_results(messages, response_content, result_data)
+        except Exception as e:
+            print(f"Tool Error: {e}")
+            yield f"I tried to use the database tool but it failed: {str(e)}"
+            return
+
+        yield from _stream_deltas(client, messages)
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        yield f"Brain freeze! Error: {str(e)}"
+
+def iter_sentences(deltas):
+    """
+    Regroups a stream of text deltas into sentences so each can be spoken as soon as it is complete.
+    """
+    buffer = ""
+    for delta in deltas:
+        buffer += delta
+        while True:
+            cut = None
+            for match in SENTENCE_END.finditer(buffer):
+                if match.end() >= MIN_SENTENCE_CHARS:
+                    cut = match.end()
+                    break
+            if cut is None:
+                break
+            sentence, buffer = buffer[:cut].strip(), buffer[cut:]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
 if __name__ == "__main__":
     # Test
     # print(get_response("Who is employee 1223?"))
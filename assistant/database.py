@@ -1,29 +1,145 @@
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+try:
+    from .schema_catalog import SchemaCatalog
+    from . import query_cache
+    from . import metrics
+except ImportError:
+    # Running as a script from inside assistant/
+    from schema_catalog import SchemaCatalog
+    import query_cache
+    import metrics
+
 load_dotenv()
 
 # Default to a local instance if not provided, but we expect it in .env
-# Default to a local instance if not provided, but we expect it in .env
+# Use "mongomock://" to run against an in-memory stand-in (tests / benchmarks)
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGO_DB_NAME", "voice_assistant_db")
 
+# Connection Pool
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 20))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 10000))
+MONGO_HEALTH_INTERVAL = float(os.getenv("MONGO_HEALTH_INTERVAL", 30))
+
+# Full-corpus export (ingestion)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+INGEST_LIMIT_PER_COLLECTION = int(os.getenv("INGEST_LIMIT_PER_COLLECTION", 0))  # 0 = everything
+
+_client = None
+_client_lock = threading.Lock()
+_healthy = None
+_health_thread = None
+_health_stop = threading.Event()
+
+def _client_options():
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+    }
+
+def _is_mock():
+    return MONGO_URI.startswith("mongomock://")
+
+def _ping():
+    global _healthy
+    try:
+        _client.admin.command('ping')
+        if _healthy is False:
+            print("✓ MongoDB connection restored")
+        _healthy = True
+    except Exception as e:
+        if _healthy is not False:
+            print(f"✗ Failed to connect to MongoDB: {e}")
+        _healthy = False
+    return _healthy
+
+def _health_loop():
+    while not _health_stop.wait(MONGO_HEALTH_INTERVAL):
+        _ping()
+
+def get_client():
+    """
+    Returns the process-wide pooled MongoClient, creating it on first use.
+    The client is thread-safe; every caller shares its connection pool.
+    """
+    global _client, _health_thread
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if _is_mock():
+                    import mongomock
+                    client = mongomock.MongoClient()
+                else:
+                    print(f"DEBUG: Connecting to MongoDB at {MONGO_URI.split('@')[-1] if '@' in MONGO_URI else 'localhost'}...")
+                    client = MongoClient(MONGO_URI, **_client_options())
+                _client = client
+                # One blocking ping up front, then keep the status fresh in the background
+                _ping()
+                if not _is_mock() and MONGO_HEALTH_INTERVAL > 0:
+                    _health_thread = threading.Thread(target=_health_loop, name="mongo-health", daemon=True)
+                    _health_thread.start()
+    return _client
+
+def is_healthy():
+    """
+    Last known server status from the background health check (None = not connected yet).
+    """
+    return _healthy
+
 def get_db_connection():
     """
-    Establishes a connection to the MongoDB database.
+    Returns the database handle from the shared client.
+    Returns None straight away while the health check reports the server as down.
     """
     try:
-        # Reduced timeout for faster failure
-        print(f"DEBUG: Connecting to MongoDB at {MONGO_URI.split('@')[-1] if '@' in MONGO_URI else 'localhost'}...")
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-        # Check if connection is successful
-        client.admin.command('ping')
+        client = get_client()
+        if _healthy is False and _health_thread is None:
+            _ping() # No background checker, re-probe inline
+        if _healthy is False:
+            return None
         return client[DB_NAME]
     except Exception as e:
         print(f"✗ Failed to connect to MongoDB: {e}")
         return None
 
+def close_connections():
+    global _client, _healthy, _health_thread
+    _health_stop.set()
+    if _health_thread is not None:
+        _health_thread.join()
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = _healthy = _health_thread = None
+        _health_stop.clear()  # a later get_client() starts a health checker that actually runs
+
+# Cached collection names / field sets, validated against instead of querying per call
+schema_catalog = SchemaCatalog(get_db_connection)
+
+# LRU of recent find_documents results (None when disabled)
+result_cache = query_cache.QueryCache() if query_cache.QUERY_CACHE_ENABLED else None
+
+def invalidate_query_cache(collection_name=None):
+    """
+    Drops cached find_documents results for one collection (or all) in this process.
+    Other processes are notified with query_cache.publish_invalidation().
+    """
+    if result_cache is not None:
+        result_cache.invalidate(collection_name)
+
 def seed_db():
     print("⚠️  Skipping seed_db() for remote database to protect data.")
 
@@ -31,6 +147,7 @@ def get_whole_database():
     """
     Dynamically fetches ALL data from ALL collections in the database.
     CAUTION: For large remote databases, this might be slow.
+    Ingestion uses stream_whole_database() instead.
     """
     db = get_db_connection()
     if db is None:
@@ -53,30 +170,162 @@ def get_whole_database():
         
     return whole_db
 
+def iter_collection(collection_name, batch_size=INGEST_BATCH_SIZE, limit=INGEST_LIMIT_PER_COLLECTION):
+    """
+    Streams a whole collection (with _id) using server-side batches.
+    Raises if the server is unreachable, so an export is never mistaken for an empty collection.
+    """
+    db = get_db_connection()
+    if db is None:
+        raise ConnectionError(f"MongoDB unavailable while exporting {collection_name}")
+    cursor = db[collection_name].find({}).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+    yield from cursor
+
+def stream_whole_database(batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS,
+                          limit_per_collection=INGEST_LIMIT_PER_COLLECTION):
+    """
+    Yields (collection_name, document) for every document in every collection.
+    Collections are read in parallel threads into a bounded queue, so memory stays
+    flat no matter how large the database is. If any collection's export fails, its
+    exception is raised here, so the caller never mistakes a partial corpus for a complete one.
+    """
+    names = list_source_collections()
+    if not names:
+        return
+
+    handoff = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+
+    class Failed:
+        def __init__(self, name, error):
+            self.name, self.error = name, error
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def export(name):
+        try:
+            for doc in iter_collection(name, batch_size, limit_per_collection):
+                if not put((name, doc)):
+                    return
+        except Exception as e:
+            print(f"✗ Export of {name} failed: {e}")
+            put(Failed(name, e))
+        finally:
+            put(done)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(names))), thread_name_prefix="export")
+    for name in names:
+        pool.submit(export, name)
+    try:
+        finished = 0
+        while finished < len(names):
+            item = handoff.get()
+            if item is done:
+                finished += 1
+                continue
+            if isinstance(item, Failed):
+                raise RuntimeError(f"Export of {item.name} failed: {item.error}") from item.error
+            yield item
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def list_source_collections():
+    """
+    Fresh (uncached) list of user collections, for ingestion.
+    """
+    db = get_db_connection()
+    if db is None:
+        return []
+    return [c for c in db.list_collection_names() if not c.startswith("system.")]
+
+def iter_changed_documents(collection_name, field="_id", after=None, batch_size=1000):
+    """
+    Yields documents (with _id) whose `field` is greater than `after`, in `field` order,
+    so the last one seen is the next watermark.
+    """
+    db = get_db_connection()
+    if db is None:
+        return
+    query = {field: {"$gt": after}} if after is not None else {field: {"$exists": True}}
+    cursor = db[collection_name].find(query).sort(field, 1).batch_size(batch_size)
+    yield from cursor
+
+def count_missing_field(collection_name, field):
+    """
+    Number of documents without `field` (they can never pass a watermark query on it).
+    """
+    db = get_db_connection()
+    if db is None:
+        return 0
+    return db[collection_name].count_documents({field: {"$exists": False}})
+
+def iter_document_ids(collection_name, batch_size=5000):
+    """
+    Yields every _id in a collection (used to find deleted documents).
+    """
+    db = get_db_connection()
+    if db is None:
+        return
+    for doc in db[collection_name].find({}, {"_id": 1}).batch_size(batch_size):
+        yield doc["_id"]
+
 def get_database_schema(mode="summary", collection_name=None):
     """
-    Returns database structure.
+    Returns database structure (served from the schema catalog).
     mode="summary": Returns list of all collection names (Low token usage).
     mode="detail": Returns fields for a specific collection (High token usage).
     """
-    db = get_db_connection()
-    if db is None:
+    cols = schema_catalog.collections()
+    if cols is None:
         return {}
     
     if mode == "detail" and collection_name:
-        if collection_name not in db.list_collection_names():
+        if not schema_catalog.has_collection(collection_name):
             return {"error": "Collection not found"}
-        sample = db[collection_name].find_one()
-        if sample:
-            keys = [k for k in sample.keys() if k != "_id"]
-            return {collection_name: keys}
-        return {collection_name: []}
+        return {collection_name: schema_catalog.fields(collection_name) or []}
 
     # Summary Mode (Default)
-    cols = db.list_collection_names()
-    clean_cols = [c for c in cols if not c.startswith("system.")]
-    return {"collections": clean_cols}
+    return {"collections": cols}
 
+def _prepare_find(query, limit):
+    """
+    Cleans an LLM-built query: pulls sort/projection/limit options out of the filter.
+    Returns (filter, projection, sort_spec, safe_limit).
+    """
+    # 1. Clean the query (Extract options if the LLM put them inside)
+    clean_query = query.copy()
+    sort_option = clean_query.pop("sort", None)
+    projection_option = clean_query.pop("projection", {"_id": 0}) # Default to hiding _id
+    
+    # Override limit if passed inside query
+    if "limit" in clean_query:
+         limit = clean_query.pop("limit")
+
+    # 2. Safety Limit
+    safe_limit = min(int(limit), 50) 
+
+    # 3. Sort: handle {"field": -1} or simple "field" string
+    sort_spec = None
+    if sort_option:
+        if isinstance(sort_option, str):
+            sort_spec = [(sort_option, 1)] # Default to ascending
+        elif isinstance(sort_option, dict):
+            sort_spec = [(k, int(v)) for k, v in sort_option.items()]
+
+    return clean_query, projection_option, sort_spec, safe_limit
+
+@metrics.timed("mongo")
 def find_documents(collection_name, query={}, limit=10):
     """
     Executes a dynamic find query on a specific collection.
@@ -86,35 +335,25 @@ def find_documents(collection_name, query={}, limit=10):
     if db is None: return []
     
     try:
-        if collection_name not in db.list_collection_names():
+        if not schema_catalog.has_collection(collection_name):
             return [f"Error: Collection '{collection_name}' does not exist."]
             
-        # 1. Clean the query (Extract options if the LLM put them inside)
-        clean_query = query.copy()
-        sort_option = clean_query.pop("sort", None)
-        projection_option = clean_query.pop("projection", {"_id": 0}) # Default to hiding _id
-        
-        # Override limit if passed inside query
-        if "limit" in clean_query:
-             limit = clean_query.pop("limit")
+        clean_query, projection_option, sort_spec, safe_limit = _prepare_find(query, limit)
+        cache_key = None
+        if result_cache is not None:
+            cache_key = query_cache.make_key(collection_name, clean_query, projection_option, sort_spec, safe_limit)
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-        # 2. Safety Limit
-        safe_limit = min(int(limit), 50) 
-        
-        # 3. Construct Cursor
         cursor = db[collection_name].find(clean_query, projection_option)
-        
-        # 4. Apply Sort
-        if sort_option:
-            # Handle {"field": -1} or simple "field" string
-            if isinstance(sort_option, str):
-                cursor = cursor.sort(sort_option, 1) # Default to ascending
-            elif isinstance(sort_option, dict):
-                for k, v in sort_option.items():
-                    cursor = cursor.sort(k, int(v))
-        
+        if sort_spec:
+            cursor = cursor.sort(sort_spec)
         cursor = cursor.limit(safe_limit)
-        return list(cursor)
+        results = list(cursor)
+        if cache_key is not None:
+            result_cache.put(cache_key, collection_name, results)
+        return results
     except Exception as e:
         return [f"Database Error: {e}"]
 
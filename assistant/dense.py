@@ -0,0 +1,326 @@
+"""
+Dense retrieval: sentence embeddings + a per-segment IVF (inverted file) index.
+
+Each segment written with embeddings gets, next to its sparse rows:
+    dense_codes.npy      int8 (or float16) embeddings, grouped by IVF list
+    dense_scale.npy      per-row dequantization scale (int8 only)
+    ivf_centroids.npy    k-means centroids (nlist, dim)
+    ivf_offsets.npy      list boundaries into ivf_rows
+    ivf_rows.npy         list position -> local row (ivf_positions.npy is the inverse)
+A query scores the centroids, then only the rows of its DENSE_NPROBE closest lists.
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+RAG_DENSE = os.getenv("RAG_DENSE", "0") == "1"                             # compute embeddings at ingest time
+DENSE_ENCODER = os.getenv("DENSE_ENCODER", "sentence-transformers/all-MiniLM-L6-v2")  # or "stub"
+DENSE_DEVICE = os.getenv("DENSE_DEVICE", "cpu")
+DENSE_STUB_DIM = int(os.getenv("DENSE_STUB_DIM", 384))
+DENSE_BATCH_SIZE = int(os.getenv("DENSE_BATCH_SIZE", 256))
+DENSE_DTYPE = os.getenv("DENSE_DTYPE", "int8")                             # "int8" or "float16"
+DENSE_NPROBE = int(os.getenv("DENSE_NPROBE", 8))
+DENSE_MIN_IVF_ROWS = int(os.getenv("DENSE_MIN_IVF_ROWS", 4096))           # smaller segments are scanned flat
+DENSE_KMEANS_ITERATIONS = 10
+
+
+# --- Encoders ---
+
+class StubEncoder:
+    """
+    Deterministic offline encoder: hashed character n-grams, l2-normalized.
+    No model download; similar spellings land close together, paraphrases don't.
+    """
+    def __init__(self, dim=DENSE_STUB_DIM):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.name = "stub"
+        self.dim = dim
+        self._hasher = HashingVectorizer(analyzer="char_wb", ngram_range=(3, 4), n_features=dim,
+                                         alternate_sign=True, norm="l2")
+
+    def encode(self, texts, batch_size=DENSE_BATCH_SIZE):
+        return self._hasher.transform(texts).toarray().astype(np.float32)
+
+
+class SentenceTransformerEncoder:
+    def __init__(self, name=DENSE_ENCODER, device=DENSE_DEVICE):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = name
+        self._model = SentenceTransformer(name, device=device)
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=DENSE_BATCH_SIZE):
+        return self._model.encode(list(texts), batch_size=batch_size, normalize_embeddings=True,
+                                  convert_to_numpy=True, show_progress_bar=False).astype(np.float32)
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(name=DENSE_ENCODER):
+    """
+    Loads an encoder once per process; ingest and every request share it.
+    """
+    with _encoders_lock:
+        encoder = _encoders.get(name)
+        if encoder is None:
+            started = time.perf_counter()
+            encoder = StubEncoder() if name == "stub" else SentenceTransformerEncoder(name)
+            _encoders[name] = encoder
+            print(f"✅ Dense encoder loaded: {name} ({encoder.dim}d, {time.perf_counter() - started:.1f}s)")
+        return encoder
+
+
+def describe(encoder):
+    """
+    Manifest entry: queries must be encoded with the model the index was built with.
+    """
+    return {"encoder": encoder.name, "dim": encoder.dim, "dtype": DENSE_DTYPE}
+
+
+# --- Building ---
+
+def quantize(embeddings, dtype=DENSE_DTYPE):
+    """
+    float32 rows -> (codes, scale). int8 uses a symmetric per-row scale.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype == "float16":
+        return embeddings.astype(np.float16), None
+    scale = np.abs(embeddings).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.empty(embeddings.shape, dtype=np.int8)
+    for i in range(0, len(embeddings), 65536):  # blocks keep the float temporaries small
+        codes[i:i + 65536] = np.round(embeddings[i:i + 65536] / scale[i:i + 65536, None])
+    return codes, scale.astype(np.float32)
+
+
+def kmeans(embeddings, nlist, iterations=DENSE_KMEANS_ITERATIONS, seed=0):
+    """
+    Spherical k-means on a sample (inner product on l2-normalized rows).
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(embeddings), nlist * 64)
+    sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Re-seed empty lists from random sample rows
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1), 1e-12)[:, None]
+    return centroids.astype(np.float32)
+
+
+def _assign(embeddings, centroids, batch=65536):
+    return np.concatenate([
+        np.argmax(embeddings[i:i + batch] @ centroids.T, axis=1)
+        for i in range(0, len(embeddings), batch)
+    ]) if len(embeddings) else np.zeros(0, dtype=np.int64)
+
+
+def build_ivf(embeddings, nlist=None):
+    """
+    Returns (centroids, offsets, rows). About sqrt(n) lists; one list for small segments.
+    """
+    n = len(embeddings)
+    if nlist is None:
+        nlist = 1 if n < DENSE_MIN_IVF_ROWS else int(np.sqrt(n))
+    if nlist <= 1:
+        centroid = embeddings.mean(axis=0, keepdims=True) if n else np.zeros((1, embeddings.shape[1]))
+        return (centroid.astype(np.float32), np.array([0, n], dtype=np.int64),
+                np.arange(n, dtype=np.int32))
+    centroids = kmeans(embeddings, nlist)
+    assign = _assign(embeddings, centroids)
+    rows = np.argsort(assign, kind="stable").astype(np.int32)
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+    return centroids, offsets, rows
+
+
+class DenseSegment:
+    """
+    Quantized embeddings + IVF lists for one segment (memory-mapped when loaded from disk).
+    Codes are stored grouped by list, so probing a list is one contiguous slice.
+    """
+    def __init__(self, codes, scale, centroids, offsets, rows, positions):
+        self.codes = codes            # list order
+        self.scale = scale            # list order (int8 only)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = offsets        # list boundaries into codes / rows
+        self.rows = rows              # list position -> local row
+        self.positions = positions    # local row -> list position
+        self.n_docs = len(codes)
+
+    @classmethod
+    def build(cls, embeddings, dtype=DENSE_DTYPE):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        centroids, offsets, rows = build_ivf(embeddings)
+        codes, scale = quantize(embeddings, dtype)
+        codes = codes[rows]
+        scale = scale[rows] if scale is not None else None
+        positions = np.empty(len(rows), dtype=np.int32)
+        positions[rows] = np.arange(len(rows), dtype=np.int32)
+        return cls(codes, scale, centroids, offsets, rows, positions)
+
+    @classmethod
+    def load(cls, seg_dir):
+        def load(name):
+            path = os.path.join(seg_dir, f"{name}.npy")
+            return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+        return cls(*(load(name) for name in ("dense_codes", "dense_scale", "ivf_centroids",
+                                             "ivf_offsets", "ivf_rows", "ivf_positions")))
+
+    @staticmethod
+    def exists(seg_dir):
+        return os.path.exists(os.path.join(seg_dir, "ivf_positions.npy"))
+
+    def save(self, seg_dir):
+        np.save(os.path.join(seg_dir, "dense_codes.npy"), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(seg_dir, "dense_scale.npy"), self.scale)
+        np.save(os.path.join(seg_dir, "ivf_centroids.npy"), self.centroids)
+        np.save(os.path.join(seg_dir, "ivf_offsets.npy"), self.offsets)
+        np.save(os.path.join(seg_dir, "ivf_rows.npy"), self.rows)
+        # Written last: its presence marks the segment's dense data as complete
+        np.save(os.path.join(seg_dir, "ivf_positions.npy"), self.positions)
+
+    def _block_scores(self, start, end, query):
+        scores = np.asarray(self.codes[start:end], dtype=np.float32) @ query
+        if self.scale is not None:
+            scores *= self.scale[start:end]
+        return scores
+
+    def vectors(self, local_rows):
+        """
+        Dequantized float32 embeddings for the given local rows.
+        """
+        pos = np.asarray(self.positions[local_rows])
+        vectors = np.asarray(self.codes[pos], dtype=np.float32)
+        if self.scale is not None:
+            vectors *= np.asarray(self.scale[pos])[:, None]
+        return vectors
+
+    def score(self, local_rows, query):
+        return self.vectors(local_rows) @ query
+
+    def probe(self, query, nprobe=DENSE_NPROBE):
+        """
+        (local rows, scores) for the rows of the `nprobe` lists closest to the query.
+        """
+        nlist = len(self.centroids)
+        if nlist <= nprobe:
+            lists = np.arange(nlist)
+        else:
+            lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        bounds = [(int(self.offsets[l]), int(self.offsets[l + 1])) for l in lists]
+        local = np.concatenate([self.rows[a:b] for a, b in bounds])
+        scores = np.concatenate([self._block_scores(a, b, query) for a, b in bounds])
+        return local, scores
+
+
+def write_dense(seg_dir, embeddings):
+    DenseSegment.build(embeddings).save(seg_dir)
+
+
+# --- Searching ---
+
+def search(segments, row_starts, query, k, nprobe=DENSE_NPROBE, tombstones=None):
+    """
+    Approximate top-k by inner product across segments. Returns (global rows, scores), best first.
+    """
+    row_parts, score_parts = [], []
+    for seg, start in zip(segments, row_starts):
+        local, scores = seg.probe(query, nprobe)
+        row_parts.append(local.astype(np.int64) + start)
+        score_parts.append(scores)
+    if not row_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rows, scores = np.concatenate(row_parts), np.concatenate(score_parts)
+    if tombstones is not None and len(rows):
+        keep = ~np.asarray(tombstones[rows], dtype=bool)
+        rows, scores = rows[keep], scores[keep]
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+def score_rows(segments, row_starts, query, rows):
+    """
+    Exact (dequantized) scores for arbitrary global rows.
+    """
+    scores = np.zeros(len(rows), dtype=np.float32)
+    seg_nos = np.searchsorted(row_starts, rows, side="right") - 1
+    for seg_no in np.unique(seg_nos):
+        mask = seg_nos == seg_no
+        local = rows[mask] - row_starts[seg_no]
+        scores[mask] = segments[seg_no].score(local, query)
+    return scores
+
+
+# --- Benchmark ---
+
+def _synthetic_embeddings(n_docs, dim=384, n_topics=2000, seed=0):
+    """
+    Clustered unit vectors (topics + noise), generated in blocks to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    out = np.empty((n_docs, dim), dtype=np.float32)
+    for i in range(0, n_docs, 100_000):
+        n = min(100_000, n_docs - i)
+        block = topics[rng.integers(0, n_topics, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+        out[i:i + n] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return out
+
+
+def benchmark(sizes=(10_000, 100_000, 1_000_000), n_queries=50, k=3, nprobe=DENSE_NPROBE):
+    for n_docs in sizes:
+        embeddings = _synthetic_embeddings(n_docs)
+        started = time.perf_counter()
+        seg = DenseSegment.build(embeddings)
+        build_s = time.perf_counter() - started
+        queries = embeddings[np.random.default_rng(1).choice(n_docs, n_queries, replace=False)]
+        queries = queries + 0.5 / np.sqrt(queries.shape[1]) * np.random.default_rng(2).standard_normal(queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        timings, recall = [], 0
+        for q in queries:
+            exact = set(np.argpartition(-(embeddings @ q), k - 1)[:k].tolist())
+            t0 = time.perf_counter()
+            rows, _ = search([seg], [0], q, k, nprobe)
+            timings.append(1000 * (time.perf_counter() - t0))
+            recall += len(exact & set(rows.tolist())) / k
+
+        codes_mb = (seg.codes.nbytes + (seg.scale.nbytes if seg.scale is not None else 0)) / 2 ** 20
+        print(json.dumps({
+            "docs": n_docs, "dtype": DENSE_DTYPE, "nlist": len(seg.centroids), "nprobe": nprobe,
+            "build_s": round(build_s, 1), "index_mb": round(codes_mb, 1),
+            "p50_ms": round(float(np.percentile(timings, 50)), 3),
+            "p99_ms": round(float(np.percentile(timings, 99)), 3),
+            f"recall@{k}": round(recall / n_queries, 3),
+        }))
+        del embeddings, seg
+
+
+if __name__ == "__main__":
+    # python -m assistant.dense bench [sizes...]
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = tuple(int(n) for n in sys.argv[2:]) or (10_000, 100_000, 1_000_000)
+        benchmark(sizes)
@@ -0,0 +1,116 @@
+import os
+import copy
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+try:
+    from whisper_app import model_registry
+except ImportError:
+    import sys
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from whisper_app import model_registry
+
+load_dotenv()
+
+# Configuration
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))  # each worker gets its own model copy
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", 8))
+INFERENCE_RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", 5))
+
+
+class InferenceQueueFull(Exception):
+    """
+    Raised when the executor already holds as many jobs as it is allowed to queue.
+    """
+    def __init__(self, retry_after=INFERENCE_RETRY_AFTER):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Owns the Whisper model and runs every call against it on a dedicated thread pool.
+    Admission is bounded: at most `max_workers` jobs run and `max_queue` wait, the rest are shed.
+
+    A model must not run on two threads at once (whisper's kv-cache hooks live on the shared
+    decoder modules), so every worker beyond the first gets its own deep copy of the model
+    and a job checks one out for as long as it runs.
+    """
+    def __init__(self, model, max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_SIZE):
+        self.model = model
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.models = [model] + [copy.deepcopy(model) for _ in range(max_workers - 1)]
+        self._free = queue.SimpleQueue()
+        for replica in self.models:
+            self._free.put(replica)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="whisper")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def reject(self):
+        """
+        Counts a shed request and raises InferenceQueueFull; also used by queues in front of the executor.
+        """
+        with self._lock:
+            self.rejected += 1
+        raise InferenceQueueFull()
+
+    def _admit(self):
+        if not self._slots.acquire(blocking=False):
+            self.reject()
+        with self._lock:
+            self._pending += 1
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _call(self, func, args, kwargs):
+        # One model per pool thread, so a free one is always waiting here
+        model = self._free.get()
+        try:
+            return func(model, *args, **kwargs)
+        finally:
+            self._free.put(model)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs `func(model, *args, **kwargs)` on the pool without blocking the event loop,
+        with a model no other job is using.
+        """
+        self._admit()
+        try:
+            future = self._pool.submit(self._call, func, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def transcribe(self, audio, **options):
+        options.setdefault("fp16", model_registry.is_fp16(self.model))
+        return await self.run(lambda m, a: m.transcribe(a, **options), audio)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "model_copies": len(self.models),
+                "queue_size": self.max_queue,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
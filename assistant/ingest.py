@@ -1,79 +1,365 @@
 
 import os
 import json
-import pickle
+import time
+import argparse
+import itertools
 import numpy as np
+from bson import json_util
 from sklearn.feature_extraction.text import TfidfVectorizer
 
 # Fix relative import for standalone execution
 if __name__ == "__main__":
     import sys
     sys.path.append(os.getcwd())
-    from assistant import database
+    from assistant import database, query_cache, rag_index, dense
 else:
-    from . import database
+    from . import database, query_cache, rag_index, dense
 
 # Paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-KNOWLEDGE_DIR = os.path.join(BASE_DIR, "knowledge_store")
+KNOWLEDGE_DIR = rag_index.KNOWLEDGE_DIR
 os.makedirs(KNOWLEDGE_DIR, exist_ok=True)
 
-VECTORIZER_PATH = os.path.join(KNOWLEDGE_DIR, "tfidf_vectorizer.pkl")
-MATRIX_PATH = os.path.join(KNOWLEDGE_DIR, "tfidf_matrix.pkl")
-DOCS_PATH = os.path.join(KNOWLEDGE_DIR, "documents.json")
+# Incremental Ingestion
+# Field used as the per-collection watermark. "_id" only catches inserts: edits to existing documents
+# are picked up only with an updated-at field, which every document of that collection must carry
+INGEST_WATERMARK_FIELD = os.getenv("INGEST_WATERMARK_FIELD", "_id")
+INGEST_WATERMARK_FIELDS = os.getenv("INGEST_WATERMARK_FIELDS", "")  # per collection, e.g. "orders=updated_at"
+RAG_MAX_SEGMENTS = int(os.getenv("RAG_MAX_SEGMENTS", 8))
+RAG_MAX_TOMBSTONE_RATIO = float(os.getenv("RAG_MAX_TOMBSTONE_RATIO", 0.2))
 
-def ingest_data():
-    print("🚀 Starting TF-IDF Ingestion (Lock-Free)...")
-    print(f"📁 Storage Path: {KNOWLEDGE_DIR}")
+# Full Ingestion
+INGEST_FEATURIZER = os.getenv("INGEST_FEATURIZER", "tfidf")  # "tfidf" (in-memory, fitted) or "hashing" (streaming)
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 50000))  # documents per segment
+
+def _dense_encoder():
+    # Embeddings are optional (RAG_DENSE=1); the encoder is loaded once per run
+    return dense.get_encoder() if dense.RAG_DENSE else None
+
+def _embed(encoder, texts):
+    if encoder is None:
+        return None
+    started = time.perf_counter()
+    embeddings = encoder.encode(texts, batch_size=dense.DENSE_BATCH_SIZE)
+    print(f"   embedded {len(texts)} docs ({len(texts) / (time.perf_counter() - started):.0f} docs/sec)")
+    return embeddings
+
+def doc_to_text(col_name, doc):
+    # Flatten doc to string
+    text_representation = f"Collection: {col_name}\n"
+    text_representation += json.dumps(doc, default=str, indent=0).replace("{", "").replace("}", "").replace('"', "")
+    return text_representation
+
+def _to_document(col_name, doc):
+    return {
+        "id": f"{col_name}:{doc['_id']}",
+        "text": doc_to_text(col_name, {k: v for k, v in doc.items() if k != "_id"}),
+        "source": col_name
+    }
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def _stream_documents(watermarks):
+    """
+    Flattened documents straight from the parallel export.
+    Records each collection's highest watermark value on the way, so an incremental run can continue from here.
+    """
+    for col_name, doc in database.stream_whole_database():
+        field = _watermark_field(col_name)
+        value = doc.get(field)
+        if value is not None:
+            mark = watermarks.get(col_name)
+            try:
+                if mark is None or value > mark["value"]:
+                    watermarks[col_name] = {"field": field, "value": value}
+            except TypeError:
+                pass
+        yield _to_document(col_name, doc)
+
+def _ingest_tfidf(documents, started):
+    # Fitted vocabulary: needs the whole corpus in memory
+    documents = list(documents)
+    if not documents:
+        print("⚠️  No data found to ingest.")
+        return
+
+    print(f"⚡ Vectorizing {len(documents)} documents...")
+    texts = [d["text"] for d in documents]
     
-    # 1. Fetch Data
-    print("📥 Fetching data from MongoDB...")
-    whole_db = database.get_whole_database()
+    # TF-IDF Vectorization
+    vectorizer = TfidfVectorizer(stop_words='english')
+    tfidf_matrix = vectorizer.fit_transform(texts)
+    encoder = _dense_encoder()
+    embeddings = _embed(encoder, texts)
     
-    documents = []
+    # Save to disk as a new index generation (running servers swap to it automatically)
+    print("💾 Saving to disk...")
+    generation = rag_index.write_index(vectorizer, tfidf_matrix, documents, KNOWLEDGE_DIR,
+                                       embeddings, dense.describe(encoder) if encoder else None)
+    rate = len(documents) / (time.perf_counter() - started)
+        
+    print(f"✅ Ingestion Complete! Saved {len(documents)} records ({generation}, {rate:.0f} docs/sec).")
+
+    # Running servers drop cached tool results for the refreshed collections
+    query_cache.publish_invalidation(sorted({d["source"] for d in documents}))
+
+def ingest_data(featurizer=INGEST_FEATURIZER):
+    """
+    Full rebuild from a streaming export of every collection.
+    "hashing": documents are hashed and written as INGEST_CHUNK_SIZE segments as they arrive,
+    then re-weighted once the corpus-wide idf is known; memory is bounded by the chunk size.
+    "tfidf": fits a vocabulary, holds the corpus in memory.
+    """
+    print(f"🚀 Starting Streaming Ingestion ({featurizer})...")
+    print(f"📁 Storage Path: {KNOWLEDGE_DIR}")
     
-    # 2. Process Data
+    # 1. Stream Data
+    print("📥 Streaming data from MongoDB...")
+    started = time.perf_counter()
+    watermarks = {}
+    documents = _stream_documents(watermarks)
+    try:
+        if featurizer == "tfidf":
+            return _ingest_tfidf(documents, started)
+        return _ingest_hashing(documents, watermarks, started)
+    except Exception:
+        # Nothing was published: CURRENT still points at the previous, complete generation
+        print(f"❌ Ingestion aborted, {rag_index.read_current(KNOWLEDGE_DIR) or 'no index'} stays live.")
+        raise
+
+def _ingest_hashing(documents, watermarks, started):
+    # Segments written before a failure are never referenced and get removed by the next publish
+    # 2. Hash & write raw term counts chunk by chunk
+    hashing = rag_index.HashingFeaturizer(None)
+    encoder = _dense_encoder()
+    df = np.zeros(hashing.n_features, dtype=np.int64)
+    segments = []
+    sources = set()
     count = 0
-    for col_name, records in whole_db.items():
-        if not records: continue
-        
-        print(f"   Processing {col_name} ({len(records)} records)...")
-        
-        for doc in records:
-            # Flatten doc to string
-            text_representation = f"Collection: {col_name}\n"
-            text_representation += json.dumps(doc, default=str, indent=0).replace("{", "").replace("}", "").replace('"', "")
-            
-            documents.append({
-                "id": f"{col_name}_{count}",
-                "text": text_representation,
+    for chunk in _chunked(documents, INGEST_CHUNK_SIZE):
+        texts = [d["text"] for d in chunk]
+        counts = hashing.counts(texts)
+        df += _document_frequencies(counts)
+        segments.append(rag_index.write_segment(counts, chunk, KNOWLEDGE_DIR, _embed(encoder, texts)))
+        sources.update(d["source"] for d in chunk)
+        count += len(chunk)
+        print(f"   {count} docs ({count / (time.perf_counter() - started):.0f} docs/sec)")
+
+    if not count:
+        print("⚠️  No data found to ingest.")
+        return
+
+    # 3. Re-weight each segment with the final idf
+    print(f"⚡ Weighting {count} documents...")
+    idf = rag_index.smooth_idf(df, count)
+    for segment in segments:
+        raw = rag_index.Segment(os.path.join(KNOWLEDGE_DIR, segment), hashing.n_features).matrix
+        rag_index.rewrite_segment_matrix(segment, hashing.weight(raw, idf), KNOWLEDGE_DIR)
+
+    # 4. Publish
+    print("💾 Saving to disk...")
+    generation = _publish_hashing(hashing, segments, df, idf, count, np.zeros(count, dtype=bool), watermarks, 0,
+                                  dense.describe(encoder) if encoder else None)
+    rate = count / (time.perf_counter() - started)
+    print(f"✅ Ingestion Complete! Saved {count} records in {len(segments)} segment(s) ({generation}, {rate:.0f} docs/sec).")
+
+    # Running servers drop cached tool results for the refreshed collections
+    query_cache.publish_invalidation(sorted(sources))
+
+def _publish_hashing(featurizer, segments, df, idf, n_live, tombstones, watermarks, delta_segments, dense_meta=None):
+    # Watermarks live in the manifest, so they only advance with the index
+    meta = {
+        "featurizer": "hashing",
+        "n_features": featurizer.n_features,
+        "stop_words": featurizer.stop_words,
+        "n_docs": len(tombstones),
+        "n_live": n_live,
+        "delta_segments": delta_segments,
+        "watermarks": json.loads(json_util.dumps(watermarks)),
+    }
+    if dense_meta:
+        meta["dense"] = dense_meta
+    arrays = {"idf": idf, "df": df.astype(np.int32)}
+    if tombstones.any():
+        arrays["tombstones"] = tombstones
+    return rag_index.write_generation(meta, segments, arrays, knowledge_dir=KNOWLEDGE_DIR)
+
+def _watermark_field(col_name):
+    overrides = dict(part.split("=", 1) for part in INGEST_WATERMARK_FIELDS.split(",") if "=" in part)
+    return overrides.get(col_name, INGEST_WATERMARK_FIELD).strip()
+
+def _document_frequencies(counts):
+    present = counts.copy()
+    present.data[:] = 1
+    return np.asarray(present.sum(axis=0)).ravel().astype(np.int64)
+
+def _iter_live_documents(segment_paths, tombstones, n_features, with_embeddings=False):
+    row = 0
+    for path in segment_paths:
+        seg = rag_index.Segment(os.path.join(KNOWLEDGE_DIR, path), n_features)
+        vectors = seg.dense.vectors(np.arange(seg.n_docs)) if with_embeddings else None
+        for local in range(seg.n_docs):
+            if not tombstones[row]:
+                doc = {"id": seg.ids[local], "text": seg.texts[local], "source": seg.sources[local]}
+                if vectors is not None:
+                    doc["embedding"] = vectors[local]
+                yield doc
+            row += 1
+
+def _compact(segment_paths, tombstones, featurizer, idf, encoder=None, reuse_embeddings=False):
+    """
+    Rewrites every live row into INGEST_CHUNK_SIZE segments, re-weighted with the current idf.
+    Embeddings are copied over when the encoder hasn't changed, re-computed otherwise.
+    """
+    print(f"🧹 Compacting {len(segment_paths)} segments...")
+    compacted = []
+    live = 0
+    documents = _iter_live_documents(segment_paths, tombstones, featurizer.n_features, reuse_embeddings)
+    for chunk in _chunked(documents, INGEST_CHUNK_SIZE):
+        texts = [d["text"] for d in chunk]
+        matrix = featurizer.transform(texts, idf)
+        if reuse_embeddings:
+            embeddings = np.stack([d.pop("embedding") for d in chunk])
+        else:
+            embeddings = _embed(encoder, texts)
+        compacted.append(rag_index.write_segment(matrix, chunk, KNOWLEDGE_DIR, embeddings))
+        live += len(chunk)
+    return compacted, np.zeros(live, dtype=bool)
+
+def ingest_incremental(compact=False, reconcile=False):
+    """
+    Vectorizes only documents past each collection's watermark, appends them as a new
+    segment and tombstones the rows they supersede. Uses the hashing featurizer so the
+    vocabulary never has to be refit; document frequencies are kept up to date instead.
+    """
+    print("🚀 Starting Incremental Ingestion (Hashing)...")
+    print(f"📁 Storage Path: {KNOWLEDGE_DIR}")
+
+    index = None
+    generation = rag_index.read_current(KNOWLEDGE_DIR)
+    if generation:
+        index = rag_index.RagIndex(os.path.join(KNOWLEDGE_DIR, generation))
+        if index.featurizer != "hashing":
+            print("   Current index has a fitted vocabulary, bootstrapping a hashing index...")
+            index = None
+
+    n_features = index.meta["n_features"] if index else rag_index.RAG_HASH_FEATURES
+    featurizer = rag_index.HashingFeaturizer(None, n_features=n_features)
+    encoder = _dense_encoder()
+    dense_meta = dense.describe(encoder) if encoder else None
+    # Embeddings switched on/off or a different encoder: every row has to be re-embedded
+    dense_changed = index is not None and index.dense != dense_meta
+    watermarks = json_util.loads(json.dumps(index.meta.get("watermarks", {}))) if index else {}
+
+    # 1. Fetch what changed since the last run
+    print("📥 Fetching changes from MongoDB...")
+    new_docs = []
+    superseded = set()
+    new_watermarks = dict(watermarks)
+    alive, reconciled = [], set()
+    insert_only = []
+    for col_name in database.list_source_collections():
+        field = _watermark_field(col_name)
+        mark = watermarks.get(col_name)
+        after = mark["value"] if mark and mark.get("field") == field else None
+        if field == "_id":
+            insert_only.append(col_name)
+        else:
+            # Documents without the field never match the watermark query and would silently never be indexed
+            missing = database.count_missing_field(col_name, field)
+            if missing:
+                raise RuntimeError(f"{col_name}: {missing} document(s) have no '{field}' field, so they would never "
+                                   f"be ingested. Backfill it or watermark this collection on _id.")
+
+        fetched = 0
+        for doc in database.iter_changed_documents(col_name, field, after):
+            new_docs.append({
+                "id": f"{col_name}:{doc['_id']}",
+                "text": doc_to_text(col_name, {k: v for k, v in doc.items() if k != "_id"}),
                 "source": col_name
             })
-            count += 1
+            new_watermarks[col_name] = {"field": field, "value": doc[field]}
+            fetched += 1
+        if fetched:
+            print(f"   {col_name}: {fetched} new/changed documents")
 
-    # 3. Vectorize & Save
-    if documents:
-        print(f"⚡ Vectorizing {len(documents)} documents...")
-        texts = [d["text"] for d in documents]
-        
-        # TF-IDF Vectorization
-        vectorizer = TfidfVectorizer(stop_words='english')
-        tfidf_matrix = vectorizer.fit_transform(texts)
-        
-        # Save to disk
-        print("💾 Saving to disk...")
-        with open(VECTORIZER_PATH, "wb") as f:
-            pickle.dump(vectorizer, f)
-            
-        with open(MATRIX_PATH, "wb") as f:
-            pickle.dump(tfidf_matrix, f)
-            
-        with open(DOCS_PATH, "w") as f:
-            json.dump(documents, f, indent=2)
-            
-        print(f"✅ Ingestion Complete! Saved {len(documents)} records.")
-    else:
-        print("⚠️  No data found to ingest.")
+        if reconcile:
+            alive.extend(f"{col_name}:{_id}" for _id in database.iter_document_ids(col_name))
+            reconciled.add(col_name)
+    if insert_only:
+        print(f"   ℹ️  {', '.join(insert_only)}: watermarked on _id, edits to existing documents are not picked up "
+              f"(INGEST_WATERMARK_FIELDS=<collection>=updated_at)")
+
+    if index:
+        # Changed documents supersede their old row (per-segment key hashes, no scan of every id)
+        superseded.update(index.find_live_rows([d["id"] for d in new_docs]).values())
+        if reconcile:
+            deleted = {}
+            for row in index.live_rows_missing(alive):
+                col_name = index.ids[int(row)].split(":", 1)[0]
+                if col_name in reconciled:
+                    deleted.setdefault(col_name, []).append(int(row))
+            for col_name, rows in deleted.items():
+                print(f"   {col_name}: {len(rows)} deleted documents")
+                superseded.update(rows)
+
+    if not new_docs and not superseded and not compact and not dense_changed:
+        print("✅ Knowledge base is up to date.")
+        return
+
+    # 2. Document frequencies: add new rows, remove superseded ones
+    df = np.array(index.df, dtype=np.int64) if index else np.zeros(n_features, dtype=np.int64)
+    if new_docs:
+        df += _document_frequencies(featurizer.counts([d["text"] for d in new_docs]))
+    if superseded:
+        df -= _document_frequencies(featurizer.counts([index.texts[row] for row in sorted(superseded)]))
+    n_live = (index.n_live if index else 0) + len(new_docs) - len(superseded)
+    idf = rag_index.smooth_idf(df, n_live)
+
+    # 3. Append a segment, tombstone superseded rows
+    segments = list(index.meta["segments"]) if index else []
+    tombstones = np.zeros(index.n_docs if index else 0, dtype=bool)
+    if index is not None and index.tombstones is not None:
+        tombstones[:] = index.tombstones
+    tombstones[sorted(superseded)] = True
+    if new_docs:
+        print(f"⚡ Vectorizing {len(new_docs)} documents...")
+        texts = [d["text"] for d in new_docs]
+        matrix = featurizer.transform(texts, idf)
+        segments.append(rag_index.write_segment(matrix, new_docs, KNOWLEDGE_DIR, _embed(encoder, texts)))
+        tombstones = np.concatenate([tombstones, np.zeros(len(new_docs), dtype=bool)])
+
+    # 4. Compact when delta segments pile up or too many rows are dead
+    delta_segments = (index.meta.get("delta_segments", len(index.meta["segments"])) if index else 0) + bool(new_docs)
+    dead_ratio = tombstones.mean() if len(tombstones) else 0.0
+    if compact or dense_changed or delta_segments > RAG_MAX_SEGMENTS or dead_ratio > RAG_MAX_TOMBSTONE_RATIO:
+        reuse = encoder is not None and not dense_changed
+        segments, tombstones = _compact(segments, tombstones, featurizer, idf, encoder, reuse)
+        delta_segments = 0
+
+    # 5. Publish
+    print("💾 Saving to disk...")
+    generation = _publish_hashing(featurizer, segments, df, idf, n_live, tombstones, new_watermarks, delta_segments,
+                                  dense_meta)
+    print(f"✅ Incremental Ingestion Complete! +{len(new_docs)} / -{len(superseded)} docs, "
+          f"{n_live} live in {len(segments)} segment(s) ({generation}).")
+
+    # Running servers drop cached tool results for the refreshed collections
+    query_cache.publish_invalidation(sorted({d["source"] for d in new_docs}) or None)
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Build the local RAG knowledge base from MongoDB.")
+    parser.add_argument("--incremental", action="store_true", help="only vectorize documents changed since the last run")
+    parser.add_argument("--compact", action="store_true", help="merge all segments (with --incremental)")
+    parser.add_argument("--reconcile", action="store_true", help="also drop documents deleted from MongoDB (with --incremental)")
+    parser.add_argument("--featurizer", choices=["hashing", "tfidf"], default=INGEST_FEATURIZER,
+                        help="full rebuild: streaming hashing index or in-memory fitted TF-IDF")
+    args = parser.parse_args()
+
+    if args.incremental:
+        ingest_incremental(compact=args.compact, reconcile=args.reconcile)
+    else:
+        ingest_data(featurizer=args.featurizer)
@@ -0,0 +1,223 @@
+"""Per-stage latency spans, counters and a Prometheus text export for the voice pipeline"""
+import os
+import time
+import threading
+import functools
+import contextvars
+from collections import deque
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", 2048))                # recent samples per stage for p50/p95/p99
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "0") == "1"  # Server-Timing header on responses
+PREFIX = "voice_"
+QUANTILES = (0.5, 0.95, 0.99)
+
+_HELP = {
+    "stage_seconds": "Time spent per pipeline stage",
+    "request_seconds": "End-to-end request time",
+    "requests_total": "Requests handled",
+    "replies_total": "LLM replies generated",
+    "tool_calls_total": "Database tool calls requested by the LLM",
+    "tts_fallbacks_total": "Replies synthesized with gTTS because Edge TTS failed",
+}
+
+_lock = threading.Lock()
+_windows = {}     # (name, labels) -> deque of recent seconds
+_totals = {}      # (name, labels) -> [count, sum] since start
+_counters = {}    # (name, labels) -> value
+_collectors = []  # callables returning [(name, labels dict, value)] counters, read at scrape time
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, seconds, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        window = _windows.get(key)
+        if window is None:
+            window = _windows[key] = deque(maxlen=METRICS_WINDOW)
+            _totals[key] = [0, 0.0]
+        window.append(seconds)
+        totals = _totals[key]
+        totals[0] += 1
+        totals[1] += seconds
+
+
+def inc(name, value=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_collector(fn):
+    """
+    `fn()` -> [(name, labels, value)]: counters that already live elsewhere (cache stats),
+    copied at scrape time instead of being counted twice on the hot path.
+    """
+    _collectors.append(fn)
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        observe("stage_seconds", elapsed, stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage):
+    """
+    `with metrics.span("whisper"):` times the block into the stage histogram
+    (and the current request's Server-Timing list). A shared no-op when disabled.
+    """
+    return _Span(stage) if METRICS_ENABLED else _NOOP_SPAN
+
+
+def timed(stage):
+    """
+    Decorator form of span() for plain functions; returns the function untouched when disabled.
+    """
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_request():
+    """
+    Collects the spans of the current request (including worker threads started with
+    asyncio.to_thread, which copy the context). Returns the list they are appended to.
+    """
+    if not METRICS_ENABLED:
+        return None
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing(timings):
+    # Server-Timing header value, durations in ms; repeated stages (per-sentence TTS) are summed
+    merged = {}
+    for stage, seconds in timings or ():
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={1000 * seconds:.1f}" for stage, seconds in merged.items())
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _quantiles(window):
+    return np.quantile(np.fromiter(window, dtype=np.float64, count=len(window)), QUANTILES)
+
+
+def snapshot():
+    """
+    Percentiles (ms) per stage / endpoint and the counters as a dict, for /stats.
+    """
+    with _lock:
+        windows = {key: list(window) for key, window in _windows.items()}
+        totals = {key: tuple(total) for key, total in _totals.items()}
+        counters = dict(_counters)
+    out = {"enabled": METRICS_ENABLED, "counters": {}}
+    for (name, labels), window in sorted(windows.items()):
+        label = ",".join(str(v) for _, v in labels) or "all"
+        p50, p95, p99 = (round(1000 * float(q), 1) for q in _quantiles(window))
+        out.setdefault(name, {})[label] = {"count": totals[(name, labels)][0], "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+    for (name, labels), value in counters.items():
+        out["counters"][name + _labels(labels)] = value
+    return out
+
+
+def render():
+    """
+    Prometheus text exposition (format 0.0.4): summaries with p50/p95/p99 over the last
+    METRICS_WINDOW samples, plus counters. Under the pre-fork server every worker keeps its
+    own registry: series carry a worker="<id>" label and a scrape only sees the worker it hit.
+    """
+    worker = os.getenv("SERVE_WORKER_ID")
+    own = [("worker", worker)] if worker is not None else []
+    with _lock:
+        windows = {key: list(window) for key, window in _windows.items()}
+        totals = {key: tuple(total) for key, total in _totals.items()}
+        counters = dict(_counters)
+    for collector in _collectors:
+        try:
+            for name, labels, value in collector():
+                counters[_key(name, labels)] = value
+        except Exception as e:
+            print(f"⚠️  Metrics collector failed: {e}")
+
+    lines, declared = [], set()
+
+    def declare(name, kind):
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# HELP {PREFIX}{name} {_HELP.get(name, name.replace('_', ' '))}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), window in sorted(windows.items()):
+        declare(name, "summary")
+        for q, value in zip(QUANTILES, _quantiles(window)):
+            lines.append(f"{PREFIX}{name}{_labels(labels, own + [('quantile', q)])} {value:.6f}")
+        count, total = totals[(name, labels)]
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels, own)} {total:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels, own)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        declare(name, "counter")
+        lines.append(f"{PREFIX}{name}{_labels(labels, own)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _windows.clear()
+        _totals.clear()
+        _counters.clear()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "1") == "1"
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 512))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 60))
+# Per-collection overrides, e.g. "orders=10,clients=600"
+QUERY_CACHE_TTLS = os.getenv("QUERY_CACHE_TTLS", "")
+
+# Other processes (ingest.py) signal invalidations through this file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INVALIDATION_PATH = os.getenv(
+    "QUERY_CACHE_INVALIDATION_FILE",
+    os.path.join(BASE_DIR, "knowledge_store", "query_cache_invalidations.json"),
+)
+INVALIDATION_POLL_SECONDS = 1.0
+
+
+def _parse_ttls(spec):
+    ttls = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, ttl = part.split("=", 1)
+            ttls[name.strip()] = float(ttl)
+    return ttls
+
+
+def make_key(collection_name, query, projection, sort_spec, limit):
+    """
+    Canonical cache key: same filter/sort/projection/limit in any key order maps to one entry.
+    """
+    return json.dumps(
+        [collection_name, query, projection, sort_spec, limit],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+
+
+def publish_invalidation(collections=None):
+    """
+    Records an invalidation for running servers to pick up (None = every collection).
+    """
+    try:
+        with open(INVALIDATION_PATH) as f:
+            marks = json.load(f)
+    except (OSError, ValueError):
+        marks = {}
+    now = time.time()
+    for name in (collections or ["*"]):
+        marks[name] = now
+    os.makedirs(os.path.dirname(INVALIDATION_PATH), exist_ok=True)
+    tmp_path = f"{INVALIDATION_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(marks, f)
+    os.replace(tmp_path, INVALIDATION_PATH)
+
+
+class QueryCache:
+    """
+    Size-bounded LRU of find_documents results with per-collection TTLs.
+    """
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, default_ttl=QUERY_CACHE_TTL, ttls=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = _parse_ttls(QUERY_CACHE_TTLS) if ttls is None else ttls
+        self._entries = OrderedDict()      # key -> (results, expires_at, stored_at, collection)
+        self._by_collection = {}           # collection -> set of keys
+        self._lock = threading.Lock()
+        self._marks_checked = 0.0
+        self._marks_mtime = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        _, _, _, collection = self._entries.pop(key)
+        keys = self._by_collection.get(collection)
+        if keys:
+            keys.discard(key)
+
+    def get(self, key):
+        self._poll_invalidations()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] < time.monotonic():
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[0])
+
+    def put(self, key, collection_name, results):
+        ttl = self.ttls.get(collection_name, self.default_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (list(results), time.monotonic() + ttl, time.time(), collection_name)
+            self._by_collection.setdefault(collection_name, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, collection_name=None, before=None):
+        """
+        Drops cached results for one collection (or all). With `before`, only entries stored earlier.
+        """
+        with self._lock:
+            if collection_name is None:
+                keys = list(self._entries)
+            else:
+                keys = list(self._by_collection.get(collection_name, ()))
+            for key in keys:
+                if before is None or self._entries[key][2] <= before:
+                    self._drop(key)
+
+    def _poll_invalidations(self):
+        now = time.monotonic()
+        if now - self._marks_checked < INVALIDATION_POLL_SECONDS:
+            return
+        self._marks_checked = now
+        try:
+            mtime = os.path.getmtime(INVALIDATION_PATH)
+            if mtime == self._marks_mtime:
+                return
+            with open(INVALIDATION_PATH) as f:
+                marks = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._marks_mtime = mtime
+        for name, stamp in marks.items():
+            self.invalidate(None if name == "*" else name, before=stamp)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,601 @@
+"""
+On-disk RAG index: versioned, memory-mappable generations with atomic swap.
+
+knowledge_store/
+    CURRENT                   name of the live generation (replaced atomically)
+    segments/seg-000001/      immutable block of rows, shared by generations
+        matrix_{data,indices,indptr}.npy   CSR rows, one per document
+        text.bin / text_offsets.npy        document texts (utf-8)
+        ids.bin / ids_offsets.npy
+        key_hashes.npy                     64-bit hash of each row's id (key -> row lookups)
+        sources.bin / sources_offsets.npy
+        dense_*.npy / ivf_*.npy            optional embeddings + IVF lists (see dense.py)
+    gen-000001/               small manifest
+        meta.json             format version, featurizer + params, segment list
+        vocab.json + idf.npy  "tfidf" featurizer (fitted vocabulary)
+        df.npy + idf.npy      "hashing" featurizer (stable vocabulary, incremental)
+        meta["dense"]         encoder the segment embeddings were built with, if any
+        tombstones.npy        rows deleted or superseded since their segment was written
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from dotenv import load_dotenv
+
+try:
+    from . import dense
+except ImportError:
+    import dense
+
+load_dotenv()
+
+FORMAT_VERSION = 2
+
+# Paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", os.path.join(BASE_DIR, "knowledge_store"))
+CURRENT_FILE = "CURRENT"
+SEGMENTS_DIR = "segments"
+
+# How often a running server checks CURRENT for a new generation (seconds)
+RAG_RELOAD_INTERVAL = float(os.getenv("RAG_RELOAD_INTERVAL", 2))
+# Older generations kept around so workers still mapping them aren't disturbed
+RAG_KEEP_GENERATIONS = int(os.getenv("RAG_KEEP_GENERATIONS", 2))
+# Hashing featurizer width (stable vocabulary for incremental ingestion)
+RAG_HASH_FEATURES = int(os.getenv("RAG_HASH_FEATURES", 2 ** 20))
+
+# TfidfVectorizer params that affect how a query is featurized
+PORTABLE_PARAMS = (
+    "lowercase", "strip_accents", "stop_words", "token_pattern", "ngram_range",
+    "analyzer", "norm", "use_idf", "smooth_idf", "sublinear_tf", "binary",
+)
+
+
+# --- Featurizers ---
+
+def smooth_idf(df, n_docs):
+    """
+    Same formula TfidfVectorizer uses with smooth_idf=True.
+    """
+    return (np.log((1 + n_docs) / (1 + df.astype(np.float64))) + 1).astype(np.float32)
+
+
+class HashingFeaturizer:
+    """
+    Stateless hashing featurizer + externally maintained idf.
+    Columns never change, so new documents can be vectorized without refitting.
+    """
+    def __init__(self, idf, n_features=RAG_HASH_FEATURES, stop_words="english"):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_features = n_features
+        self.stop_words = stop_words
+        self.idf = idf
+        self._hasher = HashingVectorizer(
+            n_features=n_features, alternate_sign=False, norm=None, stop_words=stop_words
+        )
+
+    def counts(self, texts):
+        return self._hasher.transform(texts).tocsr()
+
+    def weight(self, counts, idf=None):
+        """
+        Raw term counts -> l2-normalized tf-idf rows.
+        """
+        from sklearn.preprocessing import normalize
+
+        weights = self.idf if idf is None else idf
+        # Scale each stored count by its column's idf (a diagonal product would touch every column)
+        weighted = sp.csr_matrix(counts, dtype=np.float32, copy=True)
+        weighted.data *= np.asarray(weights, dtype=np.float32)[weighted.indices]
+        return normalize(weighted, norm="l2", copy=False)
+
+    def transform(self, texts, idf=None):
+        return self.weight(self.counts(texts), idf)
+
+
+def key_hashes(keys):
+    """
+    Stable 64-bit hashes of document keys ("collection:_id"), stored per segment so the
+    incremental ingest finds a key's row without reading every id string.
+    """
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(k).encode("utf-8"), digest_size=8).digest(), "little") for k in keys),
+        dtype=np.uint64, count=len(keys),
+    )
+
+
+# --- Writing ---
+
+def _write_strings(seg_dir, name, strings):
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(os.path.join(seg_dir, f"{name}.bin"), "wb") as f:
+        for i, s in enumerate(strings):
+            data = s.encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(os.path.join(seg_dir, f"{name}_offsets.npy"), offsets)
+
+
+def _save_replace(path, array):
+    # Write-then-rename so a reader still mapping the old file never sees it truncated
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _write_matrix(seg_dir, name, matrix):
+    # CSR and CSC share the same three-array layout
+    matrix.sort_indices()
+    _save_replace(os.path.join(seg_dir, f"{name}_data.npy"), matrix.data.astype(np.float32))
+    _save_replace(os.path.join(seg_dir, f"{name}_indices.npy"), matrix.indices.astype(np.int32))
+    _save_replace(os.path.join(seg_dir, f"{name}_indptr.npy"), matrix.indptr.astype(np.int64))
+
+
+def _write_rows(seg_dir, matrix):
+    """
+    Document rows (CSR) plus the same weights as per-term postings lists (CSC).
+    """
+    matrix = sp.csr_matrix(matrix)
+    _write_matrix(seg_dir, "matrix", matrix)
+    _write_matrix(seg_dir, "postings", matrix.tocsc())
+
+
+def _portable_params(vectorizer):
+    params = vectorizer.get_params()
+    out = {}
+    for key in PORTABLE_PARAMS:
+        value = params.get(key)
+        if isinstance(value, (frozenset, set)):
+            value = sorted(value)
+        if isinstance(value, tuple):
+            value = list(value)
+        out[key] = value
+    return out
+
+
+def _next_name(parent, prefix):
+    names = [d for d in os.listdir(parent) if d.startswith(prefix)] if os.path.isdir(parent) else []
+    latest = max((int(d.split("-")[1]) for d in names), default=0)
+    return f"{prefix}{latest + 1:06d}"
+
+
+def read_current(knowledge_dir=KNOWLEDGE_DIR):
+    try:
+        with open(os.path.join(knowledge_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _referenced_segments(knowledge_dir, generation):
+    try:
+        with open(os.path.join(knowledge_dir, generation, "meta.json")) as f:
+            return set(json.load(f).get("segments", []))
+    except (OSError, ValueError):
+        return set()
+
+
+def publish(knowledge_dir, generation):
+    """
+    Atomically points CURRENT at `generation`, then prunes old generations
+    and any segment no remaining generation references.
+    """
+    tmp_path = os.path.join(knowledge_dir, f"{CURRENT_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(knowledge_dir, CURRENT_FILE))
+
+    gens = sorted(d for d in os.listdir(knowledge_dir) if d.startswith("gen-") and d != generation)
+    for old in gens[:max(0, len(gens) - (RAG_KEEP_GENERATIONS - 1))]:
+        shutil.rmtree(os.path.join(knowledge_dir, old), ignore_errors=True)
+
+    live = set()
+    for gen in os.listdir(knowledge_dir):
+        if gen.startswith("gen-"):
+            live |= _referenced_segments(knowledge_dir, gen)
+    seg_root = os.path.join(knowledge_dir, SEGMENTS_DIR)
+    for seg in (os.listdir(seg_root) if os.path.isdir(seg_root) else []):
+        if seg.startswith("seg-") and f"{SEGMENTS_DIR}/{seg}" not in live:
+            shutil.rmtree(os.path.join(seg_root, seg), ignore_errors=True)
+
+
+def write_segment(matrix, documents, knowledge_dir=KNOWLEDGE_DIR, embeddings=None):
+    """
+    Writes one immutable block of rows (plus their dense embeddings, if given)
+    and returns its path relative to knowledge_dir.
+    """
+    seg_root = os.path.join(knowledge_dir, SEGMENTS_DIR)
+    os.makedirs(seg_root, exist_ok=True)
+    name = _next_name(seg_root, "seg-")
+    tmp_dir = os.path.join(seg_root, f".{name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    _write_rows(tmp_dir, matrix)
+    _write_strings(tmp_dir, "text", [d["text"] for d in documents])
+    _write_strings(tmp_dir, "ids", [str(d["id"]) for d in documents])
+    np.save(os.path.join(tmp_dir, "key_hashes.npy"), key_hashes([d["id"] for d in documents]))
+    _write_strings(tmp_dir, "sources", [str(d.get("source", "")) for d in documents])
+    if embeddings is not None:
+        dense.write_dense(tmp_dir, embeddings)
+
+    os.rename(tmp_dir, os.path.join(seg_root, name))
+    return f"{SEGMENTS_DIR}/{name}"
+
+
+def rewrite_segment_matrix(segment, matrix, knowledge_dir=KNOWLEDGE_DIR):
+    """
+    Replaces the rows of a segment that hasn't been published yet (e.g. re-weighting
+    raw counts once the final idf is known). Texts and ids are left untouched.
+    """
+    _write_rows(os.path.join(knowledge_dir, segment), matrix)
+
+
+def write_generation(meta, segments, arrays=None, vocab=None, knowledge_dir=KNOWLEDGE_DIR):
+    """
+    Writes a generation manifest over existing segments and publishes it.
+    `arrays` are saved as <name>.npy next to meta.json (idf, df, tombstones, ...).
+    """
+    os.makedirs(knowledge_dir, exist_ok=True)
+    generation = _next_name(knowledge_dir, "gen-")
+    tmp_dir = os.path.join(knowledge_dir, f".{generation}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    if vocab is not None:
+        with open(os.path.join(tmp_dir, "vocab.json"), "w") as f:
+            json.dump(vocab, f)
+    for name, array in (arrays or {}).items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+
+    meta = {"format_version": FORMAT_VERSION, "segments": list(segments), "created_at": time.time(), **meta}
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    os.rename(tmp_dir, os.path.join(knowledge_dir, generation))
+    publish(knowledge_dir, generation)
+    return generation
+
+
+def write_index(vectorizer, matrix, documents, knowledge_dir=KNOWLEDGE_DIR, embeddings=None, dense_meta=None):
+    """
+    Writes a fitted TfidfVectorizer, its document matrix and the documents as a new
+    single-segment generation, then publishes it. Returns the generation name.
+    """
+    vocab = [None] * len(vectorizer.vocabulary_)
+    for term, col in vectorizer.vocabulary_.items():
+        vocab[col] = term
+
+    segment = write_segment(matrix, documents, knowledge_dir, embeddings)
+    meta = {
+        "featurizer": "tfidf",
+        "vectorizer_params": _portable_params(vectorizer),
+        "n_docs": len(documents),
+        "n_live": len(documents),
+        "n_features": len(vocab),
+    }
+    if dense_meta:
+        meta["dense"] = dense_meta
+    return write_generation(meta, [segment], {"idf": vectorizer.idf_.astype(np.float32)}, vocab, knowledge_dir)
+
+
+# --- Reading ---
+
+class StringTable:
+    """
+    Memory-mapped list of utf-8 strings.
+    """
+    def __init__(self, seg_dir, name):
+        self._offsets = np.load(os.path.join(seg_dir, f"{name}_offsets.npy"), mmap_mode="r")
+        path = os.path.join(seg_dir, f"{name}.bin")
+        if os.path.getsize(path):
+            self._blob = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            self._blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+
+def _load_arrays(seg_dir, name):
+    return tuple(
+        np.load(os.path.join(seg_dir, f"{name}_{part}.npy"), mmap_mode="r")
+        for part in ("data", "indices", "indptr")
+    )
+
+
+def load_matrix(seg_dir, name, n_features):
+    data, indices, indptr = _load_arrays(seg_dir, name)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, n_features), copy=False)
+
+
+class Segment:
+    def __init__(self, seg_dir, n_features):
+        self.seg_dir = seg_dir
+        self.matrix = load_matrix(seg_dir, "matrix", n_features)
+        # Per-term postings (CSC); segments written before postings existed get them built in memory
+        if os.path.exists(os.path.join(seg_dir, "postings_indptr.npy")):
+            data, indices, indptr = _load_arrays(seg_dir, "postings")
+            self.postings = sp.csc_matrix((data, indices, indptr), shape=self.matrix.shape, copy=False)
+        else:
+            self.postings = self.matrix.tocsc()
+        self.texts = StringTable(seg_dir, "text")
+        self.ids = StringTable(seg_dir, "ids")
+        self.sources = StringTable(seg_dir, "sources")
+        self.dense = dense.DenseSegment.load(seg_dir) if dense.DenseSegment.exists(seg_dir) else None
+        self.n_docs = self.matrix.shape[0]
+        self._key_index = None
+
+    def key_index(self):
+        """
+        (row key hashes, sort order of those hashes), loaded on first use. Segments written
+        before key_hashes.npy existed get them computed from the id strings once.
+        """
+        if self._key_index is None:
+            path = os.path.join(self.seg_dir, "key_hashes.npy")
+            hashes = np.load(path) if os.path.exists(path) else key_hashes([self.ids[i] for i in range(self.n_docs)])
+            self._key_index = (hashes, np.argsort(hashes, kind="stable"))
+        return self._key_index
+
+
+class _RowTable:
+    """
+    Global row number -> string, across segments.
+    """
+    def __init__(self, index, attr):
+        self._index = index
+        self._attr = attr
+
+    def __len__(self):
+        return self._index.n_docs
+
+    def __getitem__(self, row):
+        seg_no, local = self._index.locate(row)
+        return getattr(self._index.segments[seg_no], self._attr)[local]
+
+
+class RagIndex:
+    """
+    One loaded generation. Arrays are memory-mapped, so worker processes share pages.
+    Rows are numbered globally across segments; tombstoned rows never score.
+    """
+    def __init__(self, gen_dir):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.gen_dir = gen_dir
+        self.generation = os.path.basename(gen_dir)
+        knowledge_dir = os.path.dirname(gen_dir)
+        with open(os.path.join(gen_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        version = self.meta.get("format_version")
+        if version not in (1, FORMAT_VERSION):
+            raise ValueError(f"Unsupported index format: {version}")
+
+        self.featurizer = self.meta.get("featurizer", "tfidf")
+        idf = np.load(os.path.join(gen_dir, "idf.npy"))
+        if self.featurizer == "hashing":
+            self.vectorizer = HashingFeaturizer(idf, n_features=self.meta["n_features"],
+                                                stop_words=self.meta.get("stop_words", "english"))
+            self.df = np.load(os.path.join(gen_dir, "df.npy"), mmap_mode="r")
+            n_features = self.meta["n_features"]
+        else:
+            with open(os.path.join(gen_dir, "vocab.json")) as f:
+                vocab = json.load(f)
+            params = dict(self.meta["vectorizer_params"])
+            if params.get("ngram_range"):
+                params["ngram_range"] = tuple(params["ngram_range"])
+            self.vectorizer = TfidfVectorizer(vocabulary={t: i for i, t in enumerate(vocab)}, **params)
+            self.vectorizer.idf_ = idf
+            self.df = None
+            n_features = len(vocab)
+
+        # Version 1 kept its single segment inside the generation directory
+        seg_dirs = [os.path.join(knowledge_dir, s) for s in self.meta["segments"]] if version > 1 else [gen_dir]
+        self.segments = [Segment(d, n_features) for d in seg_dirs]
+        self.row_starts = np.cumsum([0] + [seg.n_docs for seg in self.segments])
+        self.n_docs = int(self.row_starts[-1])
+
+        tomb_path = os.path.join(gen_dir, "tombstones.npy")
+        self.tombstones = np.load(tomb_path, mmap_mode="r") if os.path.exists(tomb_path) else None
+        self.n_live = self.n_docs - (int(self.tombstones.sum()) if self.tombstones is not None else 0)
+
+        # Dense retrieval only when every segment carries embeddings from the same encoder
+        self.dense = self.meta.get("dense")
+        if self.dense and any(seg.dense is None for seg in self.segments):
+            print(f"⚠️ RAG {self.generation}: some segments lack embeddings, dense retrieval off")
+            self.dense = None
+        self.dense_segments = [seg.dense for seg in self.segments] if self.dense else []
+
+        self.texts = _RowTable(self, "texts")
+        self.ids = _RowTable(self, "ids")
+        self.sources = _RowTable(self, "sources")
+
+    def __len__(self):
+        return self.n_live
+
+    def locate(self, row):
+        seg_no = int(np.searchsorted(self.row_starts, row, side="right")) - 1
+        return seg_no, row - int(self.row_starts[seg_no])
+
+    def scores(self, query_vec):
+        """
+        Cosine score of one query against every row (rows and query are l2-normalized).
+        """
+        parts = [np.asarray((seg.matrix @ query_vec.T).todense()).ravel() for seg in self.segments]
+        scores = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+        if self.tombstones is not None:
+            scores[np.asarray(self.tombstones, dtype=bool)] = 0.0
+        return scores
+
+    def live_rows(self):
+        if self.tombstones is None:
+            return np.arange(self.n_docs)
+        return np.flatnonzero(~np.asarray(self.tombstones, dtype=bool))
+
+    def _dead(self, row):
+        return self.tombstones is not None and bool(self.tombstones[row])
+
+    def find_live_rows(self, keys):
+        """
+        {key: global row} for the keys that have a live row, by binary search over each
+        segment's key hashes; hash hits are confirmed against the stored id.
+        """
+        keys = [str(k) for k in keys]
+        if not keys:
+            return {}
+        wanted = key_hashes(keys)
+        found = {}
+        for seg_no, seg in enumerate(self.segments):
+            hashes, order = seg.key_index()
+            ordered = hashes[order]
+            start = int(self.row_starts[seg_no])
+            for key, h, pos in zip(keys, wanted, np.searchsorted(ordered, wanted)):
+                while pos < len(order) and ordered[pos] == h:
+                    local = int(order[pos])
+                    if not self._dead(start + local) and seg.ids[local] == key:
+                        found[key] = start + local
+                    pos += 1
+        return found
+
+    def live_rows_missing(self, keys):
+        """
+        Live global rows whose key is not among `keys` (e.g. everything still in the database).
+        """
+        present = np.unique(key_hashes(keys))
+        hashes = np.concatenate([seg.key_index()[0] for seg in self.segments]) if self.segments else np.zeros(0, np.uint64)
+        rows = self.live_rows()
+        return rows[~np.isin(hashes[rows], present)]
+
+
+class IndexManager:
+    """
+    Holds the live RagIndex and swaps in a new generation when CURRENT changes.
+    Readers keep whatever index object they grabbed, so a swap never disturbs a search.
+    """
+    def __init__(self, knowledge_dir=KNOWLEDGE_DIR, reload_interval=RAG_RELOAD_INTERVAL):
+        self.knowledge_dir = knowledge_dir
+        self.reload_interval = reload_interval
+        self._index = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, generation):
+        started = time.perf_counter()
+        index = RagIndex(os.path.join(self.knowledge_dir, generation))
+        print(f"✅ RAG Loaded: {len(index)} docs ({generation}, {1000 * (time.perf_counter() - started):.0f}ms)")
+        return index
+
+    def get(self):
+        """
+        Returns the live index (or None if nothing has been ingested yet).
+        """
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.reload_interval:
+            return self._index
+        with self._lock:
+            self._checked_at = now
+            generation = read_current(self.knowledge_dir)
+            if generation and (self._index is None or self._index.generation != generation):
+                try:
+                    self._index = self._load(generation)
+                except Exception as e:
+                    print(f"⚠️ RAG Load Error ({generation}): {e}")
+        return self._index
+
+    def reload(self):
+        self._checked_at = 0.0
+        return self.get()
+
+
+# --- Migration & benchmark ---
+
+def migrate_legacy(knowledge_dir=KNOWLEDGE_DIR):
+    """
+    Converts the old pickle/JSON store (tfidf_vectorizer.pkl, tfidf_matrix.pkl, documents.json).
+    """
+    import pickle
+    with open(os.path.join(knowledge_dir, "tfidf_vectorizer.pkl"), "rb") as f:
+        vectorizer = pickle.load(f)
+    with open(os.path.join(knowledge_dir, "tfidf_matrix.pkl"), "rb") as f:
+        matrix = pickle.load(f)
+    with open(os.path.join(knowledge_dir, "documents.json")) as f:
+        documents = json.load(f)
+    return write_index(vectorizer, matrix, documents, knowledge_dir)
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _bench_load(fmt, knowledge_dir):
+    import pickle
+    import sklearn.feature_extraction.text  # keep library import cost out of the measurement
+    before = _rss_mb()
+    started = time.perf_counter()
+    if fmt == "legacy":
+        with open(os.path.join(knowledge_dir, "tfidf_vectorizer.pkl"), "rb") as f:
+            vectorizer = pickle.load(f)
+        with open(os.path.join(knowledge_dir, "tfidf_matrix.pkl"), "rb") as f:
+            matrix = pickle.load(f)
+        with open(os.path.join(knowledge_dir, "documents.json")) as f:
+            documents = json.load(f)
+        vectorizer.transform(["warmup"])
+        n_docs = len(documents)
+    else:
+        index = RagIndex(os.path.join(knowledge_dir, read_current(knowledge_dir)))
+        index.vectorizer.transform(["warmup"])
+        n_docs = len(index)
+    load_ms = 1000 * (time.perf_counter() - started)
+    print(json.dumps({"format": fmt, "docs": n_docs, "load_ms": round(load_ms, 1),
+                      "rss_delta_mb": round(_rss_mb() - before, 1)}))
+
+
+def benchmark(knowledge_dir=KNOWLEDGE_DIR):
+    """
+    Load time and RSS for the legacy pickle store vs the mmap format, each in a fresh process.
+    """
+    import subprocess
+    for fmt in ("legacy", "mmap"):
+        if fmt == "legacy" and not os.path.exists(os.path.join(knowledge_dir, "tfidf_matrix.pkl")):
+            print(json.dumps({"format": fmt, "skipped": "no legacy store"}))
+            continue
+        if fmt == "mmap" and not read_current(knowledge_dir):
+            print(json.dumps({"format": fmt, "skipped": "no generation published"}))
+            continue
+        subprocess.run([sys.executable, os.path.abspath(__file__), "_bench_load", fmt, knowledge_dir], check=False)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "info"
+    if command == "migrate":
+        print(f"✅ Migrated legacy store to {migrate_legacy()}")
+    elif command == "bench":
+        benchmark()
+    elif command == "_bench_load":
+        _bench_load(sys.argv[2], sys.argv[3])
+    else:
+        generation = read_current()
+        print(f"📁 {KNOWLEDGE_DIR}: {generation or 'no generation published'}")
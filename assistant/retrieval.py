@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from dotenv import load_dotenv
+
+try:
+    from . import dense
+except ImportError:
+    import dense
+
+load_dotenv()
+
+# Configuration
+RAG_SCORE_THRESHOLD = float(os.getenv("RAG_SCORE_THRESHOLD", 0.1))  # Threshold to avoid pure noise
+RAG_TIME_BUDGET_MS = float(os.getenv("RAG_TIME_BUDGET_MS", 50))     # 0 = no budget
+RAG_HYBRID_ALPHA = float(os.getenv("RAG_HYBRID_ALPHA", 0.5))         # dense weight in the fused score, 0 = sparse only
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", 10))  # candidates per retriever = k * this
+
+
+def accumulate(postings, row_starts, query_vec, budget_ms=RAG_TIME_BUDGET_MS):
+    """
+    Scores only the documents that share a term with the query, walking one postings
+    list per query term. Terms are visited heaviest first, so when the time budget runs
+    out the scores that are missing are the least significant ones.
+
+    Returns (rows, scores, complete) with rows as global row numbers.
+    """
+    started = time.perf_counter()
+    query_vec = sp.csr_matrix(query_vec)
+    order = np.argsort(-query_vec.data)
+    terms, weights = query_vec.indices[order], query_vec.data[order]
+
+    row_parts, score_parts = [], []
+    complete = True
+    for term, weight in zip(terms, weights):
+        for seg_postings, start in zip(postings, row_starts):
+            lo, hi = seg_postings.indptr[term], seg_postings.indptr[term + 1]
+            if hi > lo:
+                row_parts.append(np.asarray(seg_postings.indices[lo:hi], dtype=np.int64) + start)
+                score_parts.append(np.asarray(seg_postings.data[lo:hi], dtype=np.float32) * weight)
+        if budget_ms and (time.perf_counter() - started) * 1000 > budget_ms:
+            complete = False
+            break
+
+    if not row_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), complete
+
+    rows = np.concatenate(row_parts)
+    contributions = np.concatenate(score_parts)
+    if len(row_parts) == 1:
+        return rows, contributions, complete
+    # Several postings lists: sum per document. Dense accumulator once the postings
+    # cover a good share of the corpus, sort-based merge while they are short.
+    n_docs = int(row_starts[-1] + postings[-1].shape[0])
+    if len(rows) * 8 > n_docs:
+        scores = np.bincount(rows, weights=contributions, minlength=n_docs)
+        unique_rows = np.flatnonzero(scores)
+        return unique_rows, scores[unique_rows].astype(np.float32), complete
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+    return unique_rows, scores, complete
+
+
+def select_top_k(rows, scores, k, threshold=RAG_SCORE_THRESHOLD, tombstones=None):
+    """
+    Partial selection (argpartition) of the k best rows above `threshold`, best first.
+    """
+    keep = scores > threshold
+    if tombstones is not None and len(rows):
+        keep &= ~np.asarray(tombstones[rows], dtype=bool)
+    rows, scores = rows[keep], scores[keep]
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
+
+
+def fuse(index, sparse_rows, sparse_scores, query_embedding, k, alpha=RAG_HYBRID_ALPHA):
+    """
+    Hybrid candidates: the sparse and dense top-(k * RAG_HYBRID_CANDIDATES), each rescored
+    as alpha * dense + (1 - alpha) * sparse. A sparse score absent from the accumulator is 0.
+    """
+    n_candidates = k * RAG_HYBRID_CANDIDATES
+    starts = index.row_starts[:-1]
+    sparse_top, _ = select_top_k(sparse_rows, sparse_scores, n_candidates, 0.0, index.tombstones)
+    dense_top, _ = dense.search(index.dense_segments, starts, query_embedding, n_candidates,
+                                tombstones=index.tombstones)
+    rows = np.union1d(sparse_top, dense_top)
+    if not len(rows):
+        return rows, np.zeros(0, dtype=np.float32)
+
+    # Accumulator rows are sorted, look the candidates up
+    sparse_part = np.zeros(len(rows), dtype=np.float32)
+    if len(sparse_rows):
+        pos = np.minimum(np.searchsorted(sparse_rows, rows), len(sparse_rows) - 1)
+        found = sparse_rows[pos] == rows
+        sparse_part[found] = sparse_scores[pos[found]]
+    dense_part = dense.score_rows(index.dense_segments, starts, query_embedding, rows)
+    return rows, (alpha * dense_part + (1 - alpha) * sparse_part).astype(np.float32)
+
+
+def search(index, query_vec, k=3, threshold=RAG_SCORE_THRESHOLD, budget_ms=RAG_TIME_BUDGET_MS,
+           query_embedding=None, alpha=RAG_HYBRID_ALPHA):
+    """
+    Top-k (row, score) pairs from a RagIndex for one already-vectorized query.
+    With a query embedding (and an index built with embeddings) the ranking is hybrid.
+    """
+    postings = [seg.postings for seg in index.segments]
+    rows, scores, complete = accumulate(postings, index.row_starts[:-1], query_vec, budget_ms)
+    if not complete:
+        print(f"⚠️ RAG time budget ({budget_ms}ms) hit, returning partial ranking")
+    if query_embedding is not None and index.dense and alpha > 0:
+        rows, scores = fuse(index, rows, scores, query_embedding, k, alpha)
+    rows, scores = select_top_k(rows, scores, k, threshold, index.tombstones)
+    return list(zip(rows.tolist(), scores.tolist()))
+
+
+def _product_row(product, row, start, rows_out, scores_out):
+    lo, hi = product.indptr[row], product.indptr[row + 1]
+    if hi > lo:
+        rows_out.append(np.asarray(product.indices[lo:hi], dtype=np.int64) + start)
+        scores_out.append(np.asarray(product.data[lo:hi], dtype=np.float32))
+
+
+def search_batch(index, query_matrix, k=3, threshold=RAG_SCORE_THRESHOLD, query_embeddings=None,
+                 alpha=RAG_HYBRID_ALPHA):
+    """
+    Top-k (row, score) pairs for every row of an already-vectorized query matrix.
+    All queries are scored together: one sparse product per segment against its postings.
+    A single query goes through `search` instead (term-at-a-time, with the time budget).
+    """
+    query_matrix = sp.csr_matrix(query_matrix, dtype=np.float32)
+    n_queries = query_matrix.shape[0]
+    if n_queries == 1:
+        embedding = query_embeddings[0] if query_embeddings is not None else None
+        return [search(index, query_matrix, k, threshold, query_embedding=embedding, alpha=alpha)]
+
+    # (queries x terms) @ (terms x docs): postings.T is the CSR view of the term -> doc lists
+    products = [(query_matrix @ seg.postings.T).tocsr() for seg in index.segments]
+    for product in products:
+        product.sort_indices()  # fuse() looks rows up with searchsorted
+    starts = index.row_starts[:-1]
+
+    results = []
+    for q in range(n_queries):
+        row_parts, score_parts = [], []
+        for product, start in zip(products, starts):
+            _product_row(product, q, start, row_parts, score_parts)
+        rows = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int64)
+        scores = np.concatenate(score_parts) if score_parts else np.zeros(0, dtype=np.float32)
+        if query_embeddings is not None and index.dense and alpha > 0:
+            rows, scores = fuse(index, rows, scores, query_embeddings[q], k, alpha)
+        rows, scores = select_top_k(rows, scores, k, threshold, index.tombstones)
+        results.append(list(zip(rows.tolist(), scores.tolist())))
+    return results
+
+
+# --- Benchmark ---
+
+def _synthetic_corpus(n_docs, n_terms=50000, terms_per_doc=30, seed=0):
+    """
+    l2-normalized random tf-idf-like matrix with a Zipfian term distribution.
+    """
+    rng = np.random.default_rng(seed)
+    nnz = n_docs * terms_per_doc
+    cols = np.minimum(rng.zipf(1.3, size=nnz) - 1, n_terms - 1).astype(np.int32)
+    rows = np.repeat(np.arange(n_docs, dtype=np.int32), terms_per_doc)
+    data = rng.random(nnz, dtype=np.float32) + 0.1
+    matrix = sp.csr_matrix((data, (rows, cols)), shape=(n_docs, n_terms), dtype=np.float32)
+    matrix.sum_duplicates()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    matrix = sp.diags(1 / np.maximum(norms, 1e-12)).dot(matrix).tocsr().astype(np.float32)
+    return matrix
+
+
+def _synthetic_queries(n_queries, n_terms, seed=1):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(n_queries):
+        terms = np.unique(np.minimum(rng.zipf(1.3, size=4) - 1, n_terms - 1))
+        weights = rng.random(len(terms), dtype=np.float32) + 0.1
+        q = sp.csr_matrix((weights / np.linalg.norm(weights), (np.zeros(len(terms), dtype=np.int32), terms)),
+                          shape=(1, n_terms))
+        queries.append(q)
+    return queries
+
+
+def _baseline(matrix, query_vec, k, threshold):
+    # The original path: dense cosine against every document + full argsort
+    from sklearn.metrics.pairwise import cosine_similarity
+    sims = cosine_similarity(query_vec, matrix).flatten()
+    top = sims.argsort()[-k:][::-1]
+    return [int(i) for i in top if sims[i] > threshold]
+
+
+def benchmark(sizes=(10_000, 100_000, 1_000_000), n_queries=50, k=3):
+    for n_docs in sizes:
+        matrix = _synthetic_corpus(n_docs)
+        postings = [matrix.tocsc()]
+        queries = _synthetic_queries(n_queries, matrix.shape[1])
+        starts = np.array([0])
+
+        timings = {"baseline": [], "inverted": []}
+        agree = 0
+        for q in queries:
+            t0 = time.perf_counter()
+            expected = _baseline(matrix, q, k, RAG_SCORE_THRESHOLD)
+            t1 = time.perf_counter()
+            rows, scores, _ = accumulate(postings, starts, q, budget_ms=0)
+            got, _ = select_top_k(rows, scores, k)
+            t2 = time.perf_counter()
+            timings["baseline"].append(1000 * (t1 - t0))
+            timings["inverted"].append(1000 * (t2 - t1))
+            agree += set(expected) == set(got.tolist())
+
+        report = {"docs": n_docs, "queries": n_queries, "top_k_agreement": round(agree / n_queries, 3)}
+        for name, values in timings.items():
+            report[f"{name}_p50_ms"] = round(float(np.percentile(values, 50)), 3)
+            report[f"{name}_p99_ms"] = round(float(np.percentile(values, 99)), 3)
+        report["speedup_p50"] = round(report["baseline_p50_ms"] / max(report["inverted_p50_ms"], 1e-6), 1)
+        print(json.dumps(report))
+        del matrix, postings
+
+
+if __name__ == "__main__":
+    # python -m assistant.retrieval bench [sizes...]
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        sizes = tuple(int(n) for n in sys.argv[2:]) or (10_000, 100_000, 1_000_000)
+        benchmark(sizes)
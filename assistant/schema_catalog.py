@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+SCHEMA_CACHE_TTL = float(os.getenv("SCHEMA_CACHE_TTL", 300))           # seconds before an entry is reloaded
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", 0))  # background refresh period, 0 = off
+SCHEMA_SAMPLE_SIZE = int(os.getenv("SCHEMA_SAMPLE_SIZE", 20))          # docs sampled per collection for fields
+SCHEMA_MISS_REFRESH = float(os.getenv("SCHEMA_MISS_REFRESH", 5))       # min age before an unknown name forces a reload
+
+
+class SchemaCatalog:
+    """
+    In-process cache of collection names and sampled field sets.
+    Keeps list_collection_names() / find_one() round-trips off the chat hot path.
+    """
+    def __init__(self, get_db, ttl=SCHEMA_CACHE_TTL, sample_size=SCHEMA_SAMPLE_SIZE):
+        self._get_db = get_db
+        self.ttl = ttl
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._collections = None
+        self._collections_at = 0.0
+        self._fields = {}
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _fresh(self, loaded_at):
+        return time.monotonic() - loaded_at < self.ttl
+
+    def _load_collections(self):
+        db = self._get_db()
+        if db is None:
+            return None
+        names = [c for c in db.list_collection_names() if not c.startswith("system.")]
+        with self._lock:
+            self._collections = names
+            self._collections_at = time.monotonic()
+            self.reloads += 1
+        return names
+
+    def _load_fields(self, collection_name):
+        db = self._get_db()
+        if db is None:
+            return None
+        keys = []
+        for doc in db[collection_name].find({}, {"_id": 0}).limit(self.sample_size):
+            for k in doc.keys():
+                if k not in keys:
+                    keys.append(k)
+        with self._lock:
+            self._fields[collection_name] = (keys, time.monotonic())
+            self.reloads += 1
+        return keys
+
+    def collections(self):
+        """
+        Collection names (system.* excluded), or None if the database is unreachable.
+        """
+        with self._lock:
+            if self._collections is not None and self._fresh(self._collections_at):
+                self.hits += 1
+                return list(self._collections)
+            self.misses += 1
+        return self._load_collections()
+
+    def has_collection(self, collection_name):
+        names = self.collections()
+        if names is None:
+            return False
+        if collection_name in names:
+            return True
+        # Unknown name: maybe created since the last load, re-check unless we just did
+        with self._lock:
+            recent = time.monotonic() - self._collections_at < SCHEMA_MISS_REFRESH
+        if recent:
+            return False
+        names = self._load_collections()
+        return bool(names) and collection_name in names
+
+    def fields(self, collection_name):
+        """
+        Field names seen in a sample of the collection's documents.
+        """
+        with self._lock:
+            entry = self._fields.get(collection_name)
+            if entry and self._fresh(entry[1]):
+                self.hits += 1
+                return list(entry[0])
+            self.misses += 1
+        return self._load_fields(collection_name)
+
+    def invalidate(self, collection_name=None):
+        """
+        Drops one collection's field set, or everything when no name is given.
+        """
+        with self._lock:
+            if collection_name is None:
+                self._collections = None
+                self._fields.clear()
+            else:
+                self._fields.pop(collection_name, None)
+                self._collections = None
+
+    def refresh(self):
+        self._load_collections()
+        with self._lock:
+            known = list(self._fields)
+        for name in known:
+            self._load_fields(name)
+
+    def _refresh_loop(self, interval):
+        while not self._refresh_stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️  Schema refresh failed: {e}")
+
+    def start_background_refresh(self, interval=SCHEMA_REFRESH_INTERVAL):
+        if interval <= 0 or self._refresh_thread is not None:
+            return
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop, args=(interval,), name="schema-refresh", daemon=True
+        )
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._refresh_stop.set()
+        self._refresh_thread = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "reloads": self.reloads,
+                "collections_cached": len(self._collections or []),
+                "field_sets_cached": len(self._fields),
+            }
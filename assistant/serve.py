@@ -0,0 +1,205 @@
+"""
+Pre-fork production launcher: the master loads the Whisper model (and the RAG index, via brain)
+once, then forks N uvicorn workers that accept on one shared socket. Weights are never written
+after load, so the workers share their pages copy-on-write instead of holding N copies.
+
+The master keeps torch single-threaded and never runs the model: an OpenMP thread pool does not
+survive fork, so each worker sizes its own pool and warms up after forking. Workers share
+recordings/ and the TTS cache on disk (worker 0 sweeps); /metrics and /stats are per worker.
+
+    python -m assistant.serve --workers 4 --port 8002
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configuration
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", 8002))
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", 2))
+SERVE_TORCH_THREADS = int(os.getenv("SERVE_TORCH_THREADS", 0))            # per worker, 0 = cores / workers
+SERVE_REPORT_INTERVAL = float(os.getenv("SERVE_REPORT_INTERVAL", 60))     # seconds between memory reports, 0 = startup only
+SERVE_RESPAWN_DELAY = 1.0
+
+
+def torch_threads(workers):
+    return SERVE_TORCH_THREADS or max(1, (os.cpu_count() or 1) // workers)
+
+
+def memory(pid="self"):
+    """
+    {"rss", "pss", "uss", "shared"} in MB from /proc/<pid>/smaps_rollup. USS (private pages) is
+    what the process really costs; pages still shared with the master count only once, in PSS.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        "rss": round(fields.get("Rss", 0.0), 1),
+        "pss": round(fields.get("Pss", 0.0), 1),
+        "uss": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+        "shared": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+    }
+
+
+def bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload():
+    """
+    Everything the workers should inherit instead of building: the API module (which loads the RAG
+    index and query encoder on import) and the Whisper model, cached in the registry so each
+    worker's lifespan finds it instead of loading its own. Not warmed up here: that runs the
+    model, and the worker's lifespan does it after the fork.
+    """
+    import torch
+    # One thread: loading never starts an OpenMP pool the forked workers would inherit broken
+    torch.set_num_threads(1)
+    from whisper_app import model_registry
+    from assistant import api
+
+    key = model_registry.resolve()
+    if key[1].startswith("cuda"):
+        # A CUDA context does not survive fork: every worker loads (and owns) its own GPU copy
+        print("⚠️  CUDA model: not preloaded, each worker loads its own copy")
+    else:
+        model_registry.get_model(*key)
+    return api.app
+
+
+def run_worker(worker_id, app, sock, threads, log_level):
+    import torch
+    import uvicorn
+
+    os.environ["SERVE_WORKER_ID"] = str(worker_id)
+    torch.set_num_threads(threads)
+    gc.enable()
+    # The worker only serves; uvicorn's own signal handling drains connections on SIGTERM/SIGINT
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    """
+    Forks the workers, restarts any that die, forwards shutdown signals and reports memory.
+    """
+    def __init__(self, app, sock, workers, threads, log_level):
+        self.app = app
+        self.sock = sock
+        self.n_workers = workers
+        self.threads = threads
+        self.log_level = log_level
+        self.workers = {}   # pid -> worker id
+        self.stopping = False
+
+    def spawn(self, worker_id):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(worker_id, self.app, self.sock, self.threads, self.log_level)
+            except BaseException as e:
+                print(f"❌ Worker {worker_id}: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = worker_id
+        print(f"✓ Worker {worker_id} started (pid {pid}, {self.threads} torch thread(s))")
+
+    def stop(self, signum, _frame=None):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(self):
+        master = memory()
+        rows = [(wid, pid, memory(pid)) for pid, wid in sorted(self.workers.items(), key=lambda item: item[1])]
+        total_uss = sum(m["uss"] for _, _, m in rows if m)
+        print(f"📊 Master pid {os.getpid()}: RSS {master['rss']:.0f}MB" if master else "📊 Memory report")
+        for wid, pid, m in rows:
+            if m:
+                print(f"   worker {wid} (pid {pid}): USS {m['uss']:.0f}MB, RSS {m['rss']:.0f}MB, "
+                      f"PSS {m['pss']:.0f}MB, shared {m['shared']:.0f}MB")
+        if master:
+            print(f"   total ≈ {master['rss'] + total_uss:.0f}MB "
+                  f"(vs {master['rss'] * len(rows):.0f}MB+ as independent processes)")
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for worker_id in range(self.n_workers):
+            self.spawn(worker_id)
+        next_report = time.monotonic() + 5.0
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.5)
+                if not self.stopping and time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + SERVE_REPORT_INTERVAL if SERVE_REPORT_INTERVAL > 0 else float("inf")
+                continue
+            worker_id = self.workers.pop(pid)
+            if not self.stopping:
+                print(f"⚠️  Worker {worker_id} (pid {pid}) exited with status {status}, restarting")
+                time.sleep(SERVE_RESPAWN_DELAY)
+                self.spawn(worker_id)
+        print("Shutting down...")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the assistant API as a pre-forked multi-worker server.")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--torch-threads", type=int, default=0, help="per worker (default: cores / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    threads = args.torch_threads or torch_threads(args.workers)
+    # Default pool size for anything the workers start after the fork (torch itself is set per worker)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, str(threads))
+
+    # Collections during load would only churn; afterwards everything loaded goes to the permanent
+    # generation so the workers' collector never writes to (and un-shares) those object headers
+    gc.disable()
+    app = preload()
+    sock = bind(args.host, args.port)
+    gc.freeze()
+    print(f"🚀 {args.workers} worker(s) on http://{args.host}:{args.port}")
+    Master(app, sock, args.workers, threads, args.log_level).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,15 @@ let isPlaying = false;
 let currentAudio = null;
 let abortController = null;
 
+// Streaming mode: send audio chunks over a WebSocket while recording
+const USE_STREAMING = 'WebSocket' in window;
+const CHUNK_INTERVAL_MS = 250;
+let socket = null;
+let pendingFrames = [];  // recorded before the socket opened, flushed in order by onopen
+let partialDiv = null;
+let audioQueue = [];
+let replyDone = true;
+
 // Initialize Audio Context (for autoplay policies generally, but here we just need recorder)
 if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
     alert("Microphone access is not supported in this browser.");
@@ -25,13 +34,22 @@ async function startRecording() {
         const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
         mediaRecorder = new MediaRecorder(stream, { mimeType: 'audio/webm' });
 
-        mediaRecorder.ondataavailable = (event) => {
-            if (event.data.size > 0) audioChunks.push(event.data);
-        };
-
-        mediaRecorder.onstop = sendAudio;
+        if (USE_STREAMING) {
+            openSocket();
+            // The first chunk carries the WebM header: nothing may be dropped while the handshake runs
+            mediaRecorder.ondataavailable = (event) => {
+                if (event.data.size > 0) sendFrame(event.data);
+            };
+            mediaRecorder.onstop = () => sendFrame(JSON.stringify({ type: 'stop' }));
+            mediaRecorder.start(CHUNK_INTERVAL_MS);
+        } else {
+            mediaRecorder.ondataavailable = (event) => {
+                if (event.data.size > 0) audioChunks.push(event.data);
+            };
+            mediaRecorder.onstop = sendAudio;
+            mediaRecorder.start();
+        }
 
-        mediaRecorder.start();
         isRecording = true;
         updateUI('recording');
         audioChunks = [];
@@ -57,6 +75,7 @@ function stopRecording() {
 }
 
 function stopAudio() {
+    audioQueue = [];
     if (currentAudio) {
         currentAudio.pause();
         currentAudio = null;
@@ -64,14 +83,108 @@ function stopAudio() {
     isPlaying = false;
 }
 
+// Plays reply segments back to back as they arrive
+function enqueueAudio(url) {
+    audioQueue.push(url);
+    if (!isPlaying) playNextSegment();
+}
+
+function playNextSegment() {
+    const url = audioQueue.shift();
+    if (!url) {
+        isPlaying = false;
+        currentAudio = null;
+        if (replyDone) updateUI('idle');
+        return;
+    }
+    currentAudio = new Audio(url);
+    isPlaying = true;
+    updateUI('playing');
+    currentAudio.onended = playNextSegment;
+    currentAudio.play().catch(e => {
+        console.error("Autoplay failed:", e);
+        playNextSegment();
+    });
+}
+
 function cancelProcessing() {
     if (abortController) {
         abortController.abort();
         abortController = null;
     }
+    if (socket) {
+        socket.onmessage = null;
+        socket.close();
+        socket = null;
+    }
+    pendingFrames = [];
+    partialDiv = null;
     isProcessing = false;
 }
 
+function openSocket() {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const ws = new WebSocket(`${protocol}//${window.location.host}/ws/chat`);
+    socket = ws;
+    pendingFrames = [];
+    ws.binaryType = 'arraybuffer';
+    ws.onopen = () => {
+        if (socket !== ws) return;  // cancelled while connecting
+        pendingFrames.forEach(frame => ws.send(frame));
+        pendingFrames = [];
+    };
+    socket.onmessage = (event) => handleSocketMessage(JSON.parse(event.data));
+    socket.onerror = () => {
+        addMessage("Error communicating with server.", "ai");
+        isProcessing = false;
+        updateUI('idle');
+    };
+}
+
+// Audio chunks and the stop frame, in recording order: queued until the socket is open
+function sendFrame(frame) {
+    if (!socket) return;
+    if (socket.readyState === WebSocket.CONNECTING) {
+        pendingFrames.push(frame);
+    } else if (socket.readyState === WebSocket.OPEN) {
+        socket.send(frame);
+    }
+}
+
+function handleSocketMessage(msg) {
+    if (msg.type === 'partial') {
+        // Live transcript while the user is still talking
+        if (!partialDiv) {
+            partialDiv = document.createElement('div');
+            partialDiv.classList.add('message', 'user', 'partial');
+            chatHistory.appendChild(partialDiv);
+        }
+        partialDiv.textContent = msg.text;
+        chatHistory.scrollTop = chatHistory.scrollHeight;
+    } else if (msg.type === 'final') {
+        if (partialDiv) {
+            partialDiv.remove();
+            partialDiv = null;
+        }
+        if (msg.text) addMessage(msg.text, 'user');
+        replyDone = false;
+    } else if (msg.type === 'segment') {
+        enqueueAudio(msg.audio_url);
+    } else if (msg.type === 'reply_end') {
+        isProcessing = false;
+        replyDone = true;
+        if (msg.ai_text) addMessage(msg.ai_text, 'ai');
+        if (!isPlaying) updateUI('idle');
+    } else if (msg.type === 'error') {
+        isProcessing = false;
+        const text = msg.status === 503
+            ? `Server is busy, please try again in ${msg.retry_after} seconds.`
+            : "Error communicating with server.";
+        addMessage(text, "ai");
+        updateUI('idle');
+    }
+}
+
 async function sendAudio() {
     const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
     const formData = new FormData();
@@ -87,6 +200,12 @@ async function sendAudio() {
             signal: abortController.signal
         });
 
+        if (response.status === 503) {
+            const retryAfter = response.headers.get('Retry-After') || 'a few';
+            addMessage(`Server is busy, please try again in ${retryAfter} seconds.`, "ai");
+            return;
+        }
+
         if (!response.ok) {
             throw new Error(`Server error: ${response.status}`);
         }
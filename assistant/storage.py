@@ -0,0 +1,235 @@
+"""Recordings storage: collision-free names, a byte/file budget and background eviction"""
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+STORAGE_MAX_MB = float(os.getenv("STORAGE_MAX_MB", 512))            # inputs + replies under RECORDINGS_DIR
+STORAGE_MAX_FILES = int(os.getenv("STORAGE_MAX_FILES", 2000))
+STORAGE_MAX_AGE = float(os.getenv("STORAGE_MAX_AGE", 3600))         # seconds; 0 = no age limit
+STORAGE_SWEEP_INTERVAL = float(os.getenv("STORAGE_SWEEP_INTERVAL", 30))
+REPLY_AUDIO_IN_MEMORY = os.getenv("REPLY_AUDIO_IN_MEMORY", "0") == "1"  # serve replies from RAM, no files
+REPLY_MEMORY_MAX_MB = float(os.getenv("REPLY_MEMORY_MAX_MB", 64))
+
+
+def reply_audio_in_memory(worker=None):
+    """
+    Whether reply audio may live in RAM. Not under the pre-fork server (SERVE_WORKER_ID set):
+    each worker would hold its own store, so /audio/<name> could 404 on the worker that answers.
+    """
+    if REPLY_AUDIO_IN_MEMORY and worker is not None:
+        print(f"⚠️ REPLY_AUDIO_IN_MEMORY ignored in pre-fork worker {worker}: reply audio goes to the shared disk store")
+        return False
+    return REPLY_AUDIO_IN_MEMORY
+
+
+def new_request_id():
+    """
+    Sortable, collision-free id for one request's files: second timestamp + random uuid4 suffix.
+    """
+    return f"{int(time.time())}_{uuid.uuid4().hex}"
+
+
+class _Budget:
+    """
+    LRU index of sized entries with an age limit; subclasses decide how an entry is dropped.
+    """
+    def __init__(self, max_bytes, max_files, max_age):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age = max_age
+        self._entries = OrderedDict()  # key -> [size, created_at], least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _add_locked(self, key, size, created_at=None):
+        old = self._entries.pop(key, None)
+        if old:
+            self._bytes -= old[0]
+        self._entries[key] = [size, created_at or time.time()]
+        self._bytes += size
+
+    def _pop_locked(self, key):
+        size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self.evictions += 1
+
+    def _expired_locked(self, now):
+        """
+        Keys to drop: everything past max_age, then the least recently used until within budget
+        (the newest entry always stays, even if it alone exceeds it).
+        """
+        doomed = []
+        if self.max_age > 0:
+            doomed = [key for key, (_, created) in self._entries.items() if now - created > self.max_age]
+            for key in doomed:
+                self._pop_locked(key)
+        while len(self._entries) > 1 and (self._bytes > self.max_bytes or len(self._entries) > self.max_files):
+            key = next(iter(self._entries))
+            self._pop_locked(key)
+            doomed.append(key)
+        return doomed
+
+    def over_budget(self):
+        with self._lock:
+            return self._bytes > self.max_bytes or len(self._entries) > self.max_files
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "mb": round(self._bytes / 2 ** 20, 2),
+                "max_mb": round(self.max_bytes / 2 ** 20, 2),
+                "max_files": self.max_files,
+                "evictions": self.evictions,
+            }
+
+
+class RecordingStore(_Budget):
+    """
+    Tracks the files written under `root` (uploads, uncached replies) and deletes the oldest
+    and least recently served ones from a background thread. Directories listed in `exclude`
+    (the TTS cache, which has its own LRU) are left alone.
+
+    `shared`: several processes write under `root` (pre-fork workers). The index is then rebuilt
+    from the directory on every sweep, with recency kept in each file's atime, so a single
+    sweeping process enforces the budget for all of them.
+    """
+    def __init__(self, root, exclude=(), max_bytes=int(STORAGE_MAX_MB * 2 ** 20),
+                 max_files=STORAGE_MAX_FILES, max_age=STORAGE_MAX_AGE, shared=False):
+        super().__init__(max_bytes, max_files, max_age)
+        self.root = root
+        self.exclude = {os.path.abspath(path) for path in exclude}
+        self.shared = shared
+        self._sweep_stop = threading.Event()
+        self._sweep_wake = threading.Event()
+        self._sweep_thread = None
+        self._scan()
+
+    def _scan(self):
+        # Pick up files left by a previous run (e.g. PERSIST_INPUTS), least recently used first
+        found = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) not in self.exclude]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another process meanwhile
+                found.append((max(st.st_atime, st.st_mtime) if self.shared else st.st_mtime, st.st_mtime, path, st.st_size))
+        with self._lock:
+            if self.shared:
+                self._entries.clear()
+                self._bytes = 0
+            for _, mtime, path, size in sorted(found):
+                self._add_locked(os.path.abspath(path), size, mtime)
+
+    def path(self, *parts):
+        """
+        Absolute path under the root, with its parent directory created.
+        """
+        path = os.path.join(self.root, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def register(self, path):
+        """
+        Records a freshly written file; wakes the sweeper early when it tips the budget.
+        """
+        if self.shared:
+            return  # the sweeping process finds it on its next scan
+        size = os.path.getsize(path)
+        with self._lock:
+            self._add_locked(os.path.abspath(path), size)
+        if self.over_budget():
+            self._sweep_wake.set()
+
+    def touch(self, path):
+        # Served again: move to the back of the eviction queue
+        if self.shared:
+            try:
+                os.utime(path, (time.time(), os.stat(path).st_mtime))
+            except FileNotFoundError:
+                pass
+            return
+        with self._lock:
+            key = os.path.abspath(path)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def sweep(self):
+        if self.shared:
+            self._scan()
+        with self._lock:
+            doomed = self._expired_locked(time.time())
+        for path in doomed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if doomed:
+            print(f"🧹 Recordings: evicted {len(doomed)} file(s)")
+        return len(doomed)
+
+    def stats(self):
+        if self.shared:
+            self._scan()  # count the other processes' files too
+        return super().stats()
+
+    def _sweep_loop(self, interval):
+        while not self._sweep_stop.is_set():
+            self._sweep_wake.wait(interval)
+            self._sweep_wake.clear()
+            if self._sweep_stop.is_set():
+                return
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️  Recordings sweep failed: {e}")
+
+    def start_background_sweep(self, interval=STORAGE_SWEEP_INTERVAL):
+        if interval <= 0 or self._sweep_thread is not None:
+            return
+        self._sweep_stop.clear()
+        self._sweep_thread = threading.Thread(
+            target=self._sweep_loop, args=(interval,), name="recordings-sweep", daemon=True
+        )
+        self._sweep_thread.start()
+
+    def stop_background_sweep(self):
+        self._sweep_stop.set()
+        self._sweep_wake.set()
+        self._sweep_thread = None
+
+
+class MemoryStore(_Budget):
+    """
+    Reply audio kept in RAM (REPLY_AUDIO_IN_MEMORY=1) under the same LRU + age policy;
+    eviction is inline since there are no files to delete.
+    """
+    def __init__(self, max_bytes=int(REPLY_MEMORY_MAX_MB * 2 ** 20), max_files=STORAGE_MAX_FILES,
+                 max_age=STORAGE_MAX_AGE):
+        super().__init__(max_bytes, max_files, max_age)
+        self._data = {}
+
+    def put(self, key, data):
+        with self._lock:
+            self._add_locked(key, len(data))
+            self._data[key] = data
+            for doomed in self._expired_locked(time.time()):
+                self._data.pop(doomed, None)
+
+    def get(self, key):
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
@@ -0,0 +1,159 @@
+import os
+import asyncio
+import subprocess
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+from . import inference
+from whisper_app import vad  # importable once inference has put the project root on sys.path
+
+load_dotenv()
+
+# Configuration
+SAMPLE_RATE = 16000
+STREAM_PARTIAL_INTERVAL = float(os.getenv("STREAM_PARTIAL_INTERVAL", 1.0))  # seconds of new audio per partial
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", 20.0))     # tail length that triggers a commit
+STREAM_OVERLAP_SECONDS = float(os.getenv("STREAM_OVERLAP_SECONDS", 5.0))    # kept uncommitted for re-decoding
+
+
+class StreamingDecoder:
+    """
+    Long-lived ffmpeg process per connection: container chunks (webm/opus) go in on
+    stdin as they arrive, 16 kHz mono float32 PCM is collected from stdout.
+    """
+    def __init__(self):
+        self._proc = subprocess.Popen(
+            ["ffmpeg", "-nostdin", "-loglevel", "quiet", "-i", "pipe:0",
+             "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self._pcm = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        while True:
+            chunk = self._proc.stdout.read1(65536)
+            if not chunk:
+                break
+            with self._lock:
+                self._pcm.extend(chunk)
+
+    def feed(self, data):
+        self._proc.stdin.write(data)
+        self._proc.stdin.flush()
+
+    def num_samples(self):
+        with self._lock:
+            return len(self._pcm) // 4
+
+    def audio(self, start=0):
+        """
+        Returns decoded samples from `start` onwards as a float32 array.
+        """
+        with self._lock:
+            usable = len(self._pcm) - len(self._pcm) % 4
+            return np.frombuffer(bytes(self._pcm[start * 4:usable]), dtype=np.float32)
+
+    def close(self):
+        """
+        Flushes ffmpeg and waits until every decoded sample has been collected.
+        """
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        self._proc.wait()
+
+
+class SlidingWindowTranscriber:
+    """
+    Incremental transcription over a growing audio buffer.
+
+    Partials re-decode only the uncommitted tail. Once the tail grows past
+    STREAM_WINDOW_SECONDS, every segment ending before the last
+    STREAM_OVERLAP_SECONDS is committed (everything decoded, if no segment ends
+    that early) and the window slides forward, so the final pass after the user
+    stops only decodes the last window. New audio that is all silence is not decoded.
+    """
+    def __init__(self, executor, batcher=None):
+        self.executor = executor
+        self.batcher = batcher
+        self.committed_text = ""
+        self.committed_samples = 0
+        self._last_partial_at = 0
+
+    def _prompt_options(self):
+        return {"initial_prompt": self.committed_text[-200:]} if self.committed_text else {}
+
+    def _commit(self, res, tail_seconds):
+        """
+        Commits the segments of a tail decode that end before the last STREAM_OVERLAP_SECONDS and
+        returns the text of the rest. When none does (one long run without a pause), every decoded
+        segment is committed so the tail, and each partial's decode, can't keep growing.
+        """
+        segments = res.get("segments", [])
+        cutoff = tail_seconds - STREAM_OVERLAP_SECONDS
+        done = 0
+        while done < len(segments) and segments[done]["end"] <= cutoff:
+            done += 1
+        done = done or len(segments)
+        for seg in segments[:done]:
+            self.committed_text = f"{self.committed_text} {seg['text'].strip()}".strip()
+        if done:
+            self.committed_samples += int(segments[done - 1]["end"] * SAMPLE_RATE)
+            return " ".join(seg["text"].strip() for seg in segments[done:])
+        return res["text"].strip()
+
+    async def partial(self, decoder):
+        """
+        Returns a fresh partial transcript, or None when there isn't enough new audio yet
+        or the new audio is silence (the previous partial still stands).
+        """
+        total = decoder.num_samples()
+        if total - self._last_partial_at < STREAM_PARTIAL_INTERVAL * SAMPLE_RATE:
+            return None
+        new_audio = decoder.audio(self._last_partial_at)
+        self._last_partial_at = total
+        if not await asyncio.to_thread(vad.has_speech, new_audio, SAMPLE_RATE):
+            return None
+
+        tail = decoder.audio(self.committed_samples)
+        if len(tail) > STREAM_WINDOW_SECONDS * SAMPLE_RATE:
+            # One decode both slides the window and serves as this partial
+            res = await self.executor.transcribe(tail, **self._prompt_options())
+            pending = self._commit(res, len(tail) / SAMPLE_RATE)
+        elif self.batcher and not self.committed_text:
+            pending = (await self.batcher.transcribe(tail))["text"].strip()
+        else:
+            pending = (await self.executor.transcribe(tail, **self._prompt_options()))["text"].strip()
+        return f"{self.committed_text} {pending}".strip()
+
+    async def final(self, decoder):
+        # Same VAD gate as the HTTP upload path: a silent tail never reaches the model
+        tail, _ = await asyncio.to_thread(vad.trim, decoder.audio(self.committed_samples), SAMPLE_RATE)
+        if len(tail) == 0:
+            return self.committed_text
+        res = await self.executor.transcribe(tail, **self._prompt_options())
+        return f"{self.committed_text} {res['text'].strip()}".strip()
+
+
+async def run_partials(decoder, transcriber, send_json, stopped):
+    """
+    Pushes partial transcripts until `stopped` is set. Busy executors just skip a partial.
+    """
+    while not stopped.is_set():
+        try:
+            text = await transcriber.partial(decoder)
+            if text:
+                await send_json({"type": "partial", "text": text})
+        except inference.InferenceQueueFull:
+            pass
+        try:
+            await asyncio.wait_for(stopped.wait(), timeout=0.25)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,190 @@
+"""Content-addressed TTS audio cache: recurring phrases are synthesized once and served from disk"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "1") == "1"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("recordings", "tts_cache"))  # must live under /recordings
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", 256))  # least recently used files go first
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", 4))        # sentences synthesized at once, across requests
+STALE_TMP_SECONDS = 600  # a shared directory's .tmp files younger than this may be another worker's synthesis
+
+
+def make_key(text, voice, engine):
+    """
+    sha256 of (engine, voice, text); whitespace differences map to the same audio.
+    """
+    payload = json.dumps([engine, voice, " ".join(text.split())], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Size-bounded LRU of synthesized mp3 files. The index lives in memory and is rebuilt
+    from file mtimes on startup, so the recency order survives restarts.
+
+    `shared`: several processes (pre-fork workers) use the directory. Lookups then go to
+    disk, and every write rescans the directory and evicts against the one shared budget.
+    """
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=int(TTS_CACHE_MAX_MB * 2 ** 20), url_prefix="/recordings/tts_cache",
+                 shared=False):
+        self.directory = directory
+        self.shared = shared
+        self.max_bytes = max_bytes
+        self.url_prefix = url_prefix
+        self._entries = OrderedDict()  # key -> size in bytes, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pending = {}             # key -> asyncio.Future, one synthesis per phrase in flight
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = self._scan(startup=True)
+        with self._lock:
+            self._evict_locked()
+        if found:
+            print(f"✓ TTS cache: {len(self._entries)} phrase(s), {self._bytes / 2 ** 20:.1f}MB")
+
+    def _scan(self, startup=False):
+        # Rebuilds the index from the directory, least recently used first
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+            if name.endswith(".tmp"):
+                if startup and (not self.shared or time.time() - st.st_mtime > STALE_TMP_SECONDS):
+                    os.remove(path)  # interrupted synthesis
+            elif name.endswith(".mp3"):
+                found.append((st.st_mtime, name[:-4], st.st_size))
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for _, key, size in sorted(found):
+                self._entries[key] = size
+                self._bytes += size
+        return found
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key}.mp3"
+
+    def get(self, key):
+        with self._lock:
+            # Shared: another process may have written it, the file itself is the index
+            if key not in self._entries and not self.shared:
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(self.path(key))  # persist recency for the next startup
+        except FileNotFoundError:
+            # Deleted behind our back: forget it and resynthesize
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+            return None
+        return self.url(key)
+
+    def put(self, key, tmp_path):
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, self.path(key))
+        if self.shared:
+            self._scan()  # the budget covers every process's files
+            with self._lock:
+                self._evict_locked()
+            return
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict_locked()
+
+    def _evict_locked(self):
+        # The newest entry always stays, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    async def fetch(self, text, variants, synthesize):
+        """
+        URL of the audio for `text`. `variants` lists the (engine, voice) pairs allowed to serve
+        it, preferred first. On a miss, `synthesize(text, path)` writes the mp3 and returns the
+        (engine, voice) it actually used, which becomes the cache key.
+        """
+        keys = [make_key(text, voice, engine) for engine, voice in variants]
+        for key in keys:
+            url = self.get(key)
+            if url:
+                return url
+
+        # Concurrent requests for the same phrase wait on a single synthesis
+        lead = keys[0]
+        if lead in self._pending:
+            pending = self._pending[lead]
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The leading request was abandoned (client gone), synthesize it for this one
+                return await self.fetch(text, variants, synthesize)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[lead] = future
+        with self._lock:
+            self.misses += 1
+        tmp_path = os.path.join(self.directory, f"{lead}.{uuid.uuid4().hex}.tmp")
+        try:
+            engine, voice = await synthesize(text, tmp_path)
+            key = make_key(text, voice, engine)
+            await asyncio.to_thread(self.put, key, tmp_path)
+            url = self.url(key)
+            future.set_result(url)
+            return url
+        except BaseException as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # waiters re-raise it; don't warn when there are none
+            else:
+                future.cancel()
+            raise
+        finally:
+            del self._pending[lead]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._entries),
+                "mb": round(self._bytes / 2 ** 20, 2),
+                "max_mb": round(self.max_bytes / 2 ** 20, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
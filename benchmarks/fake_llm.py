@@ -0,0 +1,111 @@
+"""OpenAI-compatible stand-in for the LLM: canned replies with configurable latency and tool-call rate"""
+import os
+import sys
+import json
+import time
+import asyncio
+import zlib
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configuration (flags override)
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 300))   # time to first token
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", 15))        # per streamed token
+FAKE_LLM_TOOL_RATE = float(os.getenv("FAKE_LLM_TOOL_RATE", 0.2))     # share of first passes that call a tool
+FAKE_LLM_COLLECTION = os.getenv("FAKE_LLM_COLLECTION", "clients")
+
+REPLY = (
+    "Sure, here is a short answer to that. "
+    "I looked at what you asked and the main point is simple. "
+    "Let me know if you would like more detail on any part of it."
+)
+
+app = FastAPI()
+settings = {
+    "latency_ms": FAKE_LLM_LATENCY_MS,
+    "token_ms": FAKE_LLM_TOKEN_MS,
+    "tool_rate": FAKE_LLM_TOOL_RATE,
+    "collection": FAKE_LLM_COLLECTION,
+}
+counts = {"requests": 0, "tool_calls": 0}
+
+
+def _reply_for(messages):
+    """
+    Deterministic per user text: the same prompt always does (or doesn't) call the tool.
+    """
+    user_text = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    second_pass = any("TOOL RESULTS" in (m.get("content") or "") for m in messages if m["role"] == "system")
+    if not second_pass and zlib.crc32(user_text.encode()) % 1000 < settings["tool_rate"] * 1000:
+        counts["tool_calls"] += 1
+        return json.dumps({"tool": "search", "collection": settings["collection"], "query": {}, "limit": 3})
+    return REPLY
+
+
+def _tokens(text):
+    words = text.split(" ")
+    return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    counts["requests"] += 1
+    text = _reply_for(body.get("messages", []))
+    model = body.get("model", "fake")
+    created = int(time.time())
+    await asyncio.sleep(settings["latency_ms"] / 1000)
+
+    if not body.get("stream"):
+        await asyncio.sleep(settings["token_ms"] * len(_tokens(text)) / 1000)
+        return JSONResponse({
+            "id": f"chatcmpl-fake-{counts['requests']}",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(_tokens(text)), "total_tokens": len(_tokens(text))},
+        })
+
+    async def events():
+        for i, token in enumerate(_tokens(text)):
+            if i:
+                await asyncio.sleep(settings["token_ms"] / 1000)
+            chunk = {
+                "id": f"chatcmpl-fake-{counts['requests']}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server.")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"])
+    parser.add_argument("--token-ms", type=float, default=settings["token_ms"])
+    parser.add_argument("--tool-rate", type=float, default=settings["tool_rate"])
+    parser.add_argument("--collection", default=settings["collection"])
+    args = parser.parse_args()
+    settings.update(latency_ms=args.latency_ms, token_ms=args.token_ms, tool_rate=args.tool_rate,
+                    collection=args.collection)
+    print(f"🤖 Fake LLM on :{args.port} ({args.latency_ms:.0f}ms first token, {args.token_ms:.0f}ms/token, "
+          f"tool rate {args.tool_rate})")
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+End-to-end load test: N concurrent clients against the assistant API, with local stand-ins
+for everything external (fake OpenAI-compatible LLM, mongomock, stub TTS).
+
+    python benchmarks/load_test.py --clients 8 --requests 10 --out results.json
+    python benchmarks/load_test.py --baseline results.json     # print deltas against a previous run
+"""
+import os
+import io
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import platform
+import subprocess
+import importlib.util
+
+# Bench-only packages (the API server and fake LLM run as subprocesses, so check their imports here too)
+BENCH_PACKAGES = ("httpx", "mongomock", "fastapi", "uvicorn", "multipart")
+_missing = [name for name in BENCH_PACKAGES if importlib.util.find_spec(name) is None]
+if _missing:
+    sys.exit(f"❌ Missing benchmark dependencies: {', '.join(_missing)}\n"
+             f"   pip install -r requirements-dev.txt")
+
+import numpy as np
+import httpx
+from scipy.io import wavfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT_DIR, "benchmarks")
+DEFAULT_AUDIO = os.path.join(ROOT_DIR, "test_audio.mp3")
+SAMPLE_RATE = 16000
+SYNTHETIC_SECONDS = (1.5, 3.0, 5.0, 8.0)  # synthetic clip lengths
+
+
+def synthetic_clip(seconds, seed):
+    """
+    Speech-like WAV bytes: a voiced harmonic tone, amplitude-modulated into syllables
+    with short pauses, so VAD keeps it and Whisper has something to chew on.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    f0 = rng.uniform(110, 220) * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(3, 5) * t)
+    pauses = (np.sin(2 * np.pi * 0.4 * t + rng.uniform(0, 6)) > -0.8).astype(np.float32)
+    edges = (t > 0.25) & (t < seconds - 0.25)  # room tone before and after, like a real recording
+    audio = 0.2 * voiced * syllables * pauses * edges + 0.003 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    wavfile.write(buffer, SAMPLE_RATE, (np.clip(audio, -1, 1) * 32767).astype(np.int16))
+    return buffer.getvalue()
+
+
+def load_clips(kind, audio_path):
+    clips = []
+    if kind in ("file", "mixed") and os.path.exists(audio_path):
+        with open(audio_path, "rb") as f:
+            clips.append((os.path.basename(audio_path), f.read(), "audio/mpeg"))
+    if kind in ("synthetic", "mixed") or not clips:
+        clips.extend((f"synthetic_{s:g}s.wav", synthetic_clip(s, i), "audio/wav") for i, s in enumerate(SYNTHETIC_SECONDS))
+    return clips
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid):
+    """
+    Current and peak resident set of a process in MB (Linux /proc), None elsewhere.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"rss": int(fields["VmRSS"].split()[0]) / 1024, "peak": int(fields["VmHWM"].split()[0]) / 1024}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def percentiles(values):
+    if not values:
+        return None
+    arr = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1), "p99_ms": round(float(p99), 1),
+            "mean_ms": round(float(arr.mean()), 1), "max_ms": round(float(arr.max()), 1)}
+
+
+def _start(cmd, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen(cmd, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def _wait_ready(url, proc, timeout):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.time() < deadline:
+            if proc is not None and proc.poll() is not None:
+                raise RuntimeError(f"process exited with code {proc.returncode}")
+            try:
+                if (await http.get(url, timeout=2)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+async def _one_request(http, url, endpoint, clip):
+    name, data, mime = clip
+    started = time.perf_counter()
+    first_audio = None
+    try:
+        files = {"audio": (name, data, mime)}
+        if endpoint == "/chat/stream":
+            async with http.stream("POST", url + endpoint, files=files) as response:
+                async for line in response.aiter_lines():
+                    if line and first_audio is None and json.loads(line).get("type") == "segment":
+                        first_audio = time.perf_counter() - started
+                status = response.status_code
+        else:
+            response = await http.post(url + endpoint, files=files)
+            status = response.status_code
+            first_audio = time.perf_counter() - started
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return {"clip": name, "status": status, "latency": time.perf_counter() - started, "first_audio": first_audio}
+
+
+async def run_load(url, endpoint, clips, clients, requests, warmup, server_pid):
+    async with httpx.AsyncClient(timeout=300) as http:
+        for i in range(warmup):
+            await _one_request(http, url, endpoint, clips[i % len(clips)])
+
+        rss_start = _rss_mb(server_pid) if server_pid else None
+        results = []
+
+        async def client(index):
+            for j in range(requests):
+                results.append(await _one_request(http, url, endpoint, clips[(index + j) % len(clips)]))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(clients)))
+        wall = time.perf_counter() - started
+        rss_end = _rss_mb(server_pid) if server_pid else None
+        server_stats = (await http.get(url + "/stats")).json()
+    return results, wall, rss_start, rss_end, server_stats
+
+
+def summarize(args, clips, results, wall, rss_start, rss_end, server_stats):
+    ok = [r for r in results if r["status"] == 200]
+    statuses = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    server_metrics = server_stats.get("metrics") or {}
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        "config": {
+            "endpoint": args.endpoint, "clients": args.clients, "requests_per_client": args.requests,
+            "clips": [name for name, _, _ in clips], "llm_latency_ms": args.llm_latency_ms,
+            "llm_token_ms": args.llm_token_ms, "tool_rate": args.tool_rate, "tts_latency_ms": args.tts_latency_ms,
+            "whisper_model": args.whisper_model, "mongo_uri": args.mongo_uri.split("@")[-1],
+        },
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": statuses,
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else 0.0,
+        "latency": percentiles([r["latency"] for r in ok]),
+        "first_audio": percentiles([r["first_audio"] for r in ok if r["first_audio"] is not None]),
+        # Server-side windows also contain the warmup requests
+        "stages": server_metrics.get("stage_seconds"),
+        "counters": server_metrics.get("counters"),
+        "rss_mb": {
+            "start": round(rss_start["rss"], 1) if rss_start else None,
+            "end": round(rss_end["rss"], 1) if rss_end else None,
+            "peak": round(rss_end["peak"], 1) if rss_end else None,
+        },
+    }
+
+
+def compare(result, baseline):
+    """
+    Lines of "metric: baseline -> now (+x%)" for the headline numbers.
+    """
+    def get(doc, path):
+        for part in path.split("."):
+            doc = doc.get(part) if isinstance(doc, dict) else None
+        return doc
+
+    paths = ["throughput_rps", "latency.p50_ms", "latency.p99_ms", "first_audio.p50_ms", "rss_mb.peak"]
+    stages = set((result.get("stages") or {})) | set((baseline.get("stages") or {}))
+    paths += [f"stages.{stage}.p50_ms" for stage in sorted(stages)] + [f"stages.{stage}.p99_ms" for stage in sorted(stages)]
+    lines = []
+    for path in paths:
+        before, now = get(baseline, path), get(result, path)
+        if before is None or now is None:
+            continue
+        change = f" ({100 * (now - before) / before:+.1f}%)" if before else ""
+        lines.append(f"  {path:32s} {before:>10} -> {now:<10}{change}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test of the assistant API.")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent simulated clients")
+    parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    parser.add_argument("--warmup", type=int, default=2, help="sequential requests before measuring")
+    parser.add_argument("--endpoint", default="/chat", choices=["/chat", "/chat/stream"])
+    parser.add_argument("--clips", default="mixed", choices=["mixed", "file", "synthetic"],
+                        help="test_audio.mp3 and/or generated speech-like WAVs")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--tool-rate", type=float, default=0.2)
+    parser.add_argument("--tts-latency-ms", type=float, default=150, help="stub TTS delay per sentence")
+    parser.add_argument("--whisper-model", default=os.getenv("BENCH_WHISPER_MODEL", "base"))
+    parser.add_argument("--mongo-uri", default="mongomock://", help="mongomock:// or a local mongod")
+    parser.add_argument("--url", default=None, help="benchmark a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="with --url: pid to sample RSS from")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--out", default=None, help="write the JSON result here")
+    parser.add_argument("--baseline", default=None, help="previous JSON result to compare against")
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips, args.audio)
+    procs, server_pid, url = [], args.server_pid, args.url
+    log_dir = os.path.join(BENCH_DIR, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+    try:
+        if url is None:
+            llm_port, api_port = _free_port(), _free_port()
+            llm = _start([sys.executable, os.path.join(BENCH_DIR, "fake_llm.py"), "--port", str(llm_port),
+                          "--latency-ms", str(args.llm_latency_ms), "--token-ms", str(args.llm_token_ms),
+                          "--tool-rate", str(args.tool_rate)], dict(os.environ), os.path.join(log_dir, "fake_llm.log"))
+            procs.append(llm)
+            env = dict(os.environ)
+            env.update({
+                "LLM_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+                "LLM_API_KEY": "bench",
+                "LLM_MODEL": "fake",
+                "MONGO_URI": args.mongo_uri,
+                "TTS_ENGINE": "stub",
+                "TTS_STUB_LATENCY_MS": str(args.tts_latency_ms),
+                "TTS_CACHE_ENABLED": "0",  # measure synthesis, not cache hits on repeated replies
+                "WHISPER_MODEL": args.whisper_model,
+                "METRICS_ENABLED": "1",
+            })
+            server = _start([sys.executable, os.path.join(BENCH_DIR, "server.py"), "--port", str(api_port)],
+                            env, os.path.join(log_dir, "server.log"))
+            procs.append(server)
+            server_pid, url = server.pid, f"http://127.0.0.1:{api_port}"
+            print(f"⏳ Starting fake LLM (:{llm_port}) and API server (:{api_port}, Whisper '{args.whisper_model}')...")
+            asyncio.run(_wait_ready(f"http://127.0.0.1:{llm_port}/stats", llm, 30))
+            asyncio.run(_wait_ready(f"{url}/stats", server, args.startup_timeout))
+
+        print(f"🏁 {args.clients} client(s) x {args.requests} request(s) on {args.endpoint}, {len(clips)} clip(s)")
+        results, wall, rss_start, rss_end, server_stats = asyncio.run(
+            run_load(url, args.endpoint, clips, args.clients, args.requests, args.warmup, server_pid)
+        )
+    except RuntimeError as e:
+        print(f"❌ {e} (logs in {log_dir})")
+        return 1
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    result = summarize(args, clips, results, wall, rss_start, rss_end, server_stats)
+    latency = result["latency"] or {}
+    print(f"✓ {result['ok']}/{result['requests']} ok in {result['wall_s']}s: {result['throughput_rps']} req/s, "
+          f"p50 {latency.get('p50_ms')}ms, p99 {latency.get('p99_ms')}ms, server peak RSS {result['rss_mb']['peak']}MB")
+    for stage, stats in (result["stages"] or {}).items():
+        print(f"  {stage:16s} p50 {stats['p50_ms']:>8}ms  p99 {stats['p99_ms']:>8}ms  (n={stats['count']})")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(f"Compared with {args.baseline}:")
+            print("\n".join(compare(result, json.load(f))))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"✓ Saved {args.out}")
+    else:
+        print(json.dumps(result, indent=2))
+    return 0 if result["ok"] == result["requests"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""The assistant API as the load test runs it: real app, in-memory Mongo seeded so tool calls return rows"""
+import os
+import sys
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.chdir(ROOT_DIR)  # the app serves assistant/static and recordings/ relative to the project root
+
+import uvicorn
+from assistant import database
+
+
+def seed(rows):
+    db = database.get_db_connection()
+    if db is None or db.clients.estimated_document_count():
+        return
+    db.clients.insert_many([
+        {"client_id": i, "name": f"Client {i}", "city": ("Paris", "Lagos", "Austin", "Pune")[i % 4],
+         "orders": i % 17, "active": i % 3 != 0}
+        for i in range(rows)
+    ])
+    db.orders.insert_many([{"order_id": i, "client_id": i % rows, "total": round(5 + i * 1.37 % 400, 2)} for i in range(rows * 3)])
+    print(f"🌱 Seeded mongomock: {rows} clients, {rows * 3} orders")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the assistant API for benchmarking.")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--seed-rows", type=int, default=500)
+    args = parser.parse_args()
+    if database.MONGO_URI.startswith("mongomock://"):
+        seed(args.seed_rows)
+
+    from assistant import api
+    uvicorn.run(api.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,10 @@ SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 # Navigate to the project root (where run.sh is)
 cd "$SCRIPT_DIR"
 
-# Start the server
+# Start the server: WORKERS=N forks N workers sharing one preloaded model (no --reload)
 echo "Running on http://127.0.0.1:8002"
-uvicorn assistant.api:app --reload --port 8002
+if [ -n "$WORKERS" ]; then
+    python -m assistant.serve --workers "$WORKERS" --port 8002
+else
+    uvicorn assistant.api:app --reload --port 8002
+fi
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Offline defaults, set before any assistant module reads its configuration (.env never overrides them)
+_scratch = tempfile.mkdtemp(prefix="assistant-tests-")
+os.environ.setdefault("MONGO_URI", "mongomock://")
+os.environ.setdefault("KNOWLEDGE_DIR", os.path.join(_scratch, "knowledge_store"))
+os.environ.setdefault("QUERY_CACHE_INVALIDATION_FILE", os.path.join(_scratch, "query_cache_invalidations.json"))
+os.environ.setdefault("DENSE_ENCODER", "stub")
+os.environ.setdefault("METRICS_ENABLED", "0")
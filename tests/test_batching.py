@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("whisper")
+
+from assistant import batching, inference
+
+
+class FakeModel(torch.nn.Module):
+    """
+    Decodes nothing, but fails if two threads ever use it at once.
+    """
+    def __init__(self):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(1))
+        self.busy = False
+        self.uses = 0
+
+    def use(self):
+        assert not self.busy, "model used by two threads at once"
+        self.busy = True
+        time.sleep(0.02)
+        self.uses += 1
+        self.busy = False
+
+    def transcribe(self, audio, **options):
+        self.use()
+        return {"text": "retried", "language": "en", "segments": []}
+
+
+def fake_decode_batch(model, audios):
+    model.use()
+    # Every other clip looks degenerate and goes through the transcribe() retry
+    outputs = [{"text": "greedy", "language": "en", "segments": []} for _ in audios]
+    return outputs, list(range(0, len(audios), 2))
+
+
+def test_batches_and_retries_never_share_a_model(monkeypatch):
+    monkeypatch.setattr(batching, "_decode_batch", fake_decode_batch)
+    executor = inference.InferenceExecutor(FakeModel(), max_workers=2, max_queue=64)
+
+    async def main():
+        scheduler = batching.BatchScheduler(executor, max_batch=4, max_wait_ms=5, max_queue=64)
+        scheduler.start()
+        try:
+            clip = np.zeros(16000, dtype=np.float32)
+            return await asyncio.gather(*(scheduler.transcribe(clip) for _ in range(16)))
+        finally:
+            await scheduler.stop()
+
+    results = asyncio.run(main())
+    assert {r["text"] for r in results} == {"greedy", "retried"}
+    assert all(m.uses for m in executor.models)  # both copies took work
+    executor.shutdown()
+
+
+def test_full_batch_queue_counts_as_rejected():
+    executor = inference.InferenceExecutor(FakeModel(), max_workers=1, max_queue=1)
+
+    async def main():
+        # Not started: nothing drains the queue, so the second clip is shed
+        scheduler = batching.BatchScheduler(executor, max_queue=1)
+        clip = np.zeros(16000, dtype=np.float32)
+        first = asyncio.ensure_future(scheduler.transcribe(clip))
+        await asyncio.sleep(0)
+        with pytest.raises(inference.InferenceQueueFull):
+            await scheduler.transcribe(clip)
+        first.cancel()
+
+    asyncio.run(main())
+    assert executor.stats()["rejected"] == 1
+    executor.shutdown()
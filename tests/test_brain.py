@@ -0,0 +1,69 @@
+import pytest
+
+from assistant import brain
+
+
+def chunks(text, size=3):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """First-pass reply (streamed in small deltas) and a second pass for after a tool ran."""
+    passes = {"first": "", "second": "Here are your clients."}
+    seen = []
+
+    def fake_stream(client, messages):
+        reply = passes["second"] if any(m["content"].startswith("TOOL RESULTS") for m in messages) else passes["first"]
+        for delta in chunks(reply):
+            seen.append(delta)
+            yield delta
+
+    monkeypatch.setattr(brain, "_get_client", lambda: object())
+    monkeypatch.setattr(brain, "build_messages", lambda text: [{"role": "user", "content": text}])
+    monkeypatch.setattr(brain, "_stream_deltas", fake_stream)
+    monkeypatch.setattr(brain, "_execute_tool", lambda data: [{"name": "Ada"}])
+    passes["seen"] = seen
+    return passes
+
+
+def test_prose_with_braces_is_not_held(llm):
+    llm["first"] = "In Python, {} is an empty dict. Use `len(d)` to count keys."
+    out = []
+    for delta in brain.stream_response("hi"):
+        out.append(delta)
+        # Nothing waits for the end of the reply: each delta comes out as soon as it arrives
+        assert "".join(out) == "".join(llm["seen"])
+    assert "".join(out) == llm["first"]
+
+
+def test_held_text_is_released_once_it_cannot_be_a_tool_call(llm):
+    llm["first"] = "Sure.\n{ note: braces } keep going.\n```python\nprint(1)\n```\nDone."
+    out, released = [], None
+    for delta in brain.stream_response("hi"):
+        out.append(delta)
+        if released is None and "keep" in "".join(out):
+            released = len("".join(llm["seen"]))
+    assert "".join(out) == llm["first"]
+    assert released < len(llm["first"])  # streaming resumed before the reply ended
+
+
+@pytest.mark.parametrize("tool_call", [
+    '{"tool": "search", "collection": "clients", "query": {}}',
+    '```json\n{"tool": "search", "collection": "clients", "query": {}}\n```',
+])
+def test_tool_call_at_line_start_is_never_spoken(llm, tool_call):
+    llm["first"] = "Let me check.\n" + tool_call
+    out = "".join(brain.stream_response("list clients"))
+    assert out == "Let me check.\nHere are your clients."
+
+
+def test_could_be_tool_call():
+    assert brain._could_be_tool_call("``")
+    assert brain._could_be_tool_call("```js")
+    assert brain._could_be_tool_call('```json\n{"to')
+    assert brain._could_be_tool_call('{"query": {"a": "}"}, "tool": "search"}')
+    assert not brain._could_be_tool_call("`x")
+    assert not brain._could_be_tool_call("```python")
+    assert not brain._could_be_tool_call("{ note")
+    assert not brain._could_be_tool_call('{"limit": 3} and')
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import mongomock
+import pytest
+
+from assistant import database
+
+
+class FlakyClient:
+    """
+    MongoClient stand-in whose ping fails while `down` is set; counts pings and closes.
+    """
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        self.kwargs = kwargs
+        self.down = False
+        self.pings = 0
+        self.closed = False
+        self._db = mongomock.MongoClient()
+        self.admin = self
+        FlakyClient.instances.append(self)
+
+    def command(self, name):
+        self.pings += 1
+        if self.down:
+            raise ConnectionError("server down")
+        return {"ok": 1}
+
+    def __getitem__(self, name):
+        return self._db[name]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    database.close_connections()
+    database.schema_catalog.invalidate()
+    if database.result_cache is not None:
+        database.result_cache.invalidate()
+    FlakyClient.instances.clear()
+    yield
+    database.close_connections()
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    monkeypatch.setattr(database, "MONGO_URI", "mongodb://db.example:27017")
+    monkeypatch.setattr(database, "MongoClient", FlakyClient)
+    monkeypatch.setattr(database, "MONGO_HEALTH_INTERVAL", 0)
+
+
+@pytest.fixture
+def seeded(monkeypatch):
+    monkeypatch.setattr(database, "MONGO_URI", "mongomock://")
+    db = database.get_db_connection()
+    db.clients.insert_many([{"client_id": i, "name": f"Client {i}", "orders": i % 7} for i in range(80)])
+    return db
+
+
+def test_get_client_is_created_once_and_shared_across_threads(flaky):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(database.get_client())) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(FlakyClient.instances) == 1
+    assert all(c is FlakyClient.instances[0] for c in clients)
+    assert database.get_client() is clients[0]
+
+
+def test_get_client_passes_pool_and_timeout_options(flaky):
+    client = database.get_client()
+    assert client.kwargs["maxPoolSize"] == database.MONGO_MAX_POOL_SIZE
+    assert client.kwargs["serverSelectionTimeoutMS"] == database.MONGO_TIMEOUT_MS
+
+
+def test_get_db_connection_does_not_ping_per_call_when_healthy(monkeypatch, flaky):
+    monkeypatch.setattr(database, "MONGO_HEALTH_INTERVAL", 60)
+    database.get_db_connection()
+    pings = FlakyClient.instances[0].pings
+    for _ in range(5):
+        assert database.get_db_connection() is not None
+    assert FlakyClient.instances[0].pings == pings
+
+
+def test_get_db_connection_returns_none_while_down_and_recovers(flaky):
+    assert database.get_db_connection() is not None
+    client = FlakyClient.instances[0]
+
+    client.down = True
+    database._ping()
+    assert database.is_healthy() is False
+    assert database.get_db_connection() is None
+
+    # No background checker (interval 0): the next call re-probes inline
+    client.down = False
+    assert database.get_db_connection() is not None
+    assert database.is_healthy() is True
+
+
+def test_health_checker_runs_again_after_close_connections(monkeypatch, flaky):
+    monkeypatch.setattr(database, "MONGO_HEALTH_INTERVAL", 0.02)
+    database.get_client()
+    database.close_connections()
+    assert FlakyClient.instances[0].closed
+
+    client = database.get_client()
+    pings = client.pings
+    time.sleep(0.2)
+    assert database._health_thread.is_alive()
+    assert client.pings > pings
+
+
+def test_find_documents_applies_options_from_the_query(seeded):
+    rows = database.find_documents("clients", {"orders": 3, "sort": {"client_id": -1}, "limit": 2})
+    assert [r["client_id"] for r in rows] == [73, 66]
+    assert all("_id" not in r for r in rows)
+
+
+def test_find_documents_caps_the_limit(seeded):
+    assert len(database.find_documents("clients", {}, limit=500)) == 50
+
+
+def test_find_documents_rejects_unknown_collections(seeded):
+    assert database.find_documents("nope", {}) == ["Error: Collection 'nope' does not exist."]
+
+
+def test_find_documents_serves_repeats_from_the_cache(seeded):
+    if database.result_cache is None:
+        pytest.skip("QUERY_CACHE_ENABLED=0")
+    first = database.find_documents("clients", {"orders": 1}, limit=50)
+    seeded.clients.insert_one({"client_id": 999, "name": "Late", "orders": 1})
+    assert database.find_documents("clients", {"orders": 1}, limit=50) == first
+    database.invalidate_query_cache("clients")
+    assert len(database.find_documents("clients", {"orders": 1}, limit=50)) == len(first) + 1
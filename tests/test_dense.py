@@ -0,0 +1,115 @@
+import os
+import types
+
+import numpy as np
+import pytest
+
+from assistant import dense, rag_index, retrieval
+
+WORDS = ["invoice", "client", "order", "refund", "shipping", "payment", "warehouse", "discount",
+         "contract", "renewal", "delivery", "account", "balance", "report", "meeting", "support"]
+
+
+def corpus(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, 6)) + f" doc{i}" for i in range(n)]
+
+
+@pytest.fixture
+def encoder():
+    return dense.StubEncoder(dim=128)
+
+
+def test_stub_encoder_is_deterministic_and_normalized(encoder):
+    texts = corpus(5)
+    a = encoder.encode(texts)
+    b = dense.StubEncoder(dim=128).encode(texts)
+    assert a.dtype == np.float32 and a.shape == (5, 128)
+    assert np.array_equal(a, b)
+    assert np.allclose(np.linalg.norm(a, axis=1), 1.0, atol=1e-5)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_search_finds_the_exact_document_across_segments(encoder, dtype):
+    texts = corpus(300)
+    emb = encoder.encode(texts)
+    segments = [dense.DenseSegment.build(emb[:120], dtype), dense.DenseSegment.build(emb[120:], dtype)]
+    starts = np.array([0, 120])
+    for target in (7, 119, 120, 250):
+        rows, scores = dense.search(segments, starts, emb[target], k=5)
+        assert rows[0] == target
+        assert len(rows) == 5 and np.all(np.diff(scores) <= 0)
+
+
+def test_ivf_with_every_list_probed_matches_brute_force(encoder, monkeypatch):
+    monkeypatch.setattr(dense, "DENSE_MIN_IVF_ROWS", 16)
+    emb = encoder.encode(corpus(400, seed=1))
+    seg = dense.DenseSegment.build(emb)
+    nlist = len(seg.centroids)
+    assert nlist > 1
+    query = emb[42]
+    rows, _ = dense.search([seg], np.array([0]), query, k=10, nprobe=nlist)
+    exact = dense.score_rows([seg], np.array([0, len(emb)]), query, np.arange(len(emb)))
+    assert set(rows.tolist()) == set(np.argsort(-exact, kind="stable")[:10].tolist())
+
+
+def test_search_skips_tombstoned_rows(encoder):
+    emb = encoder.encode(corpus(50))
+    seg = dense.DenseSegment.build(emb)
+    tombstones = np.zeros(50, dtype=bool)
+    tombstones[[3, 4]] = True
+    rows, _ = dense.search([seg], np.array([0]), emb[3], k=50, tombstones=tombstones)
+    assert 3 not in rows and 4 not in rows
+    assert len(rows) == 48
+
+
+def test_score_rows_is_close_to_the_float_dot_product(encoder):
+    emb = encoder.encode(corpus(200))
+    segments = [dense.DenseSegment.build(emb[:80]), dense.DenseSegment.build(emb[80:])]
+    starts = np.array([0, 80, 200])
+    rows = np.array([0, 79, 80, 150, 199])
+    scores = dense.score_rows(segments, starts, emb[150], rows)
+    assert np.allclose(scores, emb[rows] @ emb[150], atol=0.02)
+
+
+def test_fuse_blends_sparse_and_dense_and_drops_tombstones(encoder, monkeypatch):
+    monkeypatch.setattr(retrieval, "RAG_HYBRID_CANDIDATES", 2)
+    emb = encoder.encode(corpus(60))
+    tombstones = np.zeros(60, dtype=bool)
+    tombstones[10] = True
+    index = types.SimpleNamespace(row_starts=np.array([0, 60]), tombstones=tombstones,
+                                  dense_segments=[dense.DenseSegment.build(emb)])
+    sparse_rows = np.array([5, 10, 20, 30])
+    sparse_scores = np.array([0.9, 0.8, 0.1, 0.05], dtype=np.float32)
+
+    rows, scores = retrieval.fuse(index, sparse_rows, sparse_scores, emb[40], k=2, alpha=0.5)
+    assert 10 not in rows
+    assert {5, 20, 40} <= set(rows.tolist())
+    exact = dense.score_rows(index.dense_segments, index.row_starts, emb[40], rows)
+    sparse_part = np.array([dict(zip(sparse_rows, sparse_scores)).get(r, 0.0) for r in rows])
+    assert np.allclose(scores, 0.5 * exact + 0.5 * sparse_part, atol=1e-5)
+
+
+def test_hybrid_search_over_a_published_index(encoder, tmp_path):
+    texts = corpus(80)
+    documents = [{"id": f"notes:{i}", "text": t, "source": "notes"} for i, t in enumerate(texts)]
+    featurizer = rag_index.HashingFeaturizer(None, n_features=2 ** 12)
+    counts = featurizer.counts(texts)
+    df = np.asarray((counts > 0).sum(axis=0)).ravel()
+    idf = rag_index.smooth_idf(df, len(texts))
+    segment = rag_index.write_segment(featurizer.weight(counts, idf), documents, str(tmp_path), encoder.encode(texts))
+    tombstones = np.zeros(len(texts), dtype=bool)
+    tombstones[17] = True
+    meta = {"featurizer": "hashing", "n_features": featurizer.n_features, "stop_words": "english",
+            "n_docs": len(texts), "n_live": len(texts) - 1, "dense": dense.describe(encoder)}
+    generation = rag_index.write_generation(meta, [segment], {"idf": idf, "df": df.astype(np.int32),
+                                                              "tombstones": tombstones}, knowledge_dir=str(tmp_path))
+    index = rag_index.RagIndex(os.path.join(str(tmp_path), generation))
+
+    for target in (3, 17):
+        query = featurizer.transform([texts[target]], idf)
+        hits = retrieval.search(index, query, k=3, threshold=0.0, query_embedding=encoder.encode([texts[target]])[0],
+                                alpha=0.5)
+        rows = [row for row, _ in hits]
+        assert (rows[0] == target) == (target != 17)
+        assert 17 not in rows
@@ -0,0 +1,102 @@
+import os
+import asyncio
+import threading
+import time
+
+import pytest
+
+from assistant import inference
+
+
+class FakeModel:
+    """
+    Stand-in model that fails if two threads ever run it at once.
+    """
+    def __init__(self):
+        self.busy = False
+        self.calls = 0
+
+    def run(self, seconds=0.0, gate=None):
+        assert not self.busy, "model used by two threads at once"
+        self.busy = True
+        try:
+            if gate is not None:
+                gate.wait(5)
+            time.sleep(seconds)
+            self.calls += 1
+            return id(self)
+        finally:
+            self.busy = False
+
+
+def job(model, seconds=0.0, gate=None):
+    return model.run(seconds, gate)
+
+
+def test_admission_sheds_past_workers_plus_queue():
+    executor = inference.InferenceExecutor(FakeModel(), max_workers=1, max_queue=1)
+    gate = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(job, 0.0, gate))
+        queued = asyncio.ensure_future(executor.run(job))
+        await asyncio.sleep(0)
+        with pytest.raises(inference.InferenceQueueFull) as shed:
+            await executor.run(job)
+        assert shed.value.retry_after == inference.INFERENCE_RETRY_AFTER
+        gate.set()
+        await asyncio.gather(running, queued)
+        # Slots come back once jobs finish
+        await executor.run(job)
+
+    asyncio.run(main())
+    stats = executor.stats()
+    assert (stats["rejected"], stats["completed"], stats["pending"]) == (1, 3, 0)
+    executor.shutdown()
+
+
+def test_slot_released_when_job_fails():
+    executor = inference.InferenceExecutor(FakeModel(), max_workers=1, max_queue=0)
+
+    def boom(model):
+        raise RuntimeError("decode failed")
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await executor.run(boom)
+        return await executor.run(job)
+
+    assert asyncio.run(main()) == id(executor.model)
+    executor.shutdown()
+
+
+def test_each_worker_runs_its_own_model_copy():
+    executor = inference.InferenceExecutor(FakeModel(), max_workers=3, max_queue=8)
+    assert len({id(m) for m in executor.models}) == 3
+    assert executor.models[0] is executor.model
+
+    async def main():
+        return await asyncio.gather(*(executor.run(job, 0.02) for _ in range(9)))
+
+    used = asyncio.run(main())
+    assert len(set(used)) == 3
+    assert sum(m.calls for m in executor.models) == 9
+    executor.shutdown()
+
+
+def test_chat_returns_503_with_retry_after_when_shedding(monkeypatch):
+    pytest.importorskip("torch")
+    pytest.importorskip("whisper")
+    from fastapi.testclient import TestClient
+    os.makedirs("recordings", exist_ok=True)  # mounted at import, relative to the project root
+    from assistant import api
+
+    async def full(audio):
+        raise inference.InferenceQueueFull(retry_after=7)
+
+    monkeypatch.setattr(api, "transcribe_upload", full)
+    client = TestClient(api.app)  # no lifespan: the model is never loaded
+    for path in ("/chat", "/chat/stream"):
+        res = client.post(path, files={"audio": ("a.wav", b"RIFF", "audio/wav")})
+        assert res.status_code == 503
+        assert res.headers["Retry-After"] == "7"
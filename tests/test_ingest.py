@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from assistant import database, ingest, rag_index
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "MONGO_URI", "mongomock://")
+    monkeypatch.setattr(ingest, "KNOWLEDGE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "INGEST_WATERMARK_FIELDS", "")
+    database.close_connections()
+    database.schema_catalog.invalidate()
+    db = database.get_db_connection()
+    db.notes.insert_many([{"_id": i, "title": f"note {i}", "body": f"alpha topic{i}", "updated_at": i}
+                          for i in range(1, 21)])
+    yield db
+    database.close_connections()
+
+
+def load(path):
+    return rag_index.RagIndex(os.path.join(path, rag_index.read_current(path)))
+
+
+def live_texts(index):
+    return {index.ids[int(r)]: index.texts[int(r)] for r in index.live_rows()}
+
+
+def test_full_rebuild_defaults_to_fitted_tfidf(store, tmp_path):
+    ingest.ingest_data()
+    index = load(tmp_path)
+    assert index.featurizer == "tfidf"
+    assert len(index) == 20
+
+
+def test_incremental_appends_inserts_and_reconciles_deletes(store, tmp_path):
+    ingest.ingest_data(featurizer="hashing")
+    store.notes.insert_one({"_id": 21, "title": "note 21", "body": "beta", "updated_at": 21})
+    store.notes.delete_one({"_id": 3})
+    ingest.ingest_incremental(reconcile=True)
+
+    texts = live_texts(load(tmp_path))
+    assert "notes:21" in texts
+    assert "notes:3" not in texts
+    assert len(texts) == 20
+
+
+def test_updated_at_watermark_picks_up_edits(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_WATERMARK_FIELDS", "notes=updated_at")
+    ingest.ingest_incremental()
+    store.notes.update_one({"_id": 5}, {"$set": {"body": "edited gamma", "updated_at": 100}})
+    ingest.ingest_incremental()
+
+    index = load(tmp_path)
+    texts = live_texts(index)
+    assert len(texts) == 20
+    assert "edited gamma" in texts["notes:5"]
+    assert index.find_live_rows(["notes:5", "notes:404"]).keys() == {"notes:5"}
+
+
+def test_missing_watermark_field_fails_loudly(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_WATERMARK_FIELDS", "notes=updated_at")
+    store.notes.insert_one({"_id": 99, "title": "no timestamp"})
+    with pytest.raises(RuntimeError, match="no 'updated_at' field"):
+        ingest.ingest_incremental()
+    assert rag_index.read_current(str(tmp_path)) is None
+
+
+def test_failed_export_aborts_without_publishing(store, tmp_path, monkeypatch):
+    ingest.ingest_data()
+    before = rag_index.read_current(str(tmp_path))
+    store.other.insert_many([{"_id": i, "x": i} for i in range(5)])
+    real = database.iter_collection
+
+    def flaky(name, *args):
+        if name == "other":
+            raise OSError("cursor died")
+        return real(name, *args)
+
+    monkeypatch.setattr(database, "iter_collection", flaky)
+    for featurizer in ("tfidf", "hashing"):
+        with pytest.raises(RuntimeError, match="Export of other failed"):
+            ingest.ingest_data(featurizer=featurizer)
+    assert rag_index.read_current(str(tmp_path)) == before
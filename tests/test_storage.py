@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from assistant import storage, tts_cache
+
+
+def write(path, size=100, age=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    if age:
+        then = time.time() - age
+        os.utime(path, (then, then))
+    return path
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # Two pre-fork workers over one recordings/ directory
+    return [storage.RecordingStore(str(tmp_path), max_files=3, max_age=0, shared=True) for _ in range(2)]
+
+
+def test_shared_sweep_enforces_one_budget_across_processes(tmp_path, workers):
+    sweeper, other = workers
+    for i in range(3):
+        other.register(write(str(tmp_path / "outputs" / f"other_{i}.mp3"), age=100 - i))
+    sweeper.register(write(str(tmp_path / "outputs" / "mine.mp3")))
+
+    assert sweeper.sweep() == 1
+    assert sorted(os.listdir(tmp_path / "outputs")) == ["mine.mp3", "other_1.mp3", "other_2.mp3"]
+    assert other.stats()["files"] == 3
+
+
+def test_shared_touch_is_visible_to_the_sweeper(tmp_path, workers):
+    sweeper, other = workers
+    paths = [write(str(tmp_path / "outputs" / f"reply_{i}.mp3"), age=100 - i) for i in range(4)]
+    other.touch(paths[0])  # played again in the other worker
+
+    sweeper.sweep()
+    assert not os.path.exists(paths[1])
+    assert os.path.exists(paths[0])
+
+
+def test_shared_register_keeps_no_private_index(tmp_path, workers):
+    _, other = workers
+    for i in range(10):
+        other.register(write(str(tmp_path / f"input_{i}.webm")))
+    assert len(other._entries) == 0
+    assert len(os.listdir(tmp_path)) == 10  # only the sweeping worker deletes
+
+
+def test_shared_tts_cache_hits_and_budget_across_processes(tmp_path):
+    a, b = (tts_cache.TTSCache(directory=str(tmp_path), max_bytes=250, shared=True) for _ in range(2))
+    for i, cache in enumerate((a, b, a)):
+        tmp = write(str(tmp_path / f"k{i}.tmp"))
+        cache.put(f"k{i}", tmp)
+        time.sleep(0.01)
+
+    # b sees a's phrase without having written it, and the budget counted both workers' files
+    assert b.get("k2") == b.url("k2")
+    assert sorted(os.listdir(tmp_path)) == ["k1.mp3", "k2.mp3"]
+    assert a.get("k0") is None
+
+
+def test_shared_tts_cache_spares_fresh_tmp_files(tmp_path):
+    fresh = write(str(tmp_path / "k.abc.tmp"))
+    stale = write(str(tmp_path / "k.def.tmp"), age=tts_cache.STALE_TMP_SECONDS + 60)
+    tts_cache.TTSCache(directory=str(tmp_path), shared=True)
+    assert os.path.exists(fresh) and not os.path.exists(stale)
+
+
+def test_reply_audio_stays_on_disk_under_pre_fork(monkeypatch):
+    monkeypatch.setattr(storage, "REPLY_AUDIO_IN_MEMORY", True)
+    assert storage.reply_audio_in_memory(None)
+    assert not storage.reply_audio_in_memory("1")  # another worker could not serve /audio/<name>
+    monkeypatch.setattr(storage, "REPLY_AUDIO_IN_MEMORY", False)
+    assert not storage.reply_audio_in_memory(None)
@@ -0,0 +1,163 @@
+"""Microphone capture into a preallocated ring buffer; level and auto-stop are computed in the audio callback"""
+import os, threading
+import numpy as np
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configuration
+CAPTURE_BLOCK_MS = int(os.getenv("CAPTURE_BLOCK_MS", 50))                # callback granularity = stop reaction time
+CAPTURE_MAX_SECONDS = float(os.getenv("CAPTURE_MAX_SECONDS", 600))      # manual mode ceiling (pages are only touched as filled)
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):  # no PortAudio: RingBuffer still works, Capture.start() won't
+    sd = None
+
+
+class RingBuffer:
+    """
+    Preallocated float32 ring with one producer (the audio callback) and one consumer.
+    The producer copies a block in, then publishes it by advancing `written` (total samples
+    ever written); the consumer only reads below the `written` it observed, so no lock is needed.
+    """
+    def __init__(self, capacity, channels=1):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self._buf = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.written = 0
+        self.overruns = 0  # blocks dropped because the ring was full (wrap=False)
+
+    def write(self, block, wrap=True):
+        """
+        Producer side. With wrap=False the ring acts as a fixed recording buffer and
+        returns False (dropping the block) once it is full.
+        """
+        n = len(block)
+        if not wrap and self.written + n > self.capacity:
+            n = self.capacity - self.written
+            if n <= 0:
+                self.overruns += 1
+                return False
+            block = block[:n]
+        if n > self.capacity:
+            block, n = block[-self.capacity:], self.capacity
+        pos = self.written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._buf[pos:pos + first] = block[:first]
+        if first < n:
+            self._buf[:n - first] = block[first:]
+        self.written += n  # publish after the copy
+        return True
+
+    def view(self, start, end=None):
+        """
+        Consumer side: samples [start, end) by absolute index. A zero-copy view unless the span
+        crosses the end of the ring (only possible with wrap=True), then a single copy.
+        """
+        end = self.written if end is None else end
+        start = max(start, end - self.capacity, 0)  # older samples were overwritten
+        s = start % self.capacity
+        e = s + (end - start)
+        if e <= self.capacity:
+            return self._buf[s:e]
+        return np.concatenate((self._buf[s:], self._buf[:e - self.capacity]))
+
+
+class Capture:
+    """
+    One InputStream feeding a RingBuffer. The callback stores each block, measures its mean
+    absolute level into preallocated scratch, tracks the silence run and sets `done` when
+    the stop condition hits, so waiting is event-driven instead of polled.
+    """
+    def __init__(self, sample_rate=16000, channels=1, max_seconds=CAPTURE_MAX_SECONDS, block_ms=CAPTURE_BLOCK_MS,
+                 silence_threshold=None, silence_seconds=None, wrap=False):
+        self.sample_rate = sample_rate
+        self.block = int(sample_rate * block_ms / 1000)
+        self.ring = RingBuffer(int(max_seconds * sample_rate), channels)
+        self.wrap = wrap  # True = keep listening and overwrite the oldest audio (continuous mode)
+        self.silence_threshold = silence_threshold
+        self.silence_samples = int((silence_seconds or 0) * sample_rate)
+        self._scratch = np.empty((self.block, channels), dtype=np.float32)
+        self.level = 0.0
+        self.silent_samples = 0
+        self.speech_seen = False
+        self.status_errors = 0  # input overflows reported by PortAudio
+        self.reason = None
+        self.done = threading.Event()
+        self.new_audio = threading.Event()  # set after every block, for consumers that stream
+        self._read_pos = 0
+        self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if self.done.is_set() and not self.wrap:
+            return  # stopped, the stream is about to be closed
+        if status:
+            self.status_errors += 1
+        if not self.ring.write(indata, wrap=self.wrap):
+            self.stop("max_duration")
+            return
+        scratch = self._scratch[:frames] if frames <= self.block else None
+        level = float(np.abs(indata, out=scratch).mean())
+        self.level = level
+        if self.silence_threshold is not None:
+            if level >= self.silence_threshold:
+                self.silent_samples = 0
+                self.speech_seen = True
+            else:
+                self.silent_samples += frames
+                if self.silence_samples and self.silent_samples >= self.silence_samples:
+                    self.stop("silence")
+        if not self.wrap and self.ring.written >= self.ring.capacity:
+            self.stop("max_duration")
+        self.new_audio.set()
+
+    def start(self):
+        if sd is None:
+            raise RuntimeError("sounddevice (PortAudio) is not available")
+        self._stream = sd.InputStream(samplerate=self.sample_rate, channels=self.ring.channels, dtype="float32",
+                                      blocksize=self.block, callback=self._callback)
+        self._stream.start()
+        return self
+
+    def stop(self, reason="manual"):
+        # Safe from the callback or any thread; the stream itself is closed by close()
+        if self.reason is None:
+            self.reason = reason
+        self.done.set()
+        self.new_audio.set()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def seconds(self):
+        return self.ring.written / self.sample_rate
+
+    def audio(self):
+        """
+        Everything captured so far (the last max_seconds when wrapping) as (samples, channels);
+        a view into the ring, no copy, unless a wrapped ring has to be unrolled.
+        """
+        return self.ring.view(0)
+
+    def read_new(self):
+        """
+        Samples captured since the previous call (single consumer), and their absolute start index.
+        """
+        end = self.ring.written
+        start, self._read_pos = max(self._read_pos, end - self.ring.capacity), end
+        return self.ring.view(start, end), start
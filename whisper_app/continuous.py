@@ -0,0 +1,234 @@
+"""Hands-free listening: VAD-segmented utterances, rolling-window decoding, LocalAgreement-2 commits"""
+import os, re, time, inspect
+import numpy as np
+
+try:
+    from whisper_app import model_registry, vad, capture
+except ImportError:
+    import model_registry, vad, capture
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configuration
+SAMPLE_RATE = 16000
+CONTINUOUS_CHUNK_SECONDS = float(os.getenv("CONTINUOUS_CHUNK_SECONDS", 1.0))     # new audio per decoding pass
+CONTINUOUS_TRIM_SECONDS = float(os.getenv("CONTINUOUS_TRIM_SECONDS", 15.0))      # window kept before trimming to the last commit
+CONTINUOUS_END_SILENCE = float(os.getenv("CONTINUOUS_END_SILENCE", 0.8))         # pause that ends an utterance
+CONTINUOUS_PREROLL_SECONDS = float(os.getenv("CONTINUOUS_PREROLL_SECONDS", 0.3))  # audio kept before speech onset
+CONTINUOUS_RING_SECONDS = float(os.getenv("CONTINUOUS_RING_SECONDS", 120.0))
+CONTINUOUS_LANGUAGE = os.getenv("CONTINUOUS_LANGUAGE") or None                   # skip detection altogether
+SILENCE_THRESHOLD = float(os.getenv("SILENCE_THRESHOLD", 0.01))
+PROMPT_CHARS = 200
+
+
+def _norm(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _supports_word_timestamps(model):
+    # Whisper builds before word-level timestamps pass unknown options on to DecodingOptions, which rejects them
+    try:
+        return "word_timestamps" in inspect.signature(model.transcribe).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _words(result, offset):
+    """
+    (start, end, word) in absolute seconds. Uses Whisper's word timestamps, or spreads a
+    segment's words evenly over it when they are missing.
+    """
+    out = []
+    for seg in result.get("segments", []):
+        if seg.get("words"):
+            out.extend((offset + w["start"], offset + w["end"], w["word"].strip()) for w in seg["words"])
+            continue
+        words = seg["text"].split()
+        step = (seg["end"] - seg["start"]) / max(len(words), 1)
+        out.extend((offset + seg["start"] + i * step, offset + seg["start"] + (i + 1) * step, w)
+                   for i, w in enumerate(words))
+    return [w for w in out if _norm(w[2])]
+
+
+class LocalAgreement:
+    """
+    LocalAgreement-2: a word is committed once two consecutive hypotheses agree on it,
+    i.e. it is in the common prefix of both after the text already committed.
+    """
+    def __init__(self):
+        self.committed = []   # (start, end, word)
+        self.pending = []     # uncommitted tail of the previous hypothesis
+        self.committed_end = 0.0
+
+    def insert(self, words):
+        new = [w for w in words if w[0] > self.committed_end - 0.1]
+        # The window still holds audio around the last commit: drop a re-transcribed n-gram
+        if new and self.committed and abs(new[0][0] - self.committed_end) < 1.0:
+            for n in range(min(len(self.committed), len(new), 5), 0, -1):
+                if [_norm(w[2]) for w in self.committed[-n:]] == [_norm(w[2]) for w in new[:n]]:
+                    new = new[n:]
+                    break
+        agreed = 0
+        while agreed < min(len(new), len(self.pending)) and _norm(new[agreed][2]) == _norm(self.pending[agreed][2]):
+            agreed += 1
+        commit, self.pending = new[:agreed], new[agreed:]
+        self.commit(commit)
+        return commit
+
+    def commit(self, words):
+        if words:
+            self.committed.extend(words)
+            self.committed_end = words[-1][1]
+
+    def flush(self):
+        # End of utterance: whatever the last hypothesis says is final
+        words, self.pending = self.pending, []
+        self.commit(words)
+        return words
+
+    def text(self):
+        return " ".join(w[2] for w in self.committed)
+
+
+class ContinuousTranscriber:
+    """
+    Keeps the microphone open and transcribes speech as it arrives. Silence costs no decoding;
+    during an utterance the window since the last trim point is re-decoded every
+    CONTINUOUS_CHUNK_SECONDS and agreed words are emitted. The detected language and the
+    committed text (as prompt) carry over so later utterances don't re-detect.
+    """
+    def __init__(self, model=None, language=CONTINUOUS_LANGUAGE, on_words=None, on_utterance=None):
+        self.model = model or model_registry.get_ready_model()
+        self.language = language
+        self.agreement = LocalAgreement()
+        self.on_words = on_words or (lambda words: None)
+        self.on_utterance = on_utterance or (lambda text, lag: None)
+        self.lags = []          # seconds from speaking a word to committing it
+        self.decodes = 0
+        self.decode_seconds = 0.0
+        self._started = None
+        self._utterance_words = []
+        self._word_timestamps = _supports_word_timestamps(self.model)  # else _words spreads segments evenly
+
+    def _decode(self, audio, offset):
+        options = {"fp16": model_registry.is_fp16(self.model), "condition_on_previous_text": False}
+        if self._word_timestamps:
+            options["word_timestamps"] = True
+        if self.language:
+            options["language"] = self.language
+        prompt = self.agreement.text()[-PROMPT_CHARS:]
+        if prompt:
+            options["initial_prompt"] = prompt
+        started = time.perf_counter()
+        res = self.model.transcribe(audio, **options)
+        self.decodes += 1
+        self.decode_seconds += time.perf_counter() - started
+        if not self.language and res.get("language"):
+            self.language = res["language"]
+            print(f"🌐 Language: {self.language} (reused from now on)")
+        return _words(res, offset)
+
+    def _emit(self, words):
+        if not words:
+            return
+        now = time.monotonic() - self._started
+        self.lags.extend(now - w[1] for w in words)
+        self._utterance_words.extend(words)
+        self.on_words(words)
+
+    def process_window(self, ring, start, final=False):
+        """
+        Decodes samples [start, now) of the ring; returns the new trim point.
+        """
+        end = ring.written
+        audio = ring.view(start, end).reshape(-1)
+        if final and not vad.has_speech(audio, SAMPLE_RATE):
+            words = []
+        else:
+            words = self._decode(audio, start / SAMPLE_RATE)
+        if final:
+            self._emit(self.agreement.insert(words) + self.agreement.flush())
+            return end
+        self._emit(self.agreement.insert(words))
+        # Long window: drop audio up to the last committed word, its text lives on in the prompt
+        if (end - start) / SAMPLE_RATE > CONTINUOUS_TRIM_SECONDS and self.agreement.committed_end * SAMPLE_RATE > start:
+            return int(self.agreement.committed_end * SAMPLE_RATE)
+        return start
+
+    def _end_utterance(self):
+        text = " ".join(w[2] for w in self._utterance_words)
+        lag = self.lags[-1] if self._utterance_words else None
+        self._utterance_words = []
+        if text:
+            self.on_utterance(text, lag)
+
+    def run(self, stop_event=None, max_seconds=None):
+        """
+        Listens until Ctrl+C, `stop_event` is set or `max_seconds` have been captured.
+        """
+        chunk = int(CONTINUOUS_CHUNK_SECONDS * SAMPLE_RATE)
+        end_silence = int(CONTINUOUS_END_SILENCE * SAMPLE_RATE)
+        preroll = int(CONTINUOUS_PREROLL_SECONDS * SAMPLE_RATE)
+        cap = capture.Capture(sample_rate=SAMPLE_RATE, channels=1, max_seconds=CONTINUOUS_RING_SECONDS,
+                              silence_threshold=SILENCE_THRESHOLD, wrap=True)
+        speaking, start, decoded_at = False, 0, 0
+        with cap:
+            self._started = time.monotonic()
+            try:
+                while not (stop_event is not None and stop_event.is_set()):
+                    cap.new_audio.wait(0.5)
+                    cap.new_audio.clear()
+                    written = cap.ring.written
+                    if max_seconds is not None and written >= max_seconds * SAMPLE_RATE:
+                        break
+                    if not speaking:
+                        # Idle: no decoding, just keep the window start a pre-roll behind the onset
+                        if cap.speech_seen and cap.silent_samples < end_silence:
+                            speaking, decoded_at = True, written
+                        else:
+                            start = max(start, written - preroll)
+                        continue
+                    if cap.silent_samples >= end_silence:
+                        self.process_window(cap.ring, start, final=True)
+                        self._end_utterance()
+                        speaking, start = False, written
+                        cap.speech_seen = False
+                    elif written - decoded_at >= chunk:
+                        start = self.process_window(cap.ring, start)
+                        decoded_at = written
+            except KeyboardInterrupt:
+                pass
+            if speaking:
+                self.process_window(cap.ring, start, final=True)
+                self._end_utterance()
+        return self.stats()
+
+    def stats(self):
+        lags = np.asarray(self.lags) if self.lags else np.zeros(1)
+        return {
+            "words": len(self.agreement.committed),
+            "language": self.language,
+            "decodes": self.decodes,
+            "decode_seconds": round(self.decode_seconds, 2),
+            "lag_p50_s": round(float(np.percentile(lags, 50)), 2),
+            "lag_p95_s": round(float(np.percentile(lags, 95)), 2),
+        }
+
+
+def listen(model=None, language=CONTINUOUS_LANGUAGE):
+    """
+    CLI front end: prints committed words as they arrive and the lag after every utterance.
+    """
+    def on_words(words):
+        print(" ".join(w[2] for w in words), end=" ", flush=True)
+
+    def on_utterance(text, lag):
+        print(f"\n   ⏱  lag {lag:.2f}s" if lag is not None else "")
+
+    print("🎧 Listening continuously... (Ctrl+C to stop)")
+    transcriber = ContinuousTranscriber(model, language, on_words=on_words, on_utterance=on_utterance)
+    stats = transcriber.run()
+    print(f"\n✓ {stats['words']} words, lag p50 {stats['lag_p50_s']}s / p95 {stats['lag_p95_s']}s, "
+          f"{stats['decodes']} decodes ({stats['decode_seconds']}s)")
+    return transcriber.agreement.text()
@@ -0,0 +1,131 @@
+"""Long-form transcription: split at silence, transcribe chunks in parallel processes, stitch with timestamps"""
+import os, sys, json, time, argparse, multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from whisper_app import model_registry, vad
+except ImportError:
+    import model_registry, vad
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configuration
+SAMPLE_RATE = 16000
+LONGFORM_WORKERS = int(os.getenv("LONGFORM_WORKERS", min(os.cpu_count() or 1, 4)))  # each holds its own model
+LONGFORM_CHUNK_SECONDS = float(os.getenv("LONGFORM_CHUNK_SECONDS", 30.0))  # Whisper's window, chunks never exceed it
+LONGFORM_SEARCH_SECONDS = float(os.getenv("LONGFORM_SEARCH_SECONDS", 5.0))  # how far back to look for a pause
+FRAME_SECONDS = 0.05
+
+_worker_model = None
+
+
+def split_at_silence(audio, sr=SAMPLE_RATE, chunk_seconds=LONGFORM_CHUNK_SECONDS, search_seconds=LONGFORM_SEARCH_SECONDS):
+    """
+    Cut points (sample offsets) so every chunk is at most `chunk_seconds` long and ends
+    at the quietest frame of its last `search_seconds`, i.e. between words where possible.
+    """
+    frame = int(sr * FRAME_SECONDS)
+    frames = vad._frames(audio, frame)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) if len(frames) else np.zeros(0)
+    max_frames, search = int(chunk_seconds / FRAME_SECONDS), int(search_seconds / FRAME_SECONDS)
+
+    cuts, start = [0], 0
+    while len(audio) - start * frame > chunk_seconds * sr:
+        lo, hi = start + max_frames - search, start + max_frames
+        start = lo + int(np.argmin(rms[lo:hi]))
+        cuts.append(start * frame)
+    cuts.append(len(audio))
+    return cuts
+
+
+def _init_worker(name, device, dtype, threads):
+    # Pool processes only: one model each, threads split so workers don't oversubscribe the cores
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = model_registry.get_model(name, device, dtype)
+
+
+def _transcribe_chunk(job, model=None):
+    index, offset, audio, language = job
+    model = model or _worker_model or model_registry.get_model()
+    if not vad.has_speech(audio, SAMPLE_RATE):
+        return index, {"text": "", "segments": [], "language": language}
+    options = {"fp16": model_registry.is_fp16(model)}
+    if language:
+        options["language"] = language
+    res = model.transcribe(audio, **options)
+    segments = [
+        {"start": round(seg["start"] + offset, 2), "end": round(seg["end"] + offset, 2), "text": seg["text"].strip()}
+        for seg in res.get("segments", [])
+    ]
+    return index, {"text": res["text"].strip(), "segments": segments, "language": res.get("language")}
+
+
+def transcribe_long(source, workers=LONGFORM_WORKERS, language=None, name=None, device=None, dtype=None):
+    """
+    Transcribes a file path (or 16 kHz float32 array) chunk by chunk across `workers` processes.
+    Returns {"text", "segments", "language", "duration", "elapsed", "rtf"}.
+    """
+    started = time.perf_counter()
+    if isinstance(source, str):
+        import whisper
+        audio = whisper.load_audio(source)
+    else:
+        audio = np.asarray(source, dtype=np.float32).reshape(-1)
+    duration = len(audio) / SAMPLE_RATE
+
+    cuts = split_at_silence(audio)
+    jobs = [(i, cuts[i] / SAMPLE_RATE, audio[cuts[i]:cuts[i + 1]], language) for i in range(len(cuts) - 1)]
+    workers = max(1, min(workers, len(jobs)))
+    print(f"Long-form: {duration:.0f}s of audio in {len(jobs)} chunk(s), {workers} worker(s)")
+
+    if workers == 1:
+        # In this process: its model and torch thread settings are left as they are
+        model = model_registry.get_model(name, device, dtype)
+        results = [_transcribe_chunk(job, model) for job in jobs]
+    else:
+        # Spawned, not forked: the caller may already have run torch (its OpenMP pool doesn't survive a fork)
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(name, device, dtype, threads)) as pool:
+            results = list(pool.map(_transcribe_chunk, jobs))
+
+    # Stitch in order
+    results = [res for _, res in sorted(results, key=lambda r: r[0])]
+    elapsed = time.perf_counter() - started
+    languages = [r["language"] for r in results if r["language"]]
+    out = {
+        "text": " ".join(r["text"] for r in results if r["text"]),
+        "segments": [seg for r in results for seg in r["segments"]],
+        "language": max(set(languages), key=languages.count) if languages else language,
+        "duration": round(duration, 2),
+        "elapsed": round(elapsed, 2),
+        "rtf": round(elapsed / duration, 3) if duration else 0.0,
+    }
+    print(f"✓ Long-form done in {elapsed:.1f}s (real-time factor {out['rtf']})")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a long audio file in parallel chunks.")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=LONGFORM_WORKERS, help="processes (each loads a model)")
+    parser.add_argument("--language", default=None, help="skip per-chunk language detection, e.g. 'en'")
+    parser.add_argument("--model", default=None, help="Whisper model name (default WHISPER_MODEL)")
+    parser.add_argument("--json", dest="json_path", default=None, help="write text + timestamped segments here")
+    args = parser.parse_args()
+
+    res = transcribe_long(args.path, workers=args.workers, language=args.language, name=args.model)
+    for seg in res["segments"]:
+        print(f"[{seg['start']:8.2f} -> {seg['end']:8.2f}] {seg['text']}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(res, f, indent=2, ensure_ascii=False)
+        print(f"✓ Saved {args.json_path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""Whisper model registry: lazy, cached per (name, device, dtype), with explicit warmup"""
+import os, time, threading
+import numpy as np
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configuration
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "turbo")
+WHISPER_FALLBACK_MODEL = os.getenv("WHISPER_FALLBACK_MODEL", "base")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "")           # "" = cuda if available, else cpu
+WHISPER_DTYPE = os.getenv("WHISPER_DTYPE", "fp32")         # "fp32", "fp16" (cuda only) or "int8" (cpu only)
+WHISPER_WARMUP_SECONDS = float(os.getenv("WHISPER_WARMUP_SECONDS", 1.0))
+
+_models = {}          # (name, device, dtype) -> model
+_warmed = set()       # keys that already ran a dummy decode
+_lock = threading.Lock()
+_key_locks = {}
+
+
+def _rss_mb(field="VmRSS"):
+    # VmHWM = peak RSS of the process so far
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _memory_note(device):
+    import torch
+    note = f"RSS {_rss_mb():.0f}MB"
+    if device.startswith("cuda") and torch.cuda.is_available():
+        note += f", GPU {torch.cuda.memory_allocated() / 2**20:.0f}MB"
+    return note
+
+
+def resolve(name=None, device=None, dtype=None):
+    """
+    Fills in defaults and returns the cache key (name, device, dtype).
+    """
+    import torch
+    device = device or WHISPER_DEVICE or ("cuda" if torch.cuda.is_available() else "cpu")
+    dtype = dtype or WHISPER_DTYPE
+    if dtype == "fp16" and not device.startswith("cuda"):
+        print("⚠️  fp16 needs a GPU, using fp32 on CPU")
+        dtype = "fp32"
+    if dtype == "int8" and device != "cpu":
+        print("⚠️  int8 dynamic quantization is CPU-only, using fp16 on GPU")
+        dtype = "fp16"
+    return (name or WHISPER_MODEL, device, dtype)
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of every Linear layer (weights stored int8, activations
+    quantized on the fly). Whisper's Linear subclass is swapped for a plain nn.Linear
+    first, since quantize_dynamic only matches exact module types. Done in place, so the
+    fp32 weights aren't held twice while converting.
+    """
+    import torch
+    from torch import nn
+
+    def to_plain(module):
+        for child_name, child in module.named_children():
+            if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+                plain = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                plain.load_state_dict(child.state_dict())
+                setattr(module, child_name, plain)
+            else:
+                to_plain(child)
+
+    to_plain(model)
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _load(name, device, dtype):
+    import whisper
+    started, rss_before = time.perf_counter(), _rss_mb()
+    print(f"Loading Whisper model ({name}, {device}, {dtype})...")
+    try:
+        model = whisper.load_model(name, device=device)
+    except Exception as e:
+        print(f"Failed to load specific model '{name}', falling back to '{WHISPER_FALLBACK_MODEL}'. Error: {e}")
+        model = whisper.load_model(WHISPER_FALLBACK_MODEL, device=device)
+    if dtype == "fp16":
+        model = model.half()
+    elif dtype == "int8":
+        model = quantize_int8(model.eval())
+    print(f"✓ Model ready in {time.perf_counter() - started:.1f}s "
+          f"(+{_rss_mb() - rss_before:.0f}MB, {_memory_note(device)})")
+    return model
+
+
+def get_model(name=None, device=None, dtype=None):
+    """
+    Returns the cached model for (name, device, dtype), loading it on first use.
+    Concurrent first callers wait for a single load.
+    """
+    key = resolve(name, device, dtype)
+    with _lock:
+        if key in _models:
+            return _models[key]
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _models:
+            model = _load(*key)
+            with _lock:
+                _models[key] = model
+        return _models[key]
+
+
+def is_fp16(model):
+    """
+    True when the model weights are half precision (transcribe/decode must pass fp16=True).
+    """
+    import torch
+    return next(model.parameters()).dtype == torch.float16
+
+
+def warmup(model, seconds=WHISPER_WARMUP_SECONDS):
+    """
+    Runs one encoder + decoder pass on silence so kernels, caches and lazy
+    allocations are in place before the first real request.
+    """
+    import whisper
+    with _lock:
+        key = next((k for k, m in _models.items() if m is model), None)
+        if key in _warmed:
+            return
+    started = time.perf_counter()
+    audio = np.zeros(int(seconds * whisper.audio.SAMPLE_RATE), dtype=np.float32)
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=model.dims.n_mels).to(model.device)
+    options = whisper.DecodingOptions(language="en", without_timestamps=True, fp16=is_fp16(model))
+    whisper.decode(model, mel, options)
+    if key is not None:
+        with _lock:
+            _warmed.add(key)
+    print(f"✓ Warmup decode in {time.perf_counter() - started:.2f}s ({_memory_note(str(model.device))})")
+
+
+def get_ready_model(name=None, device=None, dtype=None):
+    """
+    get_model() + warmup() on first use.
+    """
+    model = get_model(name, device, dtype)
+    warmup(model)
+    return model
+
+
+def loaded():
+    return [{"name": k[0], "device": k[1], "dtype": k[2], "warm": k in _warmed} for k in _models]
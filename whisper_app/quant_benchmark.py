@@ -0,0 +1,125 @@
+"""Quantized vs fp32 Whisper on CPU: latency, memory and word-error-rate delta"""
+import os, sys, io, gc, json, re, time, argparse, subprocess
+
+try:
+    from whisper_app import model_registry
+except ImportError:
+    import model_registry
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_AUDIO = os.path.join(ROOT_DIR, "test_audio.mp3")
+
+
+def _words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level Levenshtein distance / reference length.
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1] / len(ref)
+
+
+def _weights_mb(model):
+    import torch
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def _release_freed():
+    # glibc keeps freed heap pages (e.g. the fp32 weights int8 replaced) mapped until trimmed
+    gc.collect()
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def run_one(dtype, audio_path, name, repeats):
+    """
+    Runs in a fresh process so RSS numbers aren't polluted by the other variant.
+    rss_mb is what the loaded, warmed-up model keeps resident; peak_rss_mb includes
+    the transient checkpoint copy (and, for int8, the fp32 weights before conversion).
+    """
+    import whisper
+    import numpy as np
+    audio = whisper.load_audio(audio_path)
+    _release_freed()
+    rss_before = model_registry._rss_mb()
+    started = time.perf_counter()
+    model = model_registry.get_model(name, "cpu", dtype)
+    load_s = time.perf_counter() - started
+    model_registry.warmup(model)
+
+    latencies, text = [], ""
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        text = model.transcribe(audio, fp16=False, language="en", temperature=0.0)["text"].strip()
+        latencies.append(time.perf_counter() - t0)
+    _release_freed()
+    print(json.dumps({
+        "dtype": dtype,
+        "model": name or model_registry.WHISPER_MODEL,
+        "load_s": round(load_s, 2),
+        "weights_mb": round(_weights_mb(model), 1),
+        "rss_mb": round(model_registry._rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(model_registry._rss_mb("VmHWM") - rss_before, 1),
+        "audio_s": round(len(audio) / 16000, 2),
+        "latency_p50_s": round(float(np.median(latencies)), 3),
+        "latency_min_s": round(min(latencies), 3),
+        "text": text,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark int8 dynamic quantization against fp32.")
+    parser.add_argument("--audio", default=DEFAULT_AUDIO)
+    parser.add_argument("--model", default=None, help="Whisper model name (default WHISPER_MODEL)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--reference", default=None, help="text file with the true transcript (default: fp32 output)")
+    parser.add_argument("--_run", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._run:
+        return run_one(args._run, args.audio, args.model, args.repeats)
+
+    results = {}
+    for dtype in ("fp32", "int8"):
+        cmd = [sys.executable, os.path.abspath(__file__), "--_run", dtype, "--audio", args.audio,
+               "--repeats", str(args.repeats)] + (["--model", args.model] if args.model else [])
+        out = subprocess.run(cmd, capture_output=True, text=True)
+        line = next((l for l in reversed(out.stdout.splitlines()) if l.startswith("{")), None)
+        if line is None:
+            print(f"❌ {dtype} run failed:\n{out.stderr[-2000:]}")
+            return 1
+        results[dtype] = json.loads(line)
+
+    reference = open(args.reference).read() if args.reference else results["fp32"]["text"]
+    for dtype, res in results.items():
+        res["wer"] = round(word_error_rate(reference, res["text"]), 4)
+    fp32, int8 = results["fp32"], results["int8"]
+    summary = {
+        "fp32": {k: v for k, v in fp32.items() if k != "text"},
+        "int8": {k: v for k, v in int8.items() if k != "text"},
+        "speedup": round(fp32["latency_p50_s"] / int8["latency_p50_s"], 2),
+        "weights_ratio": round(int8["weights_mb"] / fp32["weights_mb"], 3),
+        "rss_ratio": round(int8["rss_mb"] / fp32["rss_mb"], 3),
+        "wer_delta": round(int8["wer"] - fp32["wer"], 4),
+        "reference": "file" if args.reference else "fp32 transcript",
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,10 @@
-"""Speech-to-Text System: Fixed, Manual & Auto-Stop Recording"""
-import whisper, sounddevice as sd, numpy as np, scipy.io.wavfile as wav, os, time
-from threading import Event
+"""Speech-to-Text System: Fixed, Manual, Auto-Stop & Continuous Recording"""
+import numpy as np, scipy.io.wavfile as wav, os, threading
+
+try:
+    from whisper_app import model_registry, vad, long_form, capture, continuous
+except ImportError:
+    import model_registry, vad, long_form, capture, continuous
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -19,23 +23,25 @@ class Config:
 RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "recordings")
 os.makedirs(RECORDINGS_DIR, exist_ok=True)
 
-print(f"Loading Whisper model ({Config.MODEL_TYPE})...")
-try:
-    model = whisper.load_model(Config.MODEL_TYPE)
-except Exception as e:
-    print(f"Failed to load specific model '{Config.MODEL_TYPE}', falling back to 'base'. Error: {e}")
-    model = whisper.load_model("base")
-print("✓ Model ready")
+def get_model():
+    # Loaded (and warmed up) on first use, shared with anything else in the process
+    return model_registry.get_ready_model(Config.MODEL_TYPE)
 
 def save_and_transcribe(audio, fs=Config.SAMPLE_RATE):
     if len(audio) == 0 or np.max(np.abs(audio)) < Config.SILENCE_THRESHOLD: 
         print("⚠️  Audio too quiet/empty")
         return None
     
-    print("Transcribing (in-memory)...")
-    audio_flat = audio.flatten().astype(np.float32)
+    # Trim silence / long pauses; nothing left means nothing was said (mono capture: a view, no copy)
+    audio_flat = audio.mean(axis=1) if audio.ndim > 1 and audio.shape[1] > 1 else audio.reshape(-1)
+    audio_flat, _ = vad.trim(audio_flat, fs)
+    if len(audio_flat) == 0:
+        print("⚠️  No speech detected")
+        return None
     
-    res = model.transcribe(audio_flat, fp16=False)
+    print("Transcribing (in-memory)...")
+    model = get_model()
+    res = model.transcribe(audio_flat, fp16=model_registry.is_fp16(model))
     text = res["text"].strip()
     
     # Filter Hallucinations
@@ -47,67 +53,37 @@ def save_and_transcribe(audio, fs=Config.SAMPLE_RATE):
     print(f"Language: {res['language']}")
     return text
 
-def record_stream(stop_condition_func, **kwargs):
-    q = []
-    def cb(indata, f, t, s): q.append(indata.copy())
-    
-    with sd.InputStream(samplerate=Config.SAMPLE_RATE, channels=Config.CHANNELS, callback=cb):
-        stop_condition_func(q, **kwargs)
-        
-    return np.concatenate(q) if q else np.array([])
+def _capture(**kwargs):
+    return capture.Capture(sample_rate=Config.SAMPLE_RATE, channels=Config.CHANNELS, **kwargs)
 
 def record_fixed(duration=Config.DEFAULT_DURATION):
     print(f"🎤 Recording {duration}s...")
-    rec = sd.rec(int(duration * Config.SAMPLE_RATE), 
-                 samplerate=Config.SAMPLE_RATE, 
-                 channels=Config.CHANNELS)
-    sd.wait()
-    return rec
+    with _capture(max_seconds=duration) as cap:
+        cap.wait()
+    return cap.audio()
 
 def record_manual():
     print("🎤 Press ENTER to start...")
     input()
     print("🎤 Recording... (Press ENTER to stop)")
     
-    stop_event = Event()
-    
-    # Thread to wait for Enter key
-    def wait_for_enter():
-        input()
-        stop_event.set()
-        
-    import threading
-    t = threading.Thread(target=wait_for_enter)
-    t.start()
-    
-    audio_chunks = []
-    
-    # Record in small chunks (0.1s) until stop is pressed
-    # This keeps the main thread responsive and avoids "stream.stop()" hangs
-    with sd.InputStream(samplerate=Config.SAMPLE_RATE, channels=Config.CHANNELS) as stream:
-        while not stop_event.is_set():
-            data, overflow = stream.read(int(Config.SAMPLE_RATE * 0.1)) # Read 0.1s
-            audio_chunks.append(data)
+    # Up to CAPTURE_MAX_SECONDS; Enter (read on a helper thread) ends it
+    with _capture() as cap:
+        threading.Thread(target=lambda: (input(), cap.stop("manual")), daemon=True).start()
+        cap.wait()
     
-    print("✓ Recording stopped")
-    return np.concatenate(audio_chunks) if audio_chunks else np.array([])
+    print(f"✓ Recording stopped ({cap.seconds:.1f}s)")
+    return cap.audio()
 
 def record_auto(silence_dur=Config.SILENCE_DURATION, 
                 threshold=Config.SILENCE_THRESHOLD, 
                 max_dur=Config.MAX_RECORD_DURATION):
     
     print(f"🎤 Speak now! (Auto-stop after {silence_dur}s silence)")
-    
-    def wait_silence(q, **k):
-        start, silent_start = time.time(), None
-        while time.time() - start < max_dur:
-            if q and np.mean(np.abs(q[-1])) < threshold:
-                if not silent_start: silent_start = time.time()
-                elif time.time() - silent_start > silence_dur: break
-            else: silent_start = None
-            time.sleep(0.1)
-            
-    return record_stream(wait_silence)
+    # The callback tracks the silent run and fires the stop itself, within one block of it
+    with _capture(max_seconds=max_dur, silence_threshold=threshold, silence_seconds=silence_dur) as cap:
+        cap.wait()
+    return cap.audio()
 
 def record_and_transcribe(duration=Config.DEFAULT_DURATION, mode="fixed", **kwargs):
     try:
@@ -122,14 +98,16 @@ def record_and_transcribe(duration=Config.DEFAULT_DURATION, mode="fixed", **kwar
 def transcribe_file(path):
     if not os.path.exists(path): raise FileNotFoundError(f"Missing: {path}")
     print(f"Transcribing: {path}")
-    res = model.transcribe(path, fp16=False)
+    model = get_model()
+    res = model.transcribe(path, fp16=model_registry.is_fp16(model))
     return res["text"].strip()
 
 def main():
+    get_model()  # load + warm up before the first recording
     while True:
-        print(f"\n{'='*40}\n1. Fixed\n2. Manual (Start/Stop)\n3. Auto-Stop\n4. File\n5. Exit")
+        print(f"\n{'='*40}\n1. Fixed\n2. Manual (Start/Stop)\n3. Auto-Stop\n4. File\n5. Long File (parallel)\n6. Continuous (hands-free)\n7. Exit")
         c = input("Choice: ").strip()
-        if c == "5": break
+        if c == "7": break
         try:
             if c == "1": 
                 dur = int(input(f"Secs ({Config.DEFAULT_DURATION}): ") or Config.DEFAULT_DURATION)
@@ -137,6 +115,8 @@ def main():
             elif c == "2": print(record_and_transcribe(mode="manual"))
             elif c == "3": print(record_and_transcribe(mode="auto"))
             elif c == "4": print(transcribe_file(input("Path: ").strip()))
+            elif c == "5": print(long_form.transcribe_long(input("Path: ").strip())["text"])
+            elif c == "6": continuous.listen(get_model())
         except Exception as e: print(f"❌ {e}")
 
 if __name__ == "__main__": main()
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""Voice-activity detection: trims silence and drops empty clips before they reach Whisper"""
+import os, threading
+import numpy as np
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Configuration
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_BACKEND = os.getenv("VAD_BACKEND", "energy")                     # "energy" or "webrtc" (needs webrtcvad)
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", 30))                     # 10, 20 or 30 for webrtc
+VAD_ENERGY_THRESHOLD = float(os.getenv("VAD_ENERGY_THRESHOLD", 0.01))  # absolute RMS floor
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", 250))         # shorter bursts are treated as noise
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", 200))                       # kept around speech so words aren't clipped
+VAD_MAX_GAP_MS = int(os.getenv("VAD_MAX_GAP_MS", 600))               # longer pauses are shortened to this
+VAD_AGGRESSIVENESS = int(os.getenv("VAD_AGGRESSIVENESS", 2))         # webrtc only, 0-3
+
+try:
+    import webrtcvad  # optional model backend
+except ImportError:
+    webrtcvad = None
+
+_stats_lock = threading.Lock()
+_stats = {"clips": 0, "dropped": 0, "input_seconds": 0.0, "saved_seconds": 0.0}
+
+
+def _frames(audio, frame_len):
+    n = len(audio) // frame_len
+    return audio[:n * frame_len].reshape(n, frame_len)
+
+
+def energy_mask(audio, sr, frame_ms=VAD_FRAME_MS, floor=VAD_ENERGY_THRESHOLD):
+    """
+    Per-frame speech flags from RMS energy and zero-crossing rate.
+    The threshold adapts to the clip's noise floor; quiet high-ZCR frames (fricatives) count as speech.
+    """
+    frames = _frames(audio, int(sr * frame_ms / 1000))
+    if len(frames) == 0:
+        return np.zeros(0, dtype=bool)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames), axis=1)), axis=1)
+    noise, loud = np.percentile(rms, 10), np.percentile(rms, 90)
+    threshold = max(floor, min(3 * noise, 0.5 * loud))
+    return (rms > threshold) | ((rms > threshold / 2) & (zcr > 0.25))
+
+
+def webrtc_mask(audio, sr, frame_ms=VAD_FRAME_MS, aggressiveness=VAD_AGGRESSIVENESS):
+    vad = webrtcvad.Vad(aggressiveness)
+    pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+    return np.array([vad.is_speech(f.tobytes(), sr) for f in _frames(pcm, int(sr * frame_ms / 1000))], dtype=bool)
+
+
+def _runs(mask):
+    # (start, end) frame indices of consecutive True runs
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def keep_mask(speech, frame_ms=VAD_FRAME_MS, min_speech_ms=VAD_MIN_SPEECH_MS,
+              pad_ms=VAD_PAD_MS, max_gap_ms=VAD_MAX_GAP_MS):
+    """
+    Speech frames -> frames to keep: short bursts removed, speech padded, leading/trailing
+    silence dropped and interior pauses capped at `max_gap_ms`.
+    """
+    speech = speech.copy()
+    starts, ends = _runs(speech)
+    for s, e in zip(starts, ends):
+        if (e - s) * frame_ms < min_speech_ms:
+            speech[s:e] = False
+    if not speech.any():
+        return speech
+
+    pad = pad_ms // frame_ms
+    keep = np.convolve(speech, np.ones(2 * pad + 1, dtype=int), mode="same") > 0 if pad else speech
+    gap_starts, gap_ends = _runs(~keep)
+    max_gap = max_gap_ms // frame_ms
+    for s, e in zip(gap_starts, gap_ends):
+        if s == 0 or e == len(keep):
+            continue  # leading/trailing silence is dropped entirely
+        if e - s > max_gap:
+            keep[s:s + max_gap // 2] = True
+            keep[e - (max_gap - max_gap // 2):e] = True
+        else:
+            keep[s:e] = True
+    return keep
+
+
+def has_speech(audio, sr=16000):
+    """
+    Quiet yes/no check (no logging, no stats), e.g. to skip silent chunks of a long file.
+    """
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    if not VAD_ENABLED:
+        return len(audio) > 0
+    return bool(keep_mask(energy_mask(audio, sr)).any())
+
+
+def trim(audio, sr=16000):
+    """
+    Returns (trimmed_audio, saved_seconds). An empty array means "no speech, skip the model".
+    """
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)
+    total = len(audio) / sr
+    if not VAD_ENABLED or len(audio) == 0:
+        return audio, 0.0
+
+    if VAD_BACKEND == "webrtc" and webrtcvad is not None and sr in (8000, 16000, 32000, 48000):
+        speech = webrtc_mask(audio, sr)
+    else:
+        speech = energy_mask(audio, sr)
+    keep = keep_mask(speech)
+    frame_len = int(sr * VAD_FRAME_MS / 1000)
+    trimmed = audio[:len(keep) * frame_len][np.repeat(keep, frame_len)]
+
+    saved = total - len(trimmed) / sr
+    with _stats_lock:
+        _stats["clips"] += 1
+        _stats["dropped"] += int(len(trimmed) == 0)
+        _stats["input_seconds"] += total
+        _stats["saved_seconds"] += saved
+    if len(trimmed) == 0:
+        print(f"🔇 VAD: no speech in {total:.1f}s clip, skipping transcription")
+    else:
+        print(f"🔇 VAD: kept {len(trimmed) / sr:.1f}s of {total:.1f}s (saved {saved:.1f}s)")
+    return trimmed, saved
+
+
+def stats():
+    with _stats_lock:
+        out = dict(_stats)
+    out["input_seconds"] = round(out["input_seconds"], 1)
+    out["saved_seconds"] = round(out["saved_seconds"], 1)
+    return out